@@ -2,12 +2,51 @@ import streamlit as st
 import sqlite3
 import pandas as pd
 import os
+import sys
+import argparse
 import hashlib
+import html
+import re
+import unicodedata
+import mimetypes
 import uuid
+import urllib.parse
 import base64
+import csv
+import gzip
+import io
+import tempfile
+import shutil
+import itertools
+import threading
+import queue
+import atexit
+import bisect
+import copy
+import functools
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 import plotly.express as px
+from streamlit.errors import StreamlitAPIException
+
+try:
+    import openpyxl  # opsional, hanya untuk impor file Excel
+except ImportError:
+    openpyxl = None
+
+try:
+    from PIL import Image, ImageOps  # opsional, untuk dimensi dan thumbnail gambar lampiran chat
+except ImportError:
+    Image = ImageOps = None
+
+try:
+    import pyarrow as pa  # opsional, hanya untuk ekspor Parquet
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 # --- Konfigurasi ---
 st.set_page_config(
@@ -19,8 +58,45 @@ st.set_page_config(
 
 DB_NAME = "flux.db"
 UPLOAD_FOLDER = "uploads"
+# Lampiran chat disajikan langsung oleh Streamlit (server.enableStaticServing di .streamlit/config.toml)
+CHAT_MEDIA_FOLDER = os.path.join("static", "chat")
+CHAT_MEDIA_URL = "app/static/chat"
+CHAT_THUMBNAIL_FOLDER = os.path.join(CHAT_MEDIA_FOLDER, "thumbs")
+CHAT_THUMBNAIL_MAX_SIZE = 600  # sisi terpanjang thumbnail (px), 2x lebar tampilan bubble chat
+CHAT_THUMBNAIL_QUALITY = 75
+AUDIT_ARCHIVE_FOLDER = os.path.join("archive", "audit")
 ADMIN_ID = "admin123"
 DEFAULT_DEV_PASSWORD = "zzz"
+PROJECTS_PAGE_SIZE = 20
+AUDIT_PAGE_SIZE = 100
+CHAT_PAGE_SIZE = 50
+CHAT_REFRESH_SECONDS = 5  # interval polling pesan baru di panel chat
+SEARCH_RESULT_LIMIT = 20  # hasil per kategori di halaman Pencarian
+IMPORT_USER_CHUNK_SIZE = 500  # jumlah id pengguna per query IN saat impor massal
+EXPORT_CHUNK_SIZE = 5000  # baris per fetchmany saat ekspor data
+EXPORT_FILE_PREFIX = "flux_export_"  # file ekspor UI di direktori sementara sistem
+EXPORT_FILE_MAX_AGE_SECONDS = 24 * 60 * 60  # file ekspor yang tidak diunduh dibuang setelah sehari
+READ_CACHE_MAX_ENTRIES = 1024  # jumlah hasil query maksimum di cache baca
+READ_CACHE_TTL_SECONDS = 300  # batas umur hasil cache (untuk perubahan dari proses lain)
+AUDIT_RETENTION_DAYS = 180  # jejak audit yang lebih tua dipindah ke arsip bulanan
+AUDIT_ARCHIVE_INTERVAL_SECONDS = 24 * 60 * 60  # jeda pengarsipan otomatis oleh thread audit
+
+# Pengaturan koneksi SQLite (diterapkan sekali per koneksi)
+DB_BUSY_TIMEOUT_MS = 5000
+DB_READER_POOL_SIZE = 8  # koneksi baca idle yang disimpan untuk dipakai ulang
+DB_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}",
+    "PRAGMA mmap_size = 268435456",  # 256 MB
+    "PRAGMA cache_size = -20000",    # ~20 MB
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Buffer jejak audit: event ditulis berkelompok oleh thread latar belakang
+AUDIT_QUEUE_MAX = 10000
+AUDIT_FLUSH_INTERVAL_SECONDS = 1.0
 
 # Opsi Dropdown untuk Registrasi (diurutkan secara alphabet)
 DEPARTEMEN_OPTIONS = sorted([
@@ -60,18 +136,316 @@ SEKSI_OPTIONS = sorted([
     "Transport & Control", "Trial & Evaluation", "Water, Air & Gas Supply"
 ])
 
-# --- Inisialisasi Database dan Folder Uploads ---
-def create_db_and_tables():
-    """Membuat database dan tabel jika belum ada."""
-    if not os.path.exists(UPLOAD_FOLDER):
-        os.makedirs(UPLOAD_FOLDER)
+# --- Manajemen Koneksi Database ---
+class ConnectionManager:
+    """Mengelola koneksi SQLite yang dipakai bersama oleh semua sesi Streamlit.
 
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    # PENTING: Aktifkan foreign key constraints
-    c.execute("PRAGMA foreign_keys = ON")
+    Koneksi baca diambil dari pool terbatas dan dikembalikan setelah dipakai,
+    sehingga rerun dan tick fragment (yang berjalan di thread baru) tidak membuka
+    koneksi baru. Semua penulisan melewati satu koneksi writer yang diserialisasi
+    dengan lock.
+    """
+
+    def __init__(self, db_name, pool_size=DB_READER_POOL_SIZE):
+        self.db_name = db_name
+        self._readers = queue.Queue(maxsize=pool_size)
+        self._write_lock = threading.RLock()
+        self._writer = None
+        self._write_depth = 0
+
+    def _connect(self, check_same_thread=True):
+        conn = sqlite3.connect(self.db_name, timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=check_same_thread)
+        for pragma in DB_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Pinjam koneksi baca dari pool; dikembalikan saat blok selesai.
+
+        Jika pool kosong dibuat koneksi baru, jika pool penuh saat dikembalikan
+        koneksi ditutup.
+        """
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect(check_same_thread=False)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Transaksi tulis pada koneksi writer tunggal.
+
+        Commit saat blok selesai, rollback jika terjadi exception. Transaksi
+        bersarang (mis. audit trail di dalam transaksi lain) ikut transaksi terluar.
+        """
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect(check_same_thread=False)
+            self._write_depth += 1
+            try:
+                yield self._writer
+                if self._write_depth == 1:
+                    self._writer.commit()
+            except BaseException:
+                if self._write_depth == 1:
+                    self._writer.rollback()
+                raise
+            finally:
+                self._write_depth -= 1
+
+@st.cache_resource
+def get_connection_manager():
+    return ConnectionManager(DB_NAME)
+
+def db_reader():
+    """Context manager yang meminjamkan koneksi baca yang sudah di-tuning dari pool."""
+    return get_connection_manager().reader()
+
+def db_transaction():
+    """Context manager untuk semua operasi tulis (INSERT/UPDATE/DELETE/DDL)."""
+    return get_connection_manager().transaction()
+
+# --- Buffer Jejak Audit ---
+class AuditSink:
+    """Buffer write-behind untuk jejak audit.
+
+    Event diantrikan di memori dan ditulis berkelompok (executemany) oleh thread
+    latar belakang, sehingga aksi pengguna tidak menunggu commit audit. Bila
+    antrian penuh atau thread tidak berjalan, event langsung ditulis secara sinkron;
+    jika penulisan itu gagal, event disimpan untuk flush berikutnya. Thread yang sama
+    menjalankan pengarsipan jejak audit sekali setiap AUDIT_ARCHIVE_INTERVAL_SECONDS.
+
+    Halaman yang membaca jejak audit tidak memaksa flush, jadi event terbaru bisa baru
+    terlihat setelah AUDIT_FLUSH_INTERVAL_SECONDS; flush hanya dilakukan untuk aksi eksplisit
+    (Muat Ulang, ekspor, pengarsipan).
+    """
+
+    def __init__(self, manager, maxsize=AUDIT_QUEUE_MAX):
+        self._manager = manager
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, user_id, action, details):
+        # Waktu dicatat saat aksi terjadi, bukan saat ditulis ke database
+        entry = (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), user_id, action, details)
+        if self._thread.is_alive() and not self._stopped.is_set():
+            try:
+                self._queue.put_nowait(entry)
+                return
+            except queue.Full:
+                pass
+        try:
+            self._write([entry])
+        except sqlite3.Error as e:
+            # Aksi pemanggil sudah di-commit; kegagalan audit tidak boleh membatalkannya
+            with self._flush_lock:
+                self._pending.append(entry)
+            print(f"⚠️ Gagal menulis jejak audit, dicoba lagi: {e}")
+
+    def _write(self, entries):
+        with self._manager.transaction() as conn:
+            conn.executemany("INSERT INTO audit_trail (timestamp, user_id, action, details) VALUES (?, ?, ?, ?)", entries)
+
+    def flush(self):
+        """Menulis semua event yang masih antri. Batch yang gagal dicoba lagi pada flush berikutnya."""
+        with self._flush_lock:
+            while True:
+                if not self._pending:
+                    while len(self._pending) < AUDIT_QUEUE_MAX:
+                        try:
+                            self._pending.append(self._queue.get_nowait())
+                        except queue.Empty:
+                            break
+                if not self._pending:
+                    return
+                self._write(self._pending)
+                self._pending = []
+
+    def _run(self):
+        next_archive = time.monotonic()
+        while not self._stopped.wait(AUDIT_FLUSH_INTERVAL_SECONDS):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"⚠️ Gagal menulis jejak audit, dicoba lagi: {e}")
+            if time.monotonic() >= next_archive:
+                next_archive = time.monotonic() + AUDIT_ARCHIVE_INTERVAL_SECONDS
+                try:
+                    archive_audit_trail()
+                except (sqlite3.Error, OSError) as e:
+                    print(f"⚠️ Gagal mengarsipkan jejak audit, dicoba lagi besok: {e}")
 
+    def close(self):
+        """Menghentikan thread dan menulis sisa antrian (dipanggil saat proses berhenti)."""
+        self._stopped.set()
+        self._thread.join(timeout=AUDIT_FLUSH_INTERVAL_SECONDS * 2)
+        self.flush()
+
+@st.cache_resource
+def get_audit_sink():
+    return AuditSink(get_connection_manager())
+
+# --- Direktori Pengguna ---
+class UserDirectory:
+    """Salinan tabel users di memori (tanpa password), dipakai bersama semua sesi.
+
+    Dimuat ulang saat pertama dibaca setelah invalidate(); setiap fungsi yang mengubah
+    tabel users wajib memanggil invalidate(). Perubahan dari proses lain (mis. perintah
+    CLI) baru terlihat setelah aplikasi di-restart. Dict yang dikembalikan dipakai
+    bersama, jangan diubah.
+    """
+
+    def __init__(self, manager):
+        self._manager = manager
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._loaded_generation = -1
+        # (users per id, users urut nama, index token (token, id) terurut, kunci pencarian substring)
+        self._snapshot = ({}, [], [], [])
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+
+    def _load(self):
+        if self._loaded_generation == self._generation:
+            return self._snapshot
+        with self._lock:
+            if self._loaded_generation != self._generation:
+                generation = self._generation
+                with self._manager.reader() as conn:
+                    c = conn.cursor()
+                    c.execute("SELECT id, fullname, departemen, seksi, role, status FROM users ORDER BY fullname")
+                    users = [{"id": u[0], "fullname": u[1], "departemen": u[2], "seksi": u[3], "role": u[4], "status": u[5]}
+                             for u in c.fetchall()]
+                tokens = []
+                search_keys = []
+                for user in users:
+                    user_id, fullname = user['id'].lower(), user['fullname'].lower()
+                    for token in {user_id, fullname, *fullname.split()}:
+                        tokens.append((token, user['id']))
+                    search_keys.append((f"{user_id} {fullname}", user['id']))
+                tokens.sort()
+                self._snapshot = ({user['id']: user for user in users}, users, tokens, search_keys)
+                self._loaded_generation = generation
+        return self._snapshot
+
+    def get(self, user_id):
+        return self._load()[0].get(user_id)
+
+    def all(self):
+        return self._load()[1]
+
+    def search(self, term, limit=20):
+        """Cari pengguna berdasarkan id atau nama: awalan kata dulu, lalu substring."""
+        term = term.strip().lower()
+        if not term:
+            return []
+        users_by_id, _, tokens, search_keys = self._load()
+        matched_ids = {}
+        i = bisect.bisect_left(tokens, (term,))
+        while i < len(tokens) and tokens[i][0].startswith(term) and len(matched_ids) < limit:
+            matched_ids.setdefault(tokens[i][1], None)
+            i += 1
+        if len(matched_ids) < limit:
+            for search_key, user_id in search_keys:
+                if term in search_key:
+                    matched_ids.setdefault(user_id, None)
+                    if len(matched_ids) >= limit:
+                        break
+        return [users_by_id[user_id] for user_id in matched_ids]
+
+@st.cache_resource
+def get_user_directory():
+    return UserDirectory(get_connection_manager())
+
+# --- Cache Baca ---
+# Entitas yang bisa di-invalidate; setiap fungsi baca yang di-cache menyebutkan entitas
+# yang dibacanya, dan setiap fungsi tulis menaikkan generasi entitas yang diubahnya.
+READ_CACHE_ENTITIES = ("users", "projects", "members", "tasks", "documents", "chats", "direct_chats")
+
+class VersionedCache:
+    """Cache hasil fungsi baca (LRU + TTL) yang dipakai bersama semua sesi.
+
+    Kunci cache memuat nomor generasi setiap entitas yang dibaca fungsi, sehingga
+    invalidate() cukup menaikkan generasi; entri lama tidak lagi terpakai dan akhirnya
+    tergusur LRU. Perubahan dari proses lain (mis. perintah CLI) baru terlihat setelah
+    entri kedaluwarsa (READ_CACHE_TTL_SECONDS). Nilai dikembalikan sebagai salinan,
+    jadi pemanggil boleh mengubahnya.
+    """
+
+    def __init__(self, max_entries=READ_CACHE_MAX_ENTRIES, ttl_seconds=READ_CACHE_TTL_SECONDS):
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # kunci -> (waktu simpan, nilai)
+        self._generations = dict.fromkeys(READ_CACHE_ENTITIES, 0)
+
+    def invalidate(self, *entities):
+        """Naikkan generasi `entities` (semua entitas bila kosong)."""
+        with self._lock:
+            for entity in entities or READ_CACHE_ENTITIES:
+                self._generations[entity] += 1
+
+    def get_or_load(self, name, entities, key_args, loader):
+        with self._lock:
+            # Generasi diambil sebelum memuat: tulisan yang terjadi selama loader berjalan
+            # menaikkan generasi, sehingga hasil yang mungkin basi tidak akan dibaca lagi.
+            key = (name, key_args, tuple(self._generations[entity] for entity in entities))
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self._ttl_seconds:
+                self._entries.move_to_end(key)
+                return copy.deepcopy(entry[1])
+        value = loader()
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return copy.deepcopy(value)
+
+@st.cache_resource
+def get_read_cache():
+    return VersionedCache()
+
+def cached_read(*entities):
+    """Decorator: cache hasil fungsi baca per argumen sampai salah satu `entities` berubah."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key_args = (args, tuple(sorted(kwargs.items())))
+            return get_read_cache().get_or_load(func.__qualname__, entities, key_args,
+                                                lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+# --- Migrasi Skema Database ---
+# Setiap migrasi bernomor dijalankan sekali, versinya disimpan di PRAGMA user_version.
+# Untuk perubahan skema baru, tambahkan fungsi _migration_XXX dan daftarkan di MIGRATIONS.
+# ALTER TABLE ... ADD COLUMN di SQLite hanya mengubah skema (tanpa menulis ulang tabel).
+def _add_column_if_missing(c, table, column, definition):
+    # table_xinfo juga memuat kolom generated, yang tidak muncul di table_info
+    c.execute(f"PRAGMA table_xinfo({table})")
+    if column not in [col[1] for col in c.fetchall()]:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _migration_001_initial_schema(c):
+    """Skema dasar. Aman dijalankan di database lama yang dibuat sebelum ada migrasi."""
     # Create users table
     c.execute("""CREATE TABLE IF NOT EXISTS users (
                 id TEXT PRIMARY KEY,
@@ -83,18 +457,7 @@ def create_db_and_tables():
                 status TEXT NOT NULL
               )""")
 
-    # Check and add 3 default users if they don't exist
-    c.execute("SELECT COUNT(*) FROM users")
-    if c.fetchone()[0] == 0:
-        hashed_dev_pw = hashlib.sha256(DEFAULT_DEV_PASSWORD.encode()).hexdigest()
-        c.execute("INSERT INTO users (id, password, fullname, departemen, seksi, role, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                  (ADMIN_ID, hashed_dev_pw, "Main Admin", "Information System", "Information Technology", "Admin", "approved"))
-        c.execute("INSERT INTO users (id, password, fullname, departemen, seksi, role, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                  ("M123", hashed_dev_pw, "Manager", "Foundry Csm", "Foundry Central", "Manager", "approved"))
-        c.execute("INSERT INTO users (id, password, fullname, departemen, seksi, role, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                  ("S123", hashed_dev_pw, "Supervisor", "Foundry Csm", "Finishing 2W", "Supervisor", "approved"))
-
-    # Create projects table first
+    # Create projects table
     c.execute("""CREATE TABLE IF NOT EXISTS projects (
                 id INTEGER PRIMARY KEY,
                 name TEXT NOT NULL,
@@ -107,22 +470,12 @@ def create_db_and_tables():
                 created_at TEXT,
                 FOREIGN KEY (creator_id) REFERENCES users(id)
               )""")
-    
-    # Then check and alter projects table to add new columns if they don't exist
-    c.execute("PRAGMA table_info(projects)")
-    columns = [col[1] for col in c.fetchall()]
-    if 'created_at' not in columns:
-        c.execute("ALTER TABLE projects ADD COLUMN created_at TEXT")
-    if 'part_name' not in columns:
-        c.execute("ALTER TABLE projects ADD COLUMN part_name TEXT")
-    if 'part_number' not in columns:
-        c.execute("ALTER TABLE projects ADD COLUMN part_number TEXT")
-    if 'customer' not in columns:
-        c.execute("ALTER TABLE projects ADD COLUMN customer TEXT")
-    if 'model' not in columns:
-        c.execute("ALTER TABLE projects ADD COLUMN model TEXT")
-
-    # Create tasks table first
+
+    # Kolom yang ditambahkan belakangan pada database versi lama
+    for column in ['created_at', 'part_name', 'part_number', 'customer', 'model']:
+        _add_column_if_missing(c, 'projects', column, 'TEXT')
+
+    # Create tasks table
     c.execute("""CREATE TABLE IF NOT EXISTS tasks (
                 id INTEGER PRIMARY KEY,
                 project_id INTEGER,
@@ -138,16 +491,9 @@ def create_db_and_tables():
                 FOREIGN KEY (pic_id) REFERENCES users(id),
                 FOREIGN KEY (delegator_id) REFERENCES users(id)
               )""")
-    
-    # Then check and alter tasks table to add new columns if they don't exist
-    c.execute("PRAGMA table_info(tasks)")
-    columns = [col[1] for col in c.fetchall()]
-    if 'created_at' not in columns:
-        c.execute("ALTER TABLE tasks ADD COLUMN created_at TEXT")
-    if 'completed_at' not in columns:
-        c.execute("ALTER TABLE tasks ADD COLUMN completed_at TEXT")
-    if 'actual_start' not in columns:
-        c.execute("ALTER TABLE tasks ADD COLUMN actual_start TEXT")
+
+    for column in ['created_at', 'completed_at', 'actual_start']:
+        _add_column_if_missing(c, 'tasks', column, 'TEXT')
 
     # Create project_members table
     c.execute("""CREATE TABLE IF NOT EXISTS project_members (
@@ -203,322 +549,762 @@ def create_db_and_tables():
                 FOREIGN KEY (receiver_id) REFERENCES users(id)
               )""")
 
-    # Bersihkan data orphan (data project_members yang tidak ada project-nya)
-    c.execute("""DELETE FROM project_members 
-                 WHERE project_id NOT IN (SELECT id FROM projects)""")
+def _migration_002_query_indexes(c):
+    """Index untuk filter dan join yang dipakai query aplikasi."""
+    # Tasks per proyek, notifikasi approval per delegator
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_project_id ON tasks(project_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_delegator_status ON tasks(delegator_id, status)")
+    # Dokumen per task
+    c.execute("CREATE INDEX IF NOT EXISTS idx_documents_task_id ON documents(task_id)")
+    # Proyek per anggota dan per pembuat
+    c.execute("CREATE INDEX IF NOT EXISTS idx_project_members_user_id ON project_members(user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_projects_creator_id ON projects(creator_id)")
+    # Chat proyek: hitung pesan belum dibaca dan riwayat per proyek
+    c.execute("CREATE INDEX IF NOT EXISTS idx_chats_project_read ON chats(project_id, is_read)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_chats_project_timestamp ON chats(project_id, timestamp)")
+    # Direct chat: percakapan per pasangan dan pesan belum dibaca per penerima
+    c.execute("CREATE INDEX IF NOT EXISTS idx_direct_chats_pair ON direct_chats(sender_id, receiver_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_direct_chats_receiver_read ON direct_chats(receiver_id, is_read)")
+    # Audit trail diurutkan berdasarkan waktu
+    c.execute("CREATE INDEX IF NOT EXISTS idx_audit_trail_timestamp ON audit_trail(timestamp)")
+
+# Bulan (YYYY-MM) untuk rollup statistik; task selesai dihitung pada bulan penyelesaiannya
+_CREATED_MONTH_SQL = "COALESCE(substr({row}.created_at, 1, 7), '')"
+_DONE_MONTH_SQL = "COALESCE(substr(COALESCE({row}.completed_at, {row}.created_at), 1, 7), '')"
+
+def _rebuild_monthly_counters(c):
+    """Menghitung ulang seluruh isi monthly_counters dari tabel projects dan tasks."""
+    c.execute("DELETE FROM monthly_counters")
+    c.execute(f"""INSERT INTO monthly_counters (month, metric, count)
+                  SELECT {_CREATED_MONTH_SQL.format(row='projects')}, 'projects_created', COUNT(*) FROM projects GROUP BY 1""")
+    c.execute(f"""INSERT INTO monthly_counters (month, metric, count)
+                  SELECT {_CREATED_MONTH_SQL.format(row='tasks')}, 'tasks_created', COUNT(*) FROM tasks GROUP BY 1""")
+    c.execute(f"""INSERT INTO monthly_counters (month, metric, count)
+                  SELECT {_DONE_MONTH_SQL.format(row='tasks')}, 'tasks_done', COUNT(*) FROM tasks WHERE status = 'Done' GROUP BY 1""")
+
+def _migration_003_monthly_counters(c):
+    """Tabel rollup bulanan untuk statistik dashboard, dijaga oleh trigger."""
+    c.execute("""CREATE TABLE IF NOT EXISTS monthly_counters (
+                month TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, metric)
+              ) WITHOUT ROWID""")
+    _rebuild_monthly_counters(c)
+
+    def bump(metric, month_sql, delta):
+        return f"""INSERT INTO monthly_counters (month, metric, count) VALUES ({month_sql}, '{metric}', {delta})
+                   ON CONFLICT(month, metric) DO UPDATE SET count = count + ({delta});"""
+
+    # Trigger juga berjalan untuk penghapusan via ON DELETE CASCADE
+    triggers = {
+        "trg_projects_counter_insert": ("AFTER INSERT ON projects",
+                                        bump('projects_created', _CREATED_MONTH_SQL.format(row='NEW'), 1)),
+        "trg_projects_counter_delete": ("AFTER DELETE ON projects",
+                                        bump('projects_created', _CREATED_MONTH_SQL.format(row='OLD'), -1)),
+        "trg_tasks_counter_insert": ("AFTER INSERT ON tasks",
+                                     bump('tasks_created', _CREATED_MONTH_SQL.format(row='NEW'), 1)),
+        "trg_tasks_counter_delete": ("AFTER DELETE ON tasks",
+                                     bump('tasks_created', _CREATED_MONTH_SQL.format(row='OLD'), -1)),
+        "trg_tasks_done_counter_insert": ("AFTER INSERT ON tasks WHEN NEW.status = 'Done'",
+                                          bump('tasks_done', _DONE_MONTH_SQL.format(row='NEW'), 1)),
+        "trg_tasks_done_counter_delete": ("AFTER DELETE ON tasks WHEN OLD.status = 'Done'",
+                                          bump('tasks_done', _DONE_MONTH_SQL.format(row='OLD'), -1)),
+        # Perubahan status/tanggal selesai: keluarkan dari bulan lama, masukkan ke bulan baru
+        "trg_tasks_done_counter_update_old": ("AFTER UPDATE OF status, completed_at ON tasks WHEN OLD.status = 'Done'",
+                                              bump('tasks_done', _DONE_MONTH_SQL.format(row='OLD'), -1)),
+        "trg_tasks_done_counter_update_new": ("AFTER UPDATE OF status, completed_at ON tasks WHEN NEW.status = 'Done'",
+                                              bump('tasks_done', _DONE_MONTH_SQL.format(row='NEW'), 1)),
+    }
+    for name, (event, body) in triggers.items():
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+
+def _migration_004_audit_filter_indexes(c):
+    """Index untuk filter jejak audit per pengguna dan per aksi (urut waktu)."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_audit_trail_user_timestamp ON audit_trail(user_id, timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_audit_trail_action_timestamp ON audit_trail(action, timestamp)")
+
+def _backfill_chat_read_state(c):
+    """Cursor baca awal dari flag is_read lama, untuk anggota proyek dan Admin/Manager."""
+    c.execute("""INSERT OR IGNORE INTO chat_read_state (project_id, user_id, last_read_id)
+                 SELECT ch.project_id, viewer.user_id, MAX(ch.id)
+                 FROM chats ch
+                 JOIN (SELECT project_id, user_id FROM project_members
+                       UNION
+                       SELECT p.id, u.id FROM projects p, users u WHERE u.role IN ('Admin', 'Manager')) viewer
+                   ON viewer.project_id = ch.project_id
+                 WHERE ch.is_read = 1
+                 GROUP BY ch.project_id, viewer.user_id""")
+
+def _migration_005_chat_read_state(c):
+    """Cursor baca per pengguna untuk chat proyek, menggantikan flag global chats.is_read."""
+    c.execute("""CREATE TABLE IF NOT EXISTS chat_read_state (
+                project_id INTEGER NOT NULL,
+                user_id TEXT NOT NULL,
+                last_read_id INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (project_id, user_id),
+                FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+              ) WITHOUT ROWID""")
+    _backfill_chat_read_state(c)
+    # Hitung belum dibaca = range id > last_read_id per proyek (rowid ikut di dalam index)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_chats_project ON chats(project_id)")
+    c.execute("DROP INDEX IF EXISTS idx_chats_project_read")
+
+def _migration_006_conversations(c):
+    """Percakapan direct chat per pasangan user (user_a <= user_b) beserta pesan terakhir dan unread."""
+    c.execute("""CREATE TABLE IF NOT EXISTS conversations (
+                id INTEGER PRIMARY KEY,
+                user_a TEXT NOT NULL,
+                user_b TEXT NOT NULL,
+                last_message_id INTEGER,
+                last_message_at TEXT,
+                unread_a INTEGER NOT NULL DEFAULT 0,
+                unread_b INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (user_a, user_b),
+                CHECK (user_a <= user_b),
+                FOREIGN KEY (user_a) REFERENCES users(id),
+                FOREIGN KEY (user_b) REFERENCES users(id)
+              )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_conversations_user_b ON conversations(user_b)")
+    _add_column_if_missing(c, 'direct_chats', 'conversation_id', 'INTEGER REFERENCES conversations(id)')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_direct_chats_conversation ON direct_chats(conversation_id, id)")
+
+    # Isi dari pesan yang sudah ada; unread diambil dari flag is_read lama
+    c.execute("""INSERT OR IGNORE INTO conversations (user_a, user_b)
+                 SELECT DISTINCT MIN(sender_id, receiver_id), MAX(sender_id, receiver_id) FROM direct_chats""")
+    c.execute("""UPDATE direct_chats SET conversation_id = (
+                     SELECT id FROM conversations
+                     WHERE user_a = MIN(direct_chats.sender_id, direct_chats.receiver_id)
+                       AND user_b = MAX(direct_chats.sender_id, direct_chats.receiver_id))
+                 WHERE conversation_id IS NULL""")
+    c.execute("""UPDATE conversations SET
+                     last_message_id = (SELECT MAX(id) FROM direct_chats WHERE conversation_id = conversations.id),
+                     unread_a = (SELECT COUNT(*) FROM direct_chats
+                                 WHERE conversation_id = conversations.id AND receiver_id = conversations.user_a
+                                   AND sender_id != receiver_id AND is_read = 0),
+                     unread_b = (SELECT COUNT(*) FROM direct_chats
+                                 WHERE conversation_id = conversations.id AND receiver_id = conversations.user_b
+                                   AND sender_id != receiver_id AND is_read = 0)""")
+    c.execute("""UPDATE conversations SET last_message_at = (SELECT timestamp FROM direct_chats WHERE id = conversations.last_message_id)""")
+
+    # Digantikan oleh conversations dan idx_direct_chats_conversation
+    c.execute("DROP INDEX IF EXISTS idx_direct_chats_pair")
+    c.execute("DROP INDEX IF EXISTS idx_direct_chats_receiver_read")
+
+# Kolom yang diindeks full-text untuk pencarian proyek, beserta bobot bm25 per kolom
+PROJECT_SEARCH_COLUMNS = ("name", "part_name", "part_number", "customer", "model", "description")
+PROJECT_SEARCH_WEIGHTS = (10.0, 5.0, 8.0, 3.0, 3.0, 1.0)
+
+def _create_fts_index(c, table, columns):
+    """Tabel FTS5 `<table>_fts` (external content) atas `columns`, disinkronkan oleh trigger lalu diisi ulang."""
+    fts_table = f"{table}_fts"
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{col}" for col in columns)
+    old_values = ", ".join(f"old.{col}" for col in columns)
+    c.execute(f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+                {column_list},
+                content='{table}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+              )""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_insert AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.id, {new_values});
+                  END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_delete AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                  END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_update AFTER UPDATE ON {table} BEGIN
+                    INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                    INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.id, {new_values});
+                  END""")
+    c.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+
+def _migration_007_projects_fts(c):
+    """Index FTS5 (external content) atas tabel projects, disinkronkan oleh trigger."""
+    _create_fts_index(c, "projects", PROJECT_SEARCH_COLUMNS)
+
+def _migration_008_message_fts(c):
+    """Index FTS5 atas pesan chat proyek, direct message, dan detail jejak audit.
+
+    Jejak audit yang sudah diarsipkan tidak ikut diindeks.
+    """
+    _create_fts_index(c, "chats", ("message",))
+    _create_fts_index(c, "direct_chats", ("message",))
+    _create_fts_index(c, "audit_trail", ("details",))
+
+# Format baku kolom waktu: timestamp "YYYY-MM-DD HH:MM:SS" (waktu lokal) dan tanggal "YYYY-MM-DD"
+TIMESTAMP_COLUMNS = {
+    "projects": ("created_at",),
+    "tasks": ("created_at", "actual_start", "completed_at"),
+    "chats": ("timestamp",),
+    "direct_chats": ("timestamp",),
+    "audit_trail": ("timestamp",),
+}
+DATE_COLUMNS = {"tasks": ("due_date",)}
+
+# Kolom generated (VIRTUAL) turunan kolom waktu: (tabel, kolom, ekspresi)
+TIME_DERIVED_COLUMNS = (
+    ("projects", "created_epoch", "CAST(strftime('%s', created_at) AS INTEGER)"),
+    ("projects", "created_month", "strftime('%Y-%m', created_at)"),
+    ("tasks", "created_epoch", "CAST(strftime('%s', created_at) AS INTEGER)"),
+    ("tasks", "created_month", "strftime('%Y-%m', created_at)"),
+    ("tasks", "due_epoch", "CAST(strftime('%s', due_date) AS INTEGER)"),
+    ("tasks", "actual_start_epoch", "CAST(strftime('%s', actual_start) AS INTEGER)"),
+    ("tasks", "completed_epoch", "CAST(strftime('%s', completed_at) AS INTEGER)"),
+    ("tasks", "completed_month", "strftime('%Y-%m', completed_at)"),
+    ("chats", "timestamp_epoch", "CAST(strftime('%s', timestamp) AS INTEGER)"),
+    ("chats", "timestamp_month", "strftime('%Y-%m', timestamp)"),
+    ("direct_chats", "timestamp_epoch", "CAST(strftime('%s', timestamp) AS INTEGER)"),
+    ("direct_chats", "timestamp_month", "strftime('%Y-%m', timestamp)"),
+    ("audit_trail", "timestamp_epoch", "CAST(strftime('%s', timestamp) AS INTEGER)"),
+    ("audit_trail", "timestamp_month", "strftime('%Y-%m', timestamp)"),
+)
+
+def _migration_009_normalized_timestamps(c):
+    """Menyeragamkan kolom waktu ke ISO-8601 dan menambah kolom epoch/bulan generated beserta index.
+
+    Nilai yang tidak bisa dibaca fungsi tanggal SQLite dibiarkan apa adanya (kolom turunannya NULL).
+    Epoch dihitung dari waktu lokal apa adanya, jadi dikonversi balik tanpa zona waktu.
+    """
+    for time_format, columns_by_table in (("%Y-%m-%d %H:%M:%S", TIMESTAMP_COLUMNS), ("%Y-%m-%d", DATE_COLUMNS)):
+        for table, columns in columns_by_table.items():
+            for column in columns:
+                c.execute(f"""UPDATE {table} SET {column} = strftime('{time_format}', {column})
+                              WHERE {column} IS NOT NULL AND {column} != strftime('{time_format}', {column})""")
+    # Bulan dibuat proyek/task bisa berubah, hitung ulang rollup dari awal
+    _rebuild_monthly_counters(c)
+    
+    for table, column, expression in TIME_DERIVED_COLUMNS:
+        _add_column_if_missing(c, table, column, f"INTEGER GENERATED ALWAYS AS ({expression}) VIRTUAL"
+                               if column.endswith("_epoch") else f"TEXT GENERATED ALWAYS AS ({expression}) VIRTUAL")
+    # Bucket bulanan dan pemindaian task lewat batas waktu
+    c.execute("CREATE INDEX IF NOT EXISTS idx_projects_created_month ON projects(created_month)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_created_month ON tasks(created_month)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_completed_month ON tasks(completed_month)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_overdue ON tasks(due_epoch) WHERE status != 'Done'")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_audit_trail_month ON audit_trail(timestamp_month)")
+
+def _migration_010_project_member_history(c):
+    """Riwayat penambahan dan pengeluaran anggota proyek."""
+    c.execute("""CREATE TABLE IF NOT EXISTS project_member_history (
+                id INTEGER PRIMARY KEY,
+                project_id INTEGER NOT NULL,
+                user_id TEXT NOT NULL,
+                change TEXT NOT NULL CHECK (change IN ('added', 'removed')),
+                changed_by TEXT,
+                changed_at TEXT NOT NULL,
+                FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE
+              )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_project_member_history_project ON project_member_history(project_id, id)")
+
+def _attachment_metadata(filepath, original_name, mime_type=None, kind=None):
+    """Metadata lampiran chat dari file yang tersimpan: MIME, ukuran, hash SHA-256, dan dimensi gambar.
+
+    Bila file sudah tidak ada, ukuran/hash/dimensi dibiarkan None dan `missing` bernilai True.
+    """
+    mime_type = mime_type or mimetypes.guess_type(original_name)[0] or "application/octet-stream"
+    attachment = {"kind": kind or ("image" if mime_type.startswith("image/") else "file"), "filepath": filepath,
+                  "original_name": original_name, "mime_type": mime_type,
+                  "size": None, "width": None, "height": None, "sha256": None, "missing": False}
+    try:
+        digest = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+            attachment["size"] = f.tell()
+        attachment["sha256"] = digest.hexdigest()
+    except OSError:
+        attachment["missing"] = True
+        return attachment
+    if attachment["kind"] == "image" and Image is not None:
+        try:
+            with Image.open(filepath) as image:
+                attachment["width"], attachment["height"] = image.size
+        except (OSError, Image.DecompressionBombError):
+            pass
+    return attachment
+
+def _parse_attachment_markup(message):
+    """Memecah pesan lama berformat "teks [IMAGE]path" / "teks [FILE]path|nama".
+
+    Mengembalikan (teks, kind, path, nama_asli), atau None bila tidak ada markup yang valid.
+    """
+    if "[IMAGE]" in message:
+        text, filepath = message.split("[IMAGE]", 1)
+        filepath = filepath.strip()
+        # Nama file tersimpan: chat_<uuid>_<nama asli>
+        stored_name = os.path.basename(filepath)
+        original_name = stored_name.split("_", 2)[2] if stored_name.startswith("chat_") and stored_name.count("_") >= 2 else stored_name
+        return text.strip(), "image", filepath, original_name
+    if "[FILE]" in message:
+        text, file_field = message.split("[FILE]", 1)
+        if "|" not in file_field:
+            return None
+        filepath, original_name = file_field.strip().split("|", 1)
+        return text.strip(), "file", filepath.strip(), original_name.strip()
+    return None
+
+def _store_chat_attachment(c, attachment, chat_id=None, direct_chat_id=None):
+    """Menyimpan kolom dasar lampiran chat (skema migrasi 011, yang juga memanggil fungsi ini)."""
+    c.execute("""INSERT INTO chat_attachments (chat_id, direct_chat_id, kind, filepath, original_name, mime_type, size, width, height, sha256)
+                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+              (chat_id, direct_chat_id, attachment["kind"], attachment["filepath"], attachment["original_name"],
+               attachment["mime_type"], attachment["size"], attachment["width"], attachment["height"], attachment["sha256"]))
+    return c.lastrowid
+
+def _migration_011_chat_attachments(c):
+    """Tabel lampiran chat. Markup [IMAGE]/[FILE] di teks pesan lama dipindahkan ke tabel ini."""
+    c.execute("""CREATE TABLE IF NOT EXISTS chat_attachments (
+                id INTEGER PRIMARY KEY,
+                chat_id INTEGER,
+                direct_chat_id INTEGER,
+                kind TEXT NOT NULL CHECK (kind IN ('image', 'file')),
+                filepath TEXT NOT NULL,
+                original_name TEXT NOT NULL,
+                mime_type TEXT NOT NULL,
+                size INTEGER,
+                width INTEGER,
+                height INTEGER,
+                sha256 TEXT,
+                CHECK ((chat_id IS NULL) != (direct_chat_id IS NULL)),
+                FOREIGN KEY (chat_id) REFERENCES chats(id) ON DELETE CASCADE,
+                FOREIGN KEY (direct_chat_id) REFERENCES direct_chats(id) ON DELETE CASCADE
+              )""")
+    # Satu lampiran per pesan, sehingga LEFT JOIN di loader tidak menggandakan baris
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_attachments_chat ON chat_attachments(chat_id) WHERE chat_id IS NOT NULL")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_attachments_direct_chat ON chat_attachments(direct_chat_id) WHERE direct_chat_id IS NOT NULL")
     
-    # Bersihkan data orphan lainnya
-    c.execute("""DELETE FROM tasks 
-                 WHERE project_id NOT IN (SELECT id FROM projects)""")
+    for table, id_column in (("chats", "chat_id"), ("direct_chats", "direct_chat_id")):
+        c.execute(f"SELECT id, message FROM {table} WHERE message LIKE '%[IMAGE]%' OR message LIKE '%[FILE]%'")
+        for message_id, message in c.fetchall():
+            parsed = _parse_attachment_markup(message)
+            if parsed is None:
+                continue
+            text, kind, filepath, original_name = parsed
+            _store_chat_attachment(c, _attachment_metadata(filepath, original_name, kind=kind), **{id_column: message_id})
+            c.execute(f"UPDATE {table} SET message = ? WHERE id = ?", (text, message_id))
+
+def _migration_012_chat_media_folder(c):
+    """Memindahkan file lampiran chat ke CHAT_MEDIA_FOLDER agar bisa disajikan lewat URL statis.
+
+    Aman diulang: file yang sudah terlanjur dipindah (transaksi sebelumnya gagal) cukup diperbarui path-nya.
+    File yang sudah tidak ada dibiarkan dengan path lamanya.
+    """
+    os.makedirs(CHAT_MEDIA_FOLDER, exist_ok=True)
+    c.execute("SELECT id, filepath FROM chat_attachments")
+    for attachment_id, filepath in c.fetchall():
+        media_path = os.path.join(CHAT_MEDIA_FOLDER, os.path.basename(filepath))
+        if os.path.normpath(filepath) == os.path.normpath(media_path):
+            continue
+        if os.path.exists(filepath) and not os.path.exists(media_path):
+            shutil.move(filepath, media_path)
+        if os.path.exists(media_path):
+            c.execute("UPDATE chat_attachments SET filepath = ? WHERE id = ?", (media_path, attachment_id))
+
+def _migration_013_chat_thumbnails(c):
+    """Kolom thumbnail lampiran gambar chat (diisi saat upload atau lewat backfill-thumbnails)."""
+    _add_column_if_missing(c, "chat_attachments", "thumb_path", "TEXT")
+    _add_column_if_missing(c, "chat_attachments", "thumb_width", "INTEGER")
+    _add_column_if_missing(c, "chat_attachments", "thumb_height", "INTEGER")
+
+def _migration_014_drop_chat_timestamp_index(c):
+    """Chat proyek dipaging dan dihitung berdasarkan (project_id, id) yang sudah dicakup
+    idx_chats_project, jadi index per timestamp hanya menambah biaya setiap insert."""
+    c.execute("DROP INDEX IF EXISTS idx_chats_project_timestamp")
+
+def _migration_015_chat_attachment_missing_flag(c):
+    """Penanda lampiran chat yang file-nya sudah tidak ada, supaya render chat tidak memeriksa file per pesan."""
+    _add_column_if_missing(c, "chat_attachments", "missing", "INTEGER NOT NULL DEFAULT 0")
+    c.execute("SELECT id, filepath FROM chat_attachments")
+    missing_ids = [(attachment_id,) for attachment_id, filepath in c.fetchall() if not os.path.isfile(filepath)]
+    c.executemany("UPDATE chat_attachments SET missing = 1 WHERE id = ?", missing_ids)
+
+MIGRATIONS = [
+    (1, "Skema dasar", _migration_001_initial_schema),
+    (2, "Index untuk query utama", _migration_002_query_indexes),
+    (3, "Rollup statistik bulanan", _migration_003_monthly_counters),
+    (4, "Index filter jejak audit", _migration_004_audit_filter_indexes),
+    (5, "Cursor baca chat proyek per pengguna", _migration_005_chat_read_state),
+    (6, "Percakapan direct chat", _migration_006_conversations),
+    (7, "Pencarian full-text proyek", _migration_007_projects_fts),
+    (8, "Pencarian full-text pesan dan jejak audit", _migration_008_message_fts),
+    (9, "Kolom waktu baku dengan epoch dan bulan", _migration_009_normalized_timestamps),
+    (10, "Riwayat anggota proyek", _migration_010_project_member_history),
+    (11, "Tabel lampiran chat", _migration_011_chat_attachments),
+    (12, "File lampiran chat disajikan sebagai file statis", _migration_012_chat_media_folder),
+    (13, "Thumbnail lampiran gambar chat", _migration_013_chat_thumbnails),
+    (14, "Hapus index chat per timestamp yang tidak terpakai", _migration_014_drop_chat_timestamp_index),
+    (15, "Penanda file lampiran chat yang hilang", _migration_015_chat_attachment_missing_flag),
+]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def run_migrations():
+    """Menjalankan migrasi yang belum diterapkan, masing-masing dalam satu transaksi."""
+    applied = []
+    with db_transaction() as conn:
+        for version, description, migrate in MIGRATIONS:
+            if version <= get_schema_version(conn):
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Cek ulang di dalam lock, proses lain mungkin sudah menerapkannya
+                if version > get_schema_version(conn):
+                    migrate(conn.cursor())
+                    conn.execute(f"PRAGMA user_version = {version}")
+                    applied.append((version, description))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+    for version, description in applied:
+        print(f"🛠️ Migrasi {version:03d} diterapkan: {description}")
+    return applied
+
+# --- Inisialisasi Database dan Folder Uploads ---
+def create_db_and_tables():
+    """Menerapkan migrasi skema dan membuat akun default jika belum ada."""
+    if not os.path.exists(UPLOAD_FOLDER):
+        os.makedirs(UPLOAD_FOLDER)
+    os.makedirs(CHAT_MEDIA_FOLDER, exist_ok=True)
+
+    run_migrations()
+
+    with db_transaction() as conn:
+        c = conn.cursor()
+
+        # Check and add 3 default users if they don't exist
+        c.execute("SELECT COUNT(*) FROM users")
+        if c.fetchone()[0] == 0:
+            hashed_dev_pw = hashlib.sha256(DEFAULT_DEV_PASSWORD.encode()).hexdigest()
+            c.execute("INSERT INTO users (id, password, fullname, departemen, seksi, role, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      (ADMIN_ID, hashed_dev_pw, "Main Admin", "Information System", "Information Technology", "Admin", "approved"))
+            c.execute("INSERT INTO users (id, password, fullname, departemen, seksi, role, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      ("M123", hashed_dev_pw, "Manager", "Foundry Csm", "Foundry Central", "Manager", "approved"))
+            c.execute("INSERT INTO users (id, password, fullname, departemen, seksi, role, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      ("S123", hashed_dev_pw, "Supervisor", "Foundry Csm", "Finishing 2W", "Supervisor", "approved"))
+
+        # Bersihkan data orphan (data project_members yang tidak ada project-nya)
+        c.execute("""DELETE FROM project_members 
+                     WHERE project_id NOT IN (SELECT id FROM projects)""")
     
-    c.execute("""DELETE FROM chats 
-                 WHERE project_id NOT IN (SELECT id FROM projects)""")
+        # Bersihkan data orphan lainnya
+        c.execute("""DELETE FROM tasks 
+                     WHERE project_id NOT IN (SELECT id FROM projects)""")
     
-    conn.commit()
-    conn.close()
+        c.execute("""DELETE FROM chats 
+                     WHERE project_id NOT IN (SELECT id FROM projects)""")
+    get_user_directory().invalidate()
+    get_read_cache().invalidate()
 
-create_db_and_tables()
+@st.cache_resource
+def bootstrap_database():
+    """Inisialisasi database sekali per proses, bukan pada setiap rerun Streamlit."""
+    create_db_and_tables()
+    return True
+
+bootstrap_database()
 
 # --- Fungsi Dummy Data ---
 def create_dummy_data():
     """Membuat data dummy lengkap untuk demo aplikasi."""
-    conn = get_db_connection()
-    c = conn.cursor()
+    with db_reader() as conn:
+        has_projects = conn.execute("SELECT COUNT(*) FROM projects").fetchone()[0] > 0
     
     # Cek apakah sudah ada project
-    c.execute("SELECT COUNT(*) FROM projects")
-    if c.fetchone()[0] > 0:
-        conn.close()
+    if has_projects:
         return  # Sudah ada data, tidak perlu membuat dummy
     
     try:
-        hashed_dev_pw = hashlib.sha256(DEFAULT_DEV_PASSWORD.encode()).hexdigest()
-        
-        # Tambah beberapa user dummy (Staff dan Supervisor)
-        dummy_users = [
-            ("E001", "Budi Santoso", "Production Machining", "Machining 1", "Staff"),
-            ("E002", "Siti Nurhaliza", "Quality Assurance", "Qa Inspection", "Staff"),
-            ("E003", "Ahmad Wijaya", "Development & Trial", "Development", "Staff"),
-            ("E004", "Rina Mulyani", "Production Equipment Engineering", "Machining Equipment", "Supervisor"),
-            ("E005", "Doni Prakoso", "Foundry Csm", "Melting Disamatic", "Staff"),
-            ("E006", "Maya Sari", "Quality Control", "Laboratory", "Staff"),
-            ("E007", "Eko Susanto", "Maintenance", "Maintenance Mc", "Supervisor"),
-            ("E008", "Lina Wati", "Information System", "Information Technology", "Staff"),
-        ]
-        
-        for user_id, fullname, dept, seksi, role in dummy_users:
-            c.execute("SELECT COUNT(*) FROM users WHERE id = ?", (user_id,))
-            if c.fetchone()[0] == 0:
-                c.execute("INSERT INTO users (id, password, fullname, departemen, seksi, role, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                         (user_id, hashed_dev_pw, fullname, dept, seksi, role, "approved"))
-        
-        # Buat beberapa project dummy
-        projects_data = [
-            {
-                "name": "Development Part Crankcase CB150",
-                "description": "Pengembangan part crankcase untuk motor CB150 dengan material ADC12. Project ini melibatkan redesign untuk meningkatkan kekuatan dan mengurangi cacat produksi.",
-                "part_name": "Crankcase Upper",
-                "part_number": "CB150-CC-001",
-                "customer": "PT. Astra Honda Motor",
-                "model": "CB150R 2024",
-                "creator_id": "M123",
-                "members": ["M123", "S123", "E001", "E003", "E002"],
-                "created_at": (datetime.now() - timedelta(days=45)).strftime("%Y-%m-%d %H:%M:%S")
-            },
-            {
-                "name": "Quality Improvement - Cylinder Head",
-                "description": "Proyek perbaikan kualitas untuk mengurangi reject rate pada proses machining cylinder head. Target pengurangan reject dari 5% menjadi 2%.",
-                "part_name": "Cylinder Head",
-                "part_number": "YZ250-CH-008",
-                "customer": "PT. Yamaha Indonesia",
-                "model": "YZF-R25 2024",
-                "creator_id": "M123",
-                "members": ["M123", "E002", "E004", "E006", "E007"],
-                "created_at": (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
-            },
-            {
-                "name": "New Tooling Development - Transmission Case",
-                "description": "Pembuatan tooling baru untuk part transmission case dengan teknologi high pressure die casting. Project ini juga melibatkan trial produksi dan validasi.",
-                "part_name": "Transmission Case",
-                "part_number": "KW200-TC-015",
-                "customer": "PT. Kawasaki Motor Indonesia",
-                "model": "Ninja 250SL",
-                "creator_id": "M123",
-                "members": ["M123", "S123", "E003", "E005", "E001"],
-                "created_at": (datetime.now() - timedelta(days=60)).strftime("%Y-%m-%d %H:%M:%S")
-            },
-            {
-                "name": "Maintenance System Upgrade",
-                "description": "Upgrade sistem monitoring maintenance untuk meningkatkan efisiensi downtime equipment. Implementasi IoT sensor dan dashboard realtime.",
-                "part_name": "System Software",
-                "part_number": "MAIN-SYS-2024",
-                "customer": "Internal Project",
-                "model": "Version 2.0",
-                "creator_id": "admin123",
-                "members": ["admin123", "E007", "E008", "M123"],
-                "created_at": (datetime.now() - timedelta(days=20)).strftime("%Y-%m-%d %H:%M:%S")
-            }
-        ]
-        
-        project_ids = []
-        for proj_data in projects_data:
-            c.execute("""INSERT INTO projects (name, description, part_name, part_number, customer, model, creator_id, created_at) 
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                     (proj_data["name"], proj_data["description"], proj_data["part_name"], 
-                      proj_data["part_number"], proj_data["customer"], proj_data["model"],
-                      proj_data["creator_id"], proj_data["created_at"]))
-            project_id = c.lastrowid
-            project_ids.append(project_id)
+        with db_transaction() as conn:
+            c = conn.cursor()
+            hashed_dev_pw = hashlib.sha256(DEFAULT_DEV_PASSWORD.encode()).hexdigest()
+        
+            # Tambah beberapa user dummy (Staff dan Supervisor)
+            dummy_users = [
+                ("E001", "Budi Santoso", "Production Machining", "Machining 1", "Staff"),
+                ("E002", "Siti Nurhaliza", "Quality Assurance", "Qa Inspection", "Staff"),
+                ("E003", "Ahmad Wijaya", "Development & Trial", "Development", "Staff"),
+                ("E004", "Rina Mulyani", "Production Equipment Engineering", "Machining Equipment", "Supervisor"),
+                ("E005", "Doni Prakoso", "Foundry Csm", "Melting Disamatic", "Staff"),
+                ("E006", "Maya Sari", "Quality Control", "Laboratory", "Staff"),
+                ("E007", "Eko Susanto", "Maintenance", "Maintenance Mc", "Supervisor"),
+                ("E008", "Lina Wati", "Information System", "Information Technology", "Staff"),
+            ]
+        
+            for user_id, fullname, dept, seksi, role in dummy_users:
+                c.execute("SELECT COUNT(*) FROM users WHERE id = ?", (user_id,))
+                if c.fetchone()[0] == 0:
+                    c.execute("INSERT INTO users (id, password, fullname, departemen, seksi, role, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (user_id, hashed_dev_pw, fullname, dept, seksi, role, "approved"))
+        
+            # Buat beberapa project dummy
+            projects_data = [
+                {
+                    "name": "Development Part Crankcase CB150",
+                    "description": "Pengembangan part crankcase untuk motor CB150 dengan material ADC12. Project ini melibatkan redesign untuk meningkatkan kekuatan dan mengurangi cacat produksi.",
+                    "part_name": "Crankcase Upper",
+                    "part_number": "CB150-CC-001",
+                    "customer": "PT. Astra Honda Motor",
+                    "model": "CB150R 2024",
+                    "creator_id": "M123",
+                    "members": ["M123", "S123", "E001", "E003", "E002"],
+                    "created_at": (datetime.now() - timedelta(days=45)).strftime("%Y-%m-%d %H:%M:%S")
+                },
+                {
+                    "name": "Quality Improvement - Cylinder Head",
+                    "description": "Proyek perbaikan kualitas untuk mengurangi reject rate pada proses machining cylinder head. Target pengurangan reject dari 5% menjadi 2%.",
+                    "part_name": "Cylinder Head",
+                    "part_number": "YZ250-CH-008",
+                    "customer": "PT. Yamaha Indonesia",
+                    "model": "YZF-R25 2024",
+                    "creator_id": "M123",
+                    "members": ["M123", "E002", "E004", "E006", "E007"],
+                    "created_at": (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+                },
+                {
+                    "name": "New Tooling Development - Transmission Case",
+                    "description": "Pembuatan tooling baru untuk part transmission case dengan teknologi high pressure die casting. Project ini juga melibatkan trial produksi dan validasi.",
+                    "part_name": "Transmission Case",
+                    "part_number": "KW200-TC-015",
+                    "customer": "PT. Kawasaki Motor Indonesia",
+                    "model": "Ninja 250SL",
+                    "creator_id": "M123",
+                    "members": ["M123", "S123", "E003", "E005", "E001"],
+                    "created_at": (datetime.now() - timedelta(days=60)).strftime("%Y-%m-%d %H:%M:%S")
+                },
+                {
+                    "name": "Maintenance System Upgrade",
+                    "description": "Upgrade sistem monitoring maintenance untuk meningkatkan efisiensi downtime equipment. Implementasi IoT sensor dan dashboard realtime.",
+                    "part_name": "System Software",
+                    "part_number": "MAIN-SYS-2024",
+                    "customer": "Internal Project",
+                    "model": "Version 2.0",
+                    "creator_id": "admin123",
+                    "members": ["admin123", "E007", "E008", "M123"],
+                    "created_at": (datetime.now() - timedelta(days=20)).strftime("%Y-%m-%d %H:%M:%S")
+                }
+            ]
+        
+            project_ids = []
+            for proj_data in projects_data:
+                c.execute("""INSERT INTO projects (name, description, part_name, part_number, customer, model, creator_id, created_at) 
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                         (proj_data["name"], proj_data["description"], proj_data["part_name"], 
+                          proj_data["part_number"], proj_data["customer"], proj_data["model"],
+                          proj_data["creator_id"], proj_data["created_at"]))
+                project_id = c.lastrowid
+                project_ids.append(project_id)
             
-            # Tambahkan members
-            for member_id in proj_data["members"]:
-                c.execute("INSERT INTO project_members (project_id, user_id) VALUES (?, ?)", (project_id, member_id))
+                # Tambahkan members
+                for member_id in proj_data["members"]:
+                    c.execute("INSERT INTO project_members (project_id, user_id) VALUES (?, ?)", (project_id, member_id))
         
-        # Buat tasks untuk setiap project
-        tasks_data = [
-            # Project 1: Development Part Crankcase CB150
-            [
-                {"title": "Design Review & Material Selection", "pic_id": "E003", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=40)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 42},
-                {"title": "CAD Design & Simulation", "pic_id": "E003", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=35)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 38},
-                {"title": "Pattern Making & Mold Preparation", "pic_id": "E001", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=25)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 27},
-                {"title": "First Trial Production", "pic_id": "E001", "delegator_id": "S123", "due_date": (datetime.now() - timedelta(days=15)).strftime("%Y-%m-%d"), "status": "Waiting Approval", "days_ago": 16},
-                {"title": "Quality Inspection & Dimensional Check", "pic_id": "E002", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=10)).strftime("%Y-%m-%d"), "status": "In Progress", "days_ago": 12},
-                {"title": "Customer Approval & Documentation", "pic_id": "E002", "delegator_id": "M123", "due_date": (datetime.now() + timedelta(days=5)).strftime("%Y-%m-%d"), "status": "Not Started", "days_ago": None},
-            ],
-            # Project 2: Quality Improvement - Cylinder Head
-            [
-                {"title": "Root Cause Analysis - Reject Issue", "pic_id": "E002", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=25)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 28},
-                {"title": "Process Parameter Optimization", "pic_id": "E004", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=18)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 20},
-                {"title": "Tooling Maintenance & Calibration", "pic_id": "E007", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=12)).strftime("%Y-%m-%d"), "status": "Waiting Approval", "days_ago": 13},
-                {"title": "Trial Run dengan Parameter Baru", "pic_id": "E004", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=5)).strftime("%Y-%m-%d"), "status": "In Progress", "days_ago": 6},
-                {"title": "Statistical Analysis & Report", "pic_id": "E006", "delegator_id": "M123", "due_date": (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d"), "status": "Not Started", "days_ago": None},
-            ],
-            # Project 3: New Tooling Development - Transmission Case
-            [
-                {"title": "Tooling Specification & Design", "pic_id": "E003", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=55)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 57},
-                {"title": "Supplier Selection & PO", "pic_id": "S123", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=50)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 52},
-                {"title": "Tooling Fabrication Monitoring", "pic_id": "E003", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 32},
-                {"title": "Tooling Installation & Setup", "pic_id": "E005", "delegator_id": "S123", "due_date": (datetime.now() - timedelta(days=15)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 17},
-                {"title": "First Casting Trial", "pic_id": "E005", "delegator_id": "S123", "due_date": (datetime.now() - timedelta(days=8)).strftime("%Y-%m-%d"), "status": "Waiting Approval", "days_ago": 9},
-                {"title": "Quality Validation", "pic_id": "E001", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=2)).strftime("%Y-%m-%d"), "status": "In Progress", "days_ago": 3},
-                {"title": "Mass Production Preparation", "pic_id": "E001", "delegator_id": "M123", "due_date": (datetime.now() + timedelta(days=10)).strftime("%Y-%m-%d"), "status": "Not Started", "days_ago": None},
-            ],
-            # Project 4: Maintenance System Upgrade
-            [
-                {"title": "System Requirement Analysis", "pic_id": "E008", "delegator_id": "admin123", "due_date": (datetime.now() - timedelta(days=18)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 19},
-                {"title": "IoT Sensor Installation", "pic_id": "E007", "delegator_id": "admin123", "due_date": (datetime.now() - timedelta(days=12)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 14},
-                {"title": "Dashboard Development", "pic_id": "E008", "delegator_id": "admin123", "due_date": (datetime.now() - timedelta(days=5)).strftime("%Y-%m-%d"), "status": "In Progress", "days_ago": 6},
-                {"title": "User Training & Documentation", "pic_id": "E008", "delegator_id": "admin123", "due_date": (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d"), "status": "Not Started", "days_ago": None},
-                {"title": "System Go-Live", "pic_id": "admin123", "delegator_id": "admin123", "due_date": (datetime.now() + timedelta(days=15)).strftime("%Y-%m-%d"), "status": "Not Started", "days_ago": None},
+            # Buat tasks untuk setiap project
+            tasks_data = [
+                # Project 1: Development Part Crankcase CB150
+                [
+                    {"title": "Design Review & Material Selection", "pic_id": "E003", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=40)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 42},
+                    {"title": "CAD Design & Simulation", "pic_id": "E003", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=35)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 38},
+                    {"title": "Pattern Making & Mold Preparation", "pic_id": "E001", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=25)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 27},
+                    {"title": "First Trial Production", "pic_id": "E001", "delegator_id": "S123", "due_date": (datetime.now() - timedelta(days=15)).strftime("%Y-%m-%d"), "status": "Waiting Approval", "days_ago": 16},
+                    {"title": "Quality Inspection & Dimensional Check", "pic_id": "E002", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=10)).strftime("%Y-%m-%d"), "status": "In Progress", "days_ago": 12},
+                    {"title": "Customer Approval & Documentation", "pic_id": "E002", "delegator_id": "M123", "due_date": (datetime.now() + timedelta(days=5)).strftime("%Y-%m-%d"), "status": "Not Started", "days_ago": None},
+                ],
+                # Project 2: Quality Improvement - Cylinder Head
+                [
+                    {"title": "Root Cause Analysis - Reject Issue", "pic_id": "E002", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=25)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 28},
+                    {"title": "Process Parameter Optimization", "pic_id": "E004", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=18)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 20},
+                    {"title": "Tooling Maintenance & Calibration", "pic_id": "E007", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=12)).strftime("%Y-%m-%d"), "status": "Waiting Approval", "days_ago": 13},
+                    {"title": "Trial Run dengan Parameter Baru", "pic_id": "E004", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=5)).strftime("%Y-%m-%d"), "status": "In Progress", "days_ago": 6},
+                    {"title": "Statistical Analysis & Report", "pic_id": "E006", "delegator_id": "M123", "due_date": (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d"), "status": "Not Started", "days_ago": None},
+                ],
+                # Project 3: New Tooling Development - Transmission Case
+                [
+                    {"title": "Tooling Specification & Design", "pic_id": "E003", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=55)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 57},
+                    {"title": "Supplier Selection & PO", "pic_id": "S123", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=50)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 52},
+                    {"title": "Tooling Fabrication Monitoring", "pic_id": "E003", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 32},
+                    {"title": "Tooling Installation & Setup", "pic_id": "E005", "delegator_id": "S123", "due_date": (datetime.now() - timedelta(days=15)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 17},
+                    {"title": "First Casting Trial", "pic_id": "E005", "delegator_id": "S123", "due_date": (datetime.now() - timedelta(days=8)).strftime("%Y-%m-%d"), "status": "Waiting Approval", "days_ago": 9},
+                    {"title": "Quality Validation", "pic_id": "E001", "delegator_id": "M123", "due_date": (datetime.now() - timedelta(days=2)).strftime("%Y-%m-%d"), "status": "In Progress", "days_ago": 3},
+                    {"title": "Mass Production Preparation", "pic_id": "E001", "delegator_id": "M123", "due_date": (datetime.now() + timedelta(days=10)).strftime("%Y-%m-%d"), "status": "Not Started", "days_ago": None},
+                ],
+                # Project 4: Maintenance System Upgrade
+                [
+                    {"title": "System Requirement Analysis", "pic_id": "E008", "delegator_id": "admin123", "due_date": (datetime.now() - timedelta(days=18)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 19},
+                    {"title": "IoT Sensor Installation", "pic_id": "E007", "delegator_id": "admin123", "due_date": (datetime.now() - timedelta(days=12)).strftime("%Y-%m-%d"), "status": "Done", "days_ago": 14},
+                    {"title": "Dashboard Development", "pic_id": "E008", "delegator_id": "admin123", "due_date": (datetime.now() - timedelta(days=5)).strftime("%Y-%m-%d"), "status": "In Progress", "days_ago": 6},
+                    {"title": "User Training & Documentation", "pic_id": "E008", "delegator_id": "admin123", "due_date": (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d"), "status": "Not Started", "days_ago": None},
+                    {"title": "System Go-Live", "pic_id": "admin123", "delegator_id": "admin123", "due_date": (datetime.now() + timedelta(days=15)).strftime("%Y-%m-%d"), "status": "Not Started", "days_ago": None},
+                ]
             ]
-        ]
-        
-        task_ids_by_project = []
-        for proj_idx, project_id in enumerate(project_ids):
-            task_ids = []
-            for task_data in tasks_data[proj_idx]:
-                created_at = (datetime.now() - timedelta(days=task_data.get("days_ago", 0))).strftime("%Y-%m-%d %H:%M:%S") if task_data.get("days_ago") else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                completed_at = None
-                actual_start = None
+        
+            task_ids_by_project = []
+            for proj_idx, project_id in enumerate(project_ids):
+                task_ids = []
+                for task_data in tasks_data[proj_idx]:
+                    created_at = (datetime.now() - timedelta(days=task_data.get("days_ago", 0))).strftime("%Y-%m-%d %H:%M:%S") if task_data.get("days_ago") else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    completed_at = None
+                    actual_start = None
                 
-                if task_data["status"] == "Done":
-                    completed_at = (datetime.now() - timedelta(days=task_data.get("days_ago", 0) - 2)).strftime("%Y-%m-%d %H:%M:%S")
-                    actual_start = (datetime.now() - timedelta(days=task_data.get("days_ago", 0) - 1)).strftime("%Y-%m-%d %H:%M:%S")
-                elif task_data["status"] == "In Progress":
-                    actual_start = (datetime.now() - timedelta(days=task_data.get("days_ago", 1))).strftime("%Y-%m-%d %H:%M:%S")
+                    if task_data["status"] == "Done":
+                        completed_at = (datetime.now() - timedelta(days=task_data.get("days_ago", 0) - 2)).strftime("%Y-%m-%d %H:%M:%S")
+                        actual_start = (datetime.now() - timedelta(days=task_data.get("days_ago", 0) - 1)).strftime("%Y-%m-%d %H:%M:%S")
+                    elif task_data["status"] == "In Progress":
+                        actual_start = (datetime.now() - timedelta(days=task_data.get("days_ago", 1))).strftime("%Y-%m-%d %H:%M:%S")
                 
-                c.execute("""INSERT INTO tasks (project_id, title, pic_id, delegator_id, due_date, status, created_at, completed_at, actual_start) 
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                         (project_id, task_data["title"], task_data["pic_id"], task_data["delegator_id"], 
-                          task_data["due_date"], task_data["status"], created_at, completed_at, actual_start))
-                task_ids.append(c.lastrowid)
-            task_ids_by_project.append(task_ids)
-        
-        # Buat chat messages untuk setiap project
-        chat_messages = [
-            # Project 1: Development Part Crankcase CB150
-            [
-                {"sender_id": "M123", "message": "Tim, kita mulai project development crankcase CB150. Silakan cek detail di task masing-masing.", "days_ago": 45, "hours_ago": 10},
-                {"sender_id": "E003", "message": "Siap Pak! Saya akan mulai dari design review dan material selection.", "days_ago": 45, "hours_ago": 9},
-                {"sender_id": "S123", "message": "Untuk material, apakah tetap pakai ADC12 atau ada alternatif lain?", "days_ago": 45, "hours_ago": 8},
-                {"sender_id": "M123", "message": "Tetap ADC12, sudah approved dari customer. Fokus ke design optimization.", "days_ago": 45, "hours_ago": 7},
-                {"sender_id": "E003", "message": "Update: Design review sudah selesai. Akan lanjut ke CAD modeling.", "days_ago": 40, "hours_ago": 14},
-                {"sender_id": "E001", "message": "CAD design sudah ready ya? Saya perlu untuk persiapan pattern making.", "days_ago": 35, "hours_ago": 10},
-                {"sender_id": "E003", "message": "Sudah, saya share file CAD-nya via email. Ada 3 variant design.", "days_ago": 35, "hours_ago": 9},
-                {"sender_id": "E001", "message": "Pattern making selesai. Mold sudah siap untuk trial production.", "days_ago": 25, "hours_ago": 15},
-                {"sender_id": "S123", "message": "Bagus! Schedule trial production untuk minggu depan ya.", "days_ago": 25, "hours_ago": 14},
-                {"sender_id": "E001", "message": "Trial production sudah selesai. Ada 50 pcs sample. Menunggu QA check.", "days_ago": 15, "hours_ago": 11},
-                {"sender_id": "E002", "message": "Saya sudah terima sample-nya. Akan saya inspect segera.", "days_ago": 15, "hours_ago": 10},
-                {"sender_id": "E002", "message": "Update inspection: Ada minor issue di area fillet radius. Perlu sedikit adjustment.", "days_ago": 12, "hours_ago": 16},
-                {"sender_id": "M123", "message": "Coordinate dengan E001 untuk adjustment. Target submit ke customer akhir bulan ini.", "days_ago": 12, "hours_ago": 15},
-                {"sender_id": "E001", "message": "Adjustment sudah dilakukan. Ready untuk trial ke-2.", "days_ago": 10, "hours_ago": 9},
-            ],
-            # Project 2: Quality Improvement - Cylinder Head
-            [
-                {"sender_id": "M123", "message": "Project quality improvement dimulai. Target kita turunkan reject rate dari 5% ke 2%.", "days_ago": 30, "hours_ago": 10},
-                {"sender_id": "E002", "message": "Siap Pak! Saya akan start dengan root cause analysis.", "days_ago": 30, "hours_ago": 9},
-                {"sender_id": "E006", "message": "Saya bantu dari sisi laboratory testing untuk material analysis.", "days_ago": 30, "hours_ago": 8},
-                {"sender_id": "E002", "message": "Root cause analysis selesai. Main issue ada di process parameter yang tidak konsisten.", "days_ago": 25, "hours_ago": 14},
-                {"sender_id": "E004", "message": "Noted. Saya akan optimize parameter machining-nya.", "days_ago": 25, "hours_ago": 13},
-                {"sender_id": "E007", "message": "Saya cek kondisi tooling juga ya, mungkin perlu maintenance.", "days_ago": 25, "hours_ago": 12},
-                {"sender_id": "E004", "message": "Parameter optimization selesai. Sudah saya dokumentasikan di SOP baru.", "days_ago": 18, "hours_ago": 15},
-                {"sender_id": "E007", "message": "Tooling maintenance & calibration sudah selesai. Semua dalam kondisi optimal.", "days_ago": 12, "hours_ago": 14},
-                {"sender_id": "M123", "message": "Good job team! Sekarang kita trial run dengan parameter baru.", "days_ago": 12, "hours_ago": 13},
-                {"sender_id": "E004", "message": "Trial run sedang berjalan. So far hasilnya promising, reject rate turun drastis.", "days_ago": 5, "hours_ago": 10},
-                {"sender_id": "E006", "message": "Saya standby untuk statistical analysis setelah trial selesai.", "days_ago": 5, "hours_ago": 9},
-            ],
-            # Project 3: New Tooling Development - Transmission Case
-            [
-                {"sender_id": "M123", "message": "Project tooling baru untuk transmission case dimulai. Timeline ketat, 2 bulan harus selesai.", "days_ago": 60, "hours_ago": 10},
-                {"sender_id": "E003", "message": "Design specification sudah saya buat. Akan koordinasi dengan supplier.", "days_ago": 60, "hours_ago": 9},
-                {"sender_id": "S123", "message": "Saya handle supplier selection dan PO process.", "days_ago": 55, "hours_ago": 14},
-                {"sender_id": "E003", "message": "Design final sudah approved. Supplier bisa mulai fabrication.", "days_ago": 55, "hours_ago": 13},
-                {"sender_id": "S123", "message": "PO sudah keluar. Lead time 4 minggu.", "days_ago": 50, "hours_ago": 10},
-                {"sender_id": "E003", "message": "Update dari supplier: Fabrication progress 50%. On schedule.", "days_ago": 40, "hours_ago": 11},
-                {"sender_id": "E003", "message": "Tooling sudah sampai! Quality check OK, siap untuk installation.", "days_ago": 30, "hours_ago": 15},
-                {"sender_id": "E005", "message": "Installation dan setup sudah selesai. Besok kita trial casting.", "days_ago": 15, "hours_ago": 14},
-                {"sender_id": "E005", "message": "First casting trial selesai. Hasilnya bagus, menunggu approval dari QA.", "days_ago": 8, "hours_ago": 10},
-                {"sender_id": "E001", "message": "Saya sedang proses quality validation. Ada beberapa point yang perlu di-verify.", "days_ago": 2, "hours_ago": 9},
-                {"sender_id": "M123", "message": "Keep me updated. Kalau OK, kita bisa proceed ke mass production prep.", "days_ago": 2, "hours_ago": 8},
-            ],
-            # Project 4: Maintenance System Upgrade
-            [
-                {"sender_id": "admin123", "message": "Project upgrade sistem maintenance dimulai. Kita akan implementasi IoT dan dashboard realtime.", "days_ago": 20, "hours_ago": 10},
-                {"sender_id": "E008", "message": "Saya mulai dengan requirement analysis. Butuh input dari maintenance team.", "days_ago": 20, "hours_ago": 9},
-                {"sender_id": "E007", "message": "Siap! Saya list semua requirement dari sisi maintenance.", "days_ago": 20, "hours_ago": 8},
-                {"sender_id": "E008", "message": "Requirement analysis selesai. Sudah saya compile jadi dokumen lengkap.", "days_ago": 18, "hours_ago": 15},
-                {"sender_id": "E007", "message": "IoT sensor installation selesai di 15 equipment critical. Sudah testing connection.", "days_ago": 12, "hours_ago": 14},
-                {"sender_id": "E008", "message": "Perfect! Data sensor sudah mulai masuk. Saya lanjut develop dashboard-nya.", "days_ago": 12, "hours_ago": 13},
-                {"sender_id": "admin123", "message": "Progress bagus! Pastikan dashboard user-friendly untuk operator.", "days_ago": 10, "hours_ago": 11},
-                {"sender_id": "E008", "message": "Dashboard development progress 60%. Fitur monitoring realtime sudah jalan.", "days_ago": 5, "hours_ago": 10},
-                {"sender_id": "M123", "message": "Menarik sekali projectnya! Bisa share preview dashboard-nya?", "days_ago": 5, "hours_ago": 9},
-                {"sender_id": "E008", "message": "Siap Pak! Nanti saya schedule demo untuk management.", "days_ago": 5, "hours_ago": 8},
+                    c.execute("""INSERT INTO tasks (project_id, title, pic_id, delegator_id, due_date, status, created_at, completed_at, actual_start) 
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                             (project_id, task_data["title"], task_data["pic_id"], task_data["delegator_id"], 
+                              task_data["due_date"], task_data["status"], created_at, completed_at, actual_start))
+                    task_ids.append(c.lastrowid)
+                task_ids_by_project.append(task_ids)
+        
+            # Buat chat messages untuk setiap project
+            chat_messages = [
+                # Project 1: Development Part Crankcase CB150
+                [
+                    {"sender_id": "M123", "message": "Tim, kita mulai project development crankcase CB150. Silakan cek detail di task masing-masing.", "days_ago": 45, "hours_ago": 10},
+                    {"sender_id": "E003", "message": "Siap Pak! Saya akan mulai dari design review dan material selection.", "days_ago": 45, "hours_ago": 9},
+                    {"sender_id": "S123", "message": "Untuk material, apakah tetap pakai ADC12 atau ada alternatif lain?", "days_ago": 45, "hours_ago": 8},
+                    {"sender_id": "M123", "message": "Tetap ADC12, sudah approved dari customer. Fokus ke design optimization.", "days_ago": 45, "hours_ago": 7},
+                    {"sender_id": "E003", "message": "Update: Design review sudah selesai. Akan lanjut ke CAD modeling.", "days_ago": 40, "hours_ago": 14},
+                    {"sender_id": "E001", "message": "CAD design sudah ready ya? Saya perlu untuk persiapan pattern making.", "days_ago": 35, "hours_ago": 10},
+                    {"sender_id": "E003", "message": "Sudah, saya share file CAD-nya via email. Ada 3 variant design.", "days_ago": 35, "hours_ago": 9},
+                    {"sender_id": "E001", "message": "Pattern making selesai. Mold sudah siap untuk trial production.", "days_ago": 25, "hours_ago": 15},
+                    {"sender_id": "S123", "message": "Bagus! Schedule trial production untuk minggu depan ya.", "days_ago": 25, "hours_ago": 14},
+                    {"sender_id": "E001", "message": "Trial production sudah selesai. Ada 50 pcs sample. Menunggu QA check.", "days_ago": 15, "hours_ago": 11},
+                    {"sender_id": "E002", "message": "Saya sudah terima sample-nya. Akan saya inspect segera.", "days_ago": 15, "hours_ago": 10},
+                    {"sender_id": "E002", "message": "Update inspection: Ada minor issue di area fillet radius. Perlu sedikit adjustment.", "days_ago": 12, "hours_ago": 16},
+                    {"sender_id": "M123", "message": "Coordinate dengan E001 untuk adjustment. Target submit ke customer akhir bulan ini.", "days_ago": 12, "hours_ago": 15},
+                    {"sender_id": "E001", "message": "Adjustment sudah dilakukan. Ready untuk trial ke-2.", "days_ago": 10, "hours_ago": 9},
+                ],
+                # Project 2: Quality Improvement - Cylinder Head
+                [
+                    {"sender_id": "M123", "message": "Project quality improvement dimulai. Target kita turunkan reject rate dari 5% ke 2%.", "days_ago": 30, "hours_ago": 10},
+                    {"sender_id": "E002", "message": "Siap Pak! Saya akan start dengan root cause analysis.", "days_ago": 30, "hours_ago": 9},
+                    {"sender_id": "E006", "message": "Saya bantu dari sisi laboratory testing untuk material analysis.", "days_ago": 30, "hours_ago": 8},
+                    {"sender_id": "E002", "message": "Root cause analysis selesai. Main issue ada di process parameter yang tidak konsisten.", "days_ago": 25, "hours_ago": 14},
+                    {"sender_id": "E004", "message": "Noted. Saya akan optimize parameter machining-nya.", "days_ago": 25, "hours_ago": 13},
+                    {"sender_id": "E007", "message": "Saya cek kondisi tooling juga ya, mungkin perlu maintenance.", "days_ago": 25, "hours_ago": 12},
+                    {"sender_id": "E004", "message": "Parameter optimization selesai. Sudah saya dokumentasikan di SOP baru.", "days_ago": 18, "hours_ago": 15},
+                    {"sender_id": "E007", "message": "Tooling maintenance & calibration sudah selesai. Semua dalam kondisi optimal.", "days_ago": 12, "hours_ago": 14},
+                    {"sender_id": "M123", "message": "Good job team! Sekarang kita trial run dengan parameter baru.", "days_ago": 12, "hours_ago": 13},
+                    {"sender_id": "E004", "message": "Trial run sedang berjalan. So far hasilnya promising, reject rate turun drastis.", "days_ago": 5, "hours_ago": 10},
+                    {"sender_id": "E006", "message": "Saya standby untuk statistical analysis setelah trial selesai.", "days_ago": 5, "hours_ago": 9},
+                ],
+                # Project 3: New Tooling Development - Transmission Case
+                [
+                    {"sender_id": "M123", "message": "Project tooling baru untuk transmission case dimulai. Timeline ketat, 2 bulan harus selesai.", "days_ago": 60, "hours_ago": 10},
+                    {"sender_id": "E003", "message": "Design specification sudah saya buat. Akan koordinasi dengan supplier.", "days_ago": 60, "hours_ago": 9},
+                    {"sender_id": "S123", "message": "Saya handle supplier selection dan PO process.", "days_ago": 55, "hours_ago": 14},
+                    {"sender_id": "E003", "message": "Design final sudah approved. Supplier bisa mulai fabrication.", "days_ago": 55, "hours_ago": 13},
+                    {"sender_id": "S123", "message": "PO sudah keluar. Lead time 4 minggu.", "days_ago": 50, "hours_ago": 10},
+                    {"sender_id": "E003", "message": "Update dari supplier: Fabrication progress 50%. On schedule.", "days_ago": 40, "hours_ago": 11},
+                    {"sender_id": "E003", "message": "Tooling sudah sampai! Quality check OK, siap untuk installation.", "days_ago": 30, "hours_ago": 15},
+                    {"sender_id": "E005", "message": "Installation dan setup sudah selesai. Besok kita trial casting.", "days_ago": 15, "hours_ago": 14},
+                    {"sender_id": "E005", "message": "First casting trial selesai. Hasilnya bagus, menunggu approval dari QA.", "days_ago": 8, "hours_ago": 10},
+                    {"sender_id": "E001", "message": "Saya sedang proses quality validation. Ada beberapa point yang perlu di-verify.", "days_ago": 2, "hours_ago": 9},
+                    {"sender_id": "M123", "message": "Keep me updated. Kalau OK, kita bisa proceed ke mass production prep.", "days_ago": 2, "hours_ago": 8},
+                ],
+                # Project 4: Maintenance System Upgrade
+                [
+                    {"sender_id": "admin123", "message": "Project upgrade sistem maintenance dimulai. Kita akan implementasi IoT dan dashboard realtime.", "days_ago": 20, "hours_ago": 10},
+                    {"sender_id": "E008", "message": "Saya mulai dengan requirement analysis. Butuh input dari maintenance team.", "days_ago": 20, "hours_ago": 9},
+                    {"sender_id": "E007", "message": "Siap! Saya list semua requirement dari sisi maintenance.", "days_ago": 20, "hours_ago": 8},
+                    {"sender_id": "E008", "message": "Requirement analysis selesai. Sudah saya compile jadi dokumen lengkap.", "days_ago": 18, "hours_ago": 15},
+                    {"sender_id": "E007", "message": "IoT sensor installation selesai di 15 equipment critical. Sudah testing connection.", "days_ago": 12, "hours_ago": 14},
+                    {"sender_id": "E008", "message": "Perfect! Data sensor sudah mulai masuk. Saya lanjut develop dashboard-nya.", "days_ago": 12, "hours_ago": 13},
+                    {"sender_id": "admin123", "message": "Progress bagus! Pastikan dashboard user-friendly untuk operator.", "days_ago": 10, "hours_ago": 11},
+                    {"sender_id": "E008", "message": "Dashboard development progress 60%. Fitur monitoring realtime sudah jalan.", "days_ago": 5, "hours_ago": 10},
+                    {"sender_id": "M123", "message": "Menarik sekali projectnya! Bisa share preview dashboard-nya?", "days_ago": 5, "hours_ago": 9},
+                    {"sender_id": "E008", "message": "Siap Pak! Nanti saya schedule demo untuk management.", "days_ago": 5, "hours_ago": 8},
+                ]
+            ]
+        
+            for proj_idx, project_id in enumerate(project_ids):
+                for msg_data in chat_messages[proj_idx]:
+                    timestamp = (datetime.now() - timedelta(days=msg_data["days_ago"], hours=msg_data["hours_ago"])).strftime("%Y-%m-%d %H:%M:%S")
+                    c.execute("INSERT INTO chats (project_id, sender_id, message, timestamp, is_read) VALUES (?, ?, ?, ?, ?)",
+                             (project_id, msg_data["sender_id"], msg_data["message"], timestamp, 1))
+            _backfill_chat_read_state(c)
+        
+            # Buat direct chat messages antara beberapa user
+            direct_chats = [
+                # Chat antara E001 dan E003 (koordinasi antar departemen)
+                [
+                    {"sender_id": "E001", "receiver_id": "E003", "message": "Mas Ahmad, untuk CAD design crankcase, bisa tolong kirim file STEP-nya? Perlu untuk verifikasi pattern.", "days_ago": 36, "hours_ago": 10},
+                    {"sender_id": "E003", "receiver_id": "E001", "message": "Siap Mas Budi! File sudah saya kirim ke email. Ada 3 variant.", "days_ago": 36, "hours_ago": 9},
+                    {"sender_id": "E001", "receiver_id": "E003", "message": "Terima kasih! Saya cek dulu. Kalau ada yang perlu didiskusikan, saya kabari lagi ya.", "days_ago": 36, "hours_ago": 8},
+                    {"sender_id": "E003", "receiver_id": "E001", "message": "Oke siap! Kalau ada concern langsung aja chat atau telpon.", "days_ago": 36, "hours_ago": 7},
+                    {"sender_id": "E001", "receiver_id": "E003", "message": "Mas, ada sedikit concern di area draft angle. Bisa kita meeting sebentar?", "days_ago": 34, "hours_ago": 14},
+                    {"sender_id": "E003", "receiver_id": "E001", "message": "Bisa! Jam 2 siang di ruang meeting development gimana?", "days_ago": 34, "hours_ago": 13},
+                    {"sender_id": "E001", "receiver_id": "E003", "message": "Deal! See you there.", "days_ago": 34, "hours_ago": 13},
+                ],
+                # Chat antara E002 dan E006 (QA dan Lab)
+                [
+                    {"sender_id": "E002", "receiver_id": "E006", "message": "Mba Maya, bisa bantu testing material untuk sample cylinder head? Perlu chemical composition analysis.", "days_ago": 26, "hours_ago": 11},
+                    {"sender_id": "E006", "receiver_id": "E002", "message": "Bisa Bu Siti! Sample-nya sudah ada? Kirim ke lab ya.", "days_ago": 26, "hours_ago": 10},
+                    {"sender_id": "E002", "receiver_id": "E006", "message": "Sudah saya kirim tadi pagi 5 pcs. Urgent soalnya, kalau bisa hasil-nya besok.", "days_ago": 26, "hours_ago": 9},
+                    {"sender_id": "E006", "receiver_id": "E002", "message": "Oke noted! Saya prioritaskan. Besok sore hasilnya ready.", "days_ago": 26, "hours_ago": 9},
+                    {"sender_id": "E006", "receiver_id": "E002", "message": "Bu Siti, hasil test sudah keluar. Saya kirim report via email ya. Overall composition OK sesuai spec.", "days_ago": 25, "hours_ago": 15},
+                    {"sender_id": "E002", "receiver_id": "E006", "message": "Terima kasih Mba Maya! Fast response banget. Sangat membantu.", "days_ago": 25, "hours_ago": 14},
+                ],
+                # Chat antara S123 dan E004 (Supervisor koordinasi dengan staff)
+                [
+                    {"sender_id": "S123", "receiver_id": "E004", "message": "Mba Rina, untuk parameter optimization cylinder head, progressnya gimana?", "days_ago": 20, "hours_ago": 10},
+                    {"sender_id": "E004", "receiver_id": "S123", "message": "Sudah selesai Pak! SOP baru sudah saya buat dan testing awal hasilnya bagus.", "days_ago": 20, "hours_ago": 9},
+                    {"sender_id": "S123", "receiver_id": "E004", "message": "Bagus! Bisa presentasi ke team besok? Biar semua operator paham.", "days_ago": 20, "hours_ago": 8},
+                    {"sender_id": "E004", "receiver_id": "S123", "message": "Siap Pak! Saya persiapkan slide presentasi-nya.", "days_ago": 20, "hours_ago": 7},
+                ],
+                # Chat antara E007 dan E008 (Maintenance dan IT)
+                [
+                    {"sender_id": "E007", "receiver_id": "E008", "message": "Lina, untuk IoT sensor yang mau dipasang, ada spesifikasi khusus ga? Biar saya persiapkan bracket-nya.", "days_ago": 15, "hours_ago": 11},
+                    {"sender_id": "E008", "receiver_id": "E007", "message": "Ada Pak Eko! Saya kirim spec sheet-nya via WA ya. Mostly sensor temperature dan vibration.", "days_ago": 15, "hours_ago": 10},
+                    {"sender_id": "E007", "receiver_id": "E008", "message": "Oke siap! Kalau ada yang perlu dikoordinasikan lagi, langsung aja.", "days_ago": 15, "hours_ago": 9},
+                    {"sender_id": "E008", "receiver_id": "E007", "message": "Pak Eko, sensor installation-nya sudah beres ya? Saya perlu akses ke data untuk testing.", "days_ago": 12, "hours_ago": 16},
+                    {"sender_id": "E007", "receiver_id": "E008", "message": "Sudah semua! Network connection juga sudah oke. Silakan di-test.", "days_ago": 12, "hours_ago": 15},
+                    {"sender_id": "E008", "receiver_id": "E007", "message": "Perfect! Data sudah masuk dengan baik. Thank you Pak!", "days_ago": 12, "hours_ago": 14},
+                ],
+                # Chat antara M123 dan admin123 (Manager level discussion)
+                [
+                    {"sender_id": "M123", "receiver_id": "admin123", "message": "Admin, untuk dashboard maintenance system, bisa diintegrasikan dengan sistem existing ga?", "days_ago": 10, "hours_ago": 11},
+                    {"sender_id": "admin123", "receiver_id": "M123", "message": "Bisa Pak! Kita pakai API integration. Nanti bisa centralized di satu dashboard.", "days_ago": 10, "hours_ago": 10},
+                    {"sender_id": "M123", "receiver_id": "admin123", "message": "Bagus! Kalau begitu bisa jadi pilot project untuk implementasi di area lain juga.", "days_ago": 10, "hours_ago": 9},
+                    {"sender_id": "admin123", "receiver_id": "M123", "message": "Setuju Pak! Sekalian kita buat standard framework-nya untuk scale up.", "days_ago": 10, "hours_ago": 8},
+                ]
             ]
-        ]
-        
-        for proj_idx, project_id in enumerate(project_ids):
-            for msg_data in chat_messages[proj_idx]:
-                timestamp = (datetime.now() - timedelta(days=msg_data["days_ago"], hours=msg_data["hours_ago"])).strftime("%Y-%m-%d %H:%M:%S")
-                c.execute("INSERT INTO chats (project_id, sender_id, message, timestamp, is_read) VALUES (?, ?, ?, ?, ?)",
-                         (project_id, msg_data["sender_id"], msg_data["message"], timestamp, 1))
-        
-        # Buat direct chat messages antara beberapa user
-        direct_chats = [
-            # Chat antara E001 dan E003 (koordinasi antar departemen)
-            [
-                {"sender_id": "E001", "receiver_id": "E003", "message": "Mas Ahmad, untuk CAD design crankcase, bisa tolong kirim file STEP-nya? Perlu untuk verifikasi pattern.", "days_ago": 36, "hours_ago": 10},
-                {"sender_id": "E003", "receiver_id": "E001", "message": "Siap Mas Budi! File sudah saya kirim ke email. Ada 3 variant.", "days_ago": 36, "hours_ago": 9},
-                {"sender_id": "E001", "receiver_id": "E003", "message": "Terima kasih! Saya cek dulu. Kalau ada yang perlu didiskusikan, saya kabari lagi ya.", "days_ago": 36, "hours_ago": 8},
-                {"sender_id": "E003", "receiver_id": "E001", "message": "Oke siap! Kalau ada concern langsung aja chat atau telpon.", "days_ago": 36, "hours_ago": 7},
-                {"sender_id": "E001", "receiver_id": "E003", "message": "Mas, ada sedikit concern di area draft angle. Bisa kita meeting sebentar?", "days_ago": 34, "hours_ago": 14},
-                {"sender_id": "E003", "receiver_id": "E001", "message": "Bisa! Jam 2 siang di ruang meeting development gimana?", "days_ago": 34, "hours_ago": 13},
-                {"sender_id": "E001", "receiver_id": "E003", "message": "Deal! See you there.", "days_ago": 34, "hours_ago": 13},
-            ],
-            # Chat antara E002 dan E006 (QA dan Lab)
-            [
-                {"sender_id": "E002", "receiver_id": "E006", "message": "Mba Maya, bisa bantu testing material untuk sample cylinder head? Perlu chemical composition analysis.", "days_ago": 26, "hours_ago": 11},
-                {"sender_id": "E006", "receiver_id": "E002", "message": "Bisa Bu Siti! Sample-nya sudah ada? Kirim ke lab ya.", "days_ago": 26, "hours_ago": 10},
-                {"sender_id": "E002", "receiver_id": "E006", "message": "Sudah saya kirim tadi pagi 5 pcs. Urgent soalnya, kalau bisa hasil-nya besok.", "days_ago": 26, "hours_ago": 9},
-                {"sender_id": "E006", "receiver_id": "E002", "message": "Oke noted! Saya prioritaskan. Besok sore hasilnya ready.", "days_ago": 26, "hours_ago": 9},
-                {"sender_id": "E006", "receiver_id": "E002", "message": "Bu Siti, hasil test sudah keluar. Saya kirim report via email ya. Overall composition OK sesuai spec.", "days_ago": 25, "hours_ago": 15},
-                {"sender_id": "E002", "receiver_id": "E006", "message": "Terima kasih Mba Maya! Fast response banget. Sangat membantu.", "days_ago": 25, "hours_ago": 14},
-            ],
-            # Chat antara S123 dan E004 (Supervisor koordinasi dengan staff)
-            [
-                {"sender_id": "S123", "receiver_id": "E004", "message": "Mba Rina, untuk parameter optimization cylinder head, progressnya gimana?", "days_ago": 20, "hours_ago": 10},
-                {"sender_id": "E004", "receiver_id": "S123", "message": "Sudah selesai Pak! SOP baru sudah saya buat dan testing awal hasilnya bagus.", "days_ago": 20, "hours_ago": 9},
-                {"sender_id": "S123", "receiver_id": "E004", "message": "Bagus! Bisa presentasi ke team besok? Biar semua operator paham.", "days_ago": 20, "hours_ago": 8},
-                {"sender_id": "E004", "receiver_id": "S123", "message": "Siap Pak! Saya persiapkan slide presentasi-nya.", "days_ago": 20, "hours_ago": 7},
-            ],
-            # Chat antara E007 dan E008 (Maintenance dan IT)
-            [
-                {"sender_id": "E007", "receiver_id": "E008", "message": "Lina, untuk IoT sensor yang mau dipasang, ada spesifikasi khusus ga? Biar saya persiapkan bracket-nya.", "days_ago": 15, "hours_ago": 11},
-                {"sender_id": "E008", "receiver_id": "E007", "message": "Ada Pak Eko! Saya kirim spec sheet-nya via WA ya. Mostly sensor temperature dan vibration.", "days_ago": 15, "hours_ago": 10},
-                {"sender_id": "E007", "receiver_id": "E008", "message": "Oke siap! Kalau ada yang perlu dikoordinasikan lagi, langsung aja.", "days_ago": 15, "hours_ago": 9},
-                {"sender_id": "E008", "receiver_id": "E007", "message": "Pak Eko, sensor installation-nya sudah beres ya? Saya perlu akses ke data untuk testing.", "days_ago": 12, "hours_ago": 16},
-                {"sender_id": "E007", "receiver_id": "E008", "message": "Sudah semua! Network connection juga sudah oke. Silakan di-test.", "days_ago": 12, "hours_ago": 15},
-                {"sender_id": "E008", "receiver_id": "E007", "message": "Perfect! Data sudah masuk dengan baik. Thank you Pak!", "days_ago": 12, "hours_ago": 14},
-            ],
-            # Chat antara M123 dan admin123 (Manager level discussion)
-            [
-                {"sender_id": "M123", "receiver_id": "admin123", "message": "Admin, untuk dashboard maintenance system, bisa diintegrasikan dengan sistem existing ga?", "days_ago": 10, "hours_ago": 11},
-                {"sender_id": "admin123", "receiver_id": "M123", "message": "Bisa Pak! Kita pakai API integration. Nanti bisa centralized di satu dashboard.", "days_ago": 10, "hours_ago": 10},
-                {"sender_id": "M123", "receiver_id": "admin123", "message": "Bagus! Kalau begitu bisa jadi pilot project untuk implementasi di area lain juga.", "days_ago": 10, "hours_ago": 9},
-                {"sender_id": "admin123", "receiver_id": "M123", "message": "Setuju Pak! Sekalian kita buat standard framework-nya untuk scale up.", "days_ago": 10, "hours_ago": 8},
+        
+            for chat_thread in direct_chats:
+                for msg_data in chat_thread:
+                    timestamp = (datetime.now() - timedelta(days=msg_data["days_ago"], hours=msg_data["hours_ago"])).strftime("%Y-%m-%d %H:%M:%S")
+                    _store_direct_message(c, msg_data["sender_id"], msg_data["receiver_id"], msg_data["message"], timestamp,
+                                          count_unread=False)
+        
+            # Tambahkan audit trail untuk aktivitas-aktivitas penting
+            audit_entries = [
+                {"user_id": "M123", "action": "Create Project", "details": "Project 'Development Part Crankcase CB150' telah dibuat.", "days_ago": 45},
+                {"user_id": "M123", "action": "Assign Task", "details": "Task 'Design Review & Material Selection' assigned to E003", "days_ago": 45},
+                {"user_id": "E003", "action": "Complete Task", "details": "Task 'Design Review & Material Selection' telah diselesaikan.", "days_ago": 40},
+                {"user_id": "M123", "action": "Create Project", "details": "Project 'Quality Improvement - Cylinder Head' telah dibuat.", "days_ago": 30},
+                {"user_id": "E002", "action": "Complete Task", "details": "Task 'Root Cause Analysis - Reject Issue' telah diselesaikan.", "days_ago": 25},
+                {"user_id": "admin123", "action": "Create Project", "details": "Project 'Maintenance System Upgrade' telah dibuat.", "days_ago": 20},
+                {"user_id": "E008", "action": "Complete Task", "details": "Task 'System Requirement Analysis' telah diselesaikan.", "days_ago": 18},
+                {"user_id": "E007", "action": "Complete Task", "details": "Task 'IoT Sensor Installation' telah diselesaikan.", "days_ago": 12},
             ]
-        ]
-        
-        for chat_thread in direct_chats:
-            for msg_data in chat_thread:
-                timestamp = (datetime.now() - timedelta(days=msg_data["days_ago"], hours=msg_data["hours_ago"])).strftime("%Y-%m-%d %H:%M:%S")
-                c.execute("INSERT INTO direct_chats (sender_id, receiver_id, message, timestamp, is_read) VALUES (?, ?, ?, ?, ?)",
-                         (msg_data["sender_id"], msg_data["receiver_id"], msg_data["message"], timestamp, 1))
-        
-        # Tambahkan audit trail untuk aktivitas-aktivitas penting
-        audit_entries = [
-            {"user_id": "M123", "action": "Create Project", "details": "Project 'Development Part Crankcase CB150' telah dibuat.", "days_ago": 45},
-            {"user_id": "M123", "action": "Assign Task", "details": "Task 'Design Review & Material Selection' assigned to E003", "days_ago": 45},
-            {"user_id": "E003", "action": "Complete Task", "details": "Task 'Design Review & Material Selection' telah diselesaikan.", "days_ago": 40},
-            {"user_id": "M123", "action": "Create Project", "details": "Project 'Quality Improvement - Cylinder Head' telah dibuat.", "days_ago": 30},
-            {"user_id": "E002", "action": "Complete Task", "details": "Task 'Root Cause Analysis - Reject Issue' telah diselesaikan.", "days_ago": 25},
-            {"user_id": "admin123", "action": "Create Project", "details": "Project 'Maintenance System Upgrade' telah dibuat.", "days_ago": 20},
-            {"user_id": "E008", "action": "Complete Task", "details": "Task 'System Requirement Analysis' telah diselesaikan.", "days_ago": 18},
-            {"user_id": "E007", "action": "Complete Task", "details": "Task 'IoT Sensor Installation' telah diselesaikan.", "days_ago": 12},
-        ]
-        
-        for entry in audit_entries:
-            timestamp = (datetime.now() - timedelta(days=entry["days_ago"])).strftime("%Y-%m-%d %H:%M:%S")
-            c.execute("INSERT INTO audit_trail (timestamp, user_id, action, details) VALUES (?, ?, ?, ?)",
-                     (timestamp, entry["user_id"], entry["action"], entry["details"]))
-        
-        conn.commit()
+        
+            for entry in audit_entries:
+                timestamp = (datetime.now() - timedelta(days=entry["days_ago"])).strftime("%Y-%m-%d %H:%M:%S")
+                c.execute("INSERT INTO audit_trail (timestamp, user_id, action, details) VALUES (?, ?, ?, ?)",
+                         (timestamp, entry["user_id"], entry["action"], entry["details"]))
+        
+        get_user_directory().invalidate()
+        get_read_cache().invalidate()
         print("✅ Dummy data berhasil dibuat!")
         
     except sqlite3.Error as e:
-        conn.rollback()
         print(f"❌ Error saat membuat dummy data: {e}")
-    finally:
-        conn.close()
 
 # --- Custom CSS untuk link download ---
 st.markdown("""
@@ -556,200 +1342,412 @@ def get_svg_icon(type, size=24):
     return f"data:image/svg+xml;base64,{b64_svg}"
 
 # --- Fungsi Manajemen Database ---
-def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
-    conn.execute("PRAGMA foreign_keys = ON")  # Aktifkan foreign key constraints
-    return conn
-
 def get_user(user_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, password, fullname, departemen, seksi, role, status FROM users WHERE id = ?", (user_id,))
-    user = c.fetchone()
-    conn.close()
-    if user:
-        return {"id": user[0], "password": user[1], "fullname": user[2], "departemen": user[3], "seksi": user[4], "role": user[5], "status": user[6]}
-    return None
+    """Data pengguna (tanpa password) dari direktori di memori, atau None."""
+    return get_user_directory().get(user_id)
 
 def get_all_users():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, fullname, departemen, seksi, role, status FROM users ORDER BY fullname")
-    users = c.fetchall()
-    conn.close()
-    return [{"id": u[0], "fullname": u[1], "departemen": u[2], "seksi": u[3], "role": u[4], "status": u[5]} for u in users]
-
-def get_projects(user_id, search_query="", creator_filter=None):
-    conn = get_db_connection()
-    c = conn.cursor()
-    user_role = get_user(user_id)['role']
-    
-    query = """SELECT DISTINCT p.id, p.name, p.description, p.part_name, p.part_number, p.customer, p.model, p.creator_id, u.fullname
-               FROM projects p 
-               JOIN project_members pm ON p.id = pm.project_id 
-               JOIN users u ON p.creator_id = u.id
-               WHERE 1=1"""
-    params = []
-    
-    if user_role not in ['Admin', 'Manager']:
-        query += " AND pm.user_id = ?"
-        params.append(user_id)
+    """Semua pengguna urut nama lengkap, dari direktori di memori."""
+    return get_user_directory().all()
+
+def search_users(term, limit=20):
+    return get_user_directory().search(term, limit)
+
+def fts_match_query(text):
+    """Ubah input pengguna menjadi query MATCH FTS5: setiap kata dikutip dan dicari sebagai awalan.
+
+    Mengembalikan None jika tidak ada kata yang bisa dicari.
+    """
+    terms = [term for term in text.split() if any(ch.isalnum() for ch in term)]
+    if not terms:
+        return None
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+def _fts_tokens(text):
+    """Token seperti tokenizer FTS5 `unicode61 remove_diacritics 2`: huruf/angka, huruf kecil, tanpa diakritik."""
+    text = "".join(ch for ch in unicodedata.normalize("NFD", text.lower()) if not unicodedata.combining(ch))
+    return re.findall(r"[^\W_]+", text)
+
+def fts_match_text(text, query):
+    """Padanan fts_match_query untuk teks yang tidak diindeks FTS (mis. arsip jejak audit).
+
+    Setiap kata di `query` menjadi frasa token yang harus muncul berurutan di `text`, dengan
+    token terakhirnya dicocokkan sebagai awalan; semua kata harus cocok.
+    """
+    text_tokens = _fts_tokens(text)
+    for term in query.split():
+        phrase = _fts_tokens(term)
+        if not phrase:
+            continue
+        size = len(phrase)
+        if not any(text_tokens[i:i + size - 1] == phrase[:-1] and text_tokens[i + size - 1].startswith(phrase[-1])
+                   for i in range(len(text_tokens) - size + 1)):
+            return False
+    return True
+
+@cached_read("projects", "members", "chats", "users")
+def get_projects(user_id, search_query="", creator_filter=None, limit=None, before_id=None, offset=None):
+    """Daftar proyek yang boleh dilihat user, beserta nama pembuat dan jumlah chat belum dibaca.
+
+    Semua data diambil dalam satu query. Tanpa kata kunci, hasil urut id terbaru dan
+    dipaginasi keyset: isi `limit` dan `before_id` dengan id proyek terakhir dari halaman
+    sebelumnya. Dengan kata kunci, hasil diurutkan berdasarkan relevansi (bm25 atas
+    projects_fts) dan dipaginasi dengan `limit` dan `offset`.
+    """
+    with db_reader() as conn:
+        c = conn.cursor()
         
-    if search_query:
-        search_like = f"%{search_query}%"
-        query += " AND (p.name LIKE ? OR p.part_name LIKE ? OR p.part_number LIKE ?)"
-        params.extend([search_like, search_like, search_like])
+        match_query = fts_match_query(search_query) if search_query else None
+        if search_query and not match_query:
+            return []
         
-    if creator_filter:
-        query += " AND p.creator_id = ?"
-        params.append(creator_filter)
+        # Admin/Manager melihat semua proyek, role lain hanya proyek tempat ia menjadi anggota
+        query = """SELECT p.id, p.name, p.description, p.part_name, p.part_number, p.customer, p.model, p.creator_id, u.fullname,
+                          COUNT(ch.id) AS unread_count
+                   FROM projects p
+                   JOIN users u ON p.creator_id = u.id
+                   {search_join}
+                   LEFT JOIN chat_read_state rs ON rs.project_id = p.id AND rs.user_id = :user_id
+                   LEFT JOIN chats ch ON ch.project_id = p.id AND ch.id > COALESCE(rs.last_read_id, 0) AND ch.sender_id != :user_id
+                   WHERE ((SELECT role FROM users WHERE id = :user_id) IN ('Admin', 'Manager')
+                          OR EXISTS (SELECT 1 FROM project_members pm WHERE pm.project_id = p.id AND pm.user_id = :user_id))"""
+        params = {"user_id": user_id}
+        
+        search_join = ""
+        if match_query:
+            weights = ", ".join(str(weight) for weight in PROJECT_SEARCH_WEIGHTS)
+            search_join = f"""JOIN (SELECT rowid AS project_id, rank FROM projects_fts
+                                    WHERE projects_fts MATCH :match AND rank MATCH 'bm25({weights})') fts ON fts.project_id = p.id"""
+            params["match"] = match_query
+        query = query.format(search_join=search_join)
+            
+        if creator_filter:
+            query += " AND p.creator_id = :creator_id"
+            params["creator_id"] = creator_filter
 
-    query += " ORDER BY p.id DESC"
-    
-    c.execute(query, params)
-    projects = c.fetchall()
-    
-    project_list = []
-    for p in projects:
-        c.execute("SELECT COUNT(*) FROM chats WHERE project_id = ? AND sender_id != ? AND is_read = 0", (p[0], user_id))
-        unread_count = c.fetchone()[0]
+        if before_id is not None:
+            query += " AND p.id < :before_id"
+            params["before_id"] = before_id
 
-        project_list.append({
+        query += " GROUP BY p.id ORDER BY fts.rank, p.id DESC" if match_query else " GROUP BY p.id ORDER BY p.id DESC"
+
+        if limit is not None:
+            query += " LIMIT :limit"
+            params["limit"] = limit
+            if offset:
+                query += " OFFSET :offset"
+                params["offset"] = offset
+        
+        c.execute(query, params)
+        return [{
             "id": p[0], "name": p[1], "description": p[2], "part_name": p[3],
             "part_number": p[4], "customer": p[5], "model": p[6],
-            "creator_id": p[7], "creator_name": p[8], "unread_count": unread_count
-        })
-    conn.close()
-    return project_list
-    
+            "creator_id": p[7], "creator_name": p[8], "unread_count": p[9]
+        } for p in c.fetchall()]
+
+@cached_read("members", "users")
 def get_project_members(project_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("""SELECT u.id, u.fullname, u.role 
-                 FROM users u 
-                 JOIN project_members pm ON u.id = pm.user_id 
-                 WHERE pm.project_id = ? AND u.status = 'approved'""", (project_id,))
-    members = c.fetchall()
-    conn.close()
-    return [{"id": m[0], "fullname": m[1], "role": m[2]} for m in members]
-
-def get_project_details(project_id, user_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, name, description, part_name, part_number, customer, model, creator_id FROM projects WHERE id = ?", (project_id,))
-    project = c.fetchone()
-    
-    c.execute("SELECT id, title, pic_id, delegator_id, due_date, status, created_at, completed_at, actual_start FROM tasks WHERE project_id = ?", (project_id,))
-    tasks = c.fetchall()
-    
-    task_list = []
-    for task in tasks:
-        task_dict = {"id": task[0], "title": task[1], "pic_id": task[2], "delegator_id": task[3], "due_date": task[4], "status": task[5], "created_at": task[6], "completed_at": task[7], "actual_start": task[8]}
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("""SELECT u.id, u.fullname, u.role 
+                     FROM users u 
+                     JOIN project_members pm ON u.id = pm.user_id 
+                     WHERE pm.project_id = ? AND u.status = 'approved'""", (project_id,))
+        members = c.fetchall()
+        return [{"id": m[0], "fullname": m[1], "role": m[2]} for m in members]
+
+def get_project_member_history(project_id, limit=50):
+    """Perubahan anggota proyek terbaru dulu: (waktu, user_id, 'added'/'removed', diubah_oleh)."""
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("""SELECT changed_at, user_id, change, changed_by FROM project_member_history
+                     WHERE project_id = ? ORDER BY id DESC LIMIT ?""", (project_id, limit))
+        return c.fetchall()
+
+@cached_read("projects")
+def get_project(project_id):
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, name, description, part_name, part_number, customer, model, creator_id FROM projects WHERE id = ?", (project_id,))
+        project = c.fetchone()
+        if project:
+            return {
+                "id": project[0], "name": project[1], "description": project[2], "part_name": project[3],
+                "part_number": project[4], "customer": project[5], "model": project[6], "creator_id": project[7]
+            }
+        return None
+
+@cached_read("tasks", "documents")
+def get_project_tasks(project_id):
+    """Semua task proyek beserta dokumennya, dengan jumlah query tetap (tidak per task)."""
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("""SELECT id, title, pic_id, delegator_id, due_date, status, created_at, completed_at, actual_start,
+                            created_epoch, due_epoch, actual_start_epoch, completed_epoch
+                     FROM tasks WHERE project_id = ?""", (project_id,))
+        tasks = c.fetchall()
         
-        c.execute("SELECT id, filename, filepath, revision_of, notes FROM documents WHERE task_id = ? ORDER BY id ASC", (task[0],))
-        documents = c.fetchall()
+        # Ambil dokumen seluruh task sekaligus, lalu kelompokkan per task_id
+        c.execute("""SELECT d.id, d.task_id, d.filename, d.filepath, d.revision_of, d.notes
+                     FROM documents d JOIN tasks t ON d.task_id = t.id
+                     WHERE t.project_id = ? ORDER BY d.id ASC""", (project_id,))
+        documents_by_task = {}
+        for d in c.fetchall():
+            documents_by_task.setdefault(d[1], []).append({"id": d[0], "filename": d[2], "filepath": d[3], "revision_of": d[4], "notes": d[5]})
         
-        doc_list = []
-        for d in documents:
-            doc_list.append({"id": d[0], "filename": d[1], "filepath": d[2], "revision_of": d[3], "notes": d[4]})
-        task_dict['documents'] = doc_list
-        task_list.append(task_dict)
-    
-    c.execute("SELECT sender_id, message, timestamp FROM chats WHERE project_id = ? ORDER BY timestamp ASC", (project_id,))
-    chat_messages = c.fetchall()
-    chat_list = [{"sender_id": m[0], "message": m[1], "timestamp": m[2]} for m in chat_messages]
-    
-    conn.close()
-    
-    if project:
-        return {
-            "id": project[0], "name": project[1], "description": project[2], "part_name": project[3],
-            "part_number": project[4], "customer": project[5], "model": project[6],
-            "creator_id": project[7], "tasks": task_list, "chatMessages": chat_list
-        }
-    return None
+        return [{
+            "id": task[0], "title": task[1], "pic_id": task[2], "delegator_id": task[3], "due_date": task[4],
+            "status": task[5], "created_at": task[6], "completed_at": task[7], "actual_start": task[8],
+            "created_epoch": task[9], "due_epoch": task[10], "actual_start_epoch": task[11], "completed_epoch": task[12],
+            "documents": documents_by_task.get(task[0], [])
+        } for task in tasks]
+
+def get_project_task(project_id, task_id):
+    """Satu task proyek beserta dokumennya (diambil dari hasil get_project_tasks yang di-cache)."""
+    return next((task for task in get_project_tasks(project_id) if task['id'] == task_id), None)
+
+# Kolom lampiran yang ikut di-JOIN oleh loader chat (alias tabel: a)
+_ATTACHMENT_COLUMNS = ("a.kind, a.filepath, a.original_name, a.mime_type, a.size, a.width, a.height, "
+                       "a.thumb_path, a.thumb_width, a.thumb_height, a.missing")
+
+def _attachment_from_row(values):
+    """Dict lampiran dari nilai _ATTACHMENT_COLUMNS, atau None bila pesan tanpa lampiran."""
+    kind, filepath, original_name, mime_type, size, width, height, thumb_path, thumb_width, thumb_height, missing = values
+    if kind is None:
+        return None
+    return {"kind": kind, "filepath": filepath, "original_name": original_name, "mime_type": mime_type,
+            "size": size, "width": width, "height": height,
+            "thumb_path": thumb_path, "thumb_width": thumb_width, "thumb_height": thumb_height, "missing": bool(missing)}
+
+def get_project_chat_messages(project_id, limit=CHAT_PAGE_SIZE, before_id=None):
+    """Maksimal `limit` pesan chat proyek terbaru sebelum `before_id`, urut lama ke baru.
+
+    Dipanggil terpisah, hanya saat tab Chat dirender. Mengembalikan (messages, has_older).
+    """
+    query = f"""SELECT ch.id, ch.sender_id, ch.message, ch.timestamp, {_ATTACHMENT_COLUMNS}
+                FROM chats ch LEFT JOIN chat_attachments a ON a.chat_id = ch.id
+                WHERE ch.project_id = ?"""
+    params = [project_id]
+    if before_id is not None:
+        query += " AND ch.id < ?"
+        params.append(before_id)
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute(query + " ORDER BY ch.id DESC LIMIT ?", params + [limit + 1])
+        rows = c.fetchall()
+        messages = [{"id": m[0], "sender_id": m[1], "message": m[2], "timestamp": m[3], "attachment": _attachment_from_row(m[4:])}
+                    for m in reversed(rows[:limit])]
+        return messages, len(rows) > limit
+
+def get_project_chat_messages_after(project_id, after_id):
+    """Pesan chat proyek yang lebih baru dari `after_id`, urut lama ke baru (untuk polling)."""
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute(f"""SELECT ch.id, ch.sender_id, ch.message, ch.timestamp, {_ATTACHMENT_COLUMNS}
+                      FROM chats ch LEFT JOIN chat_attachments a ON a.chat_id = ch.id
+                      WHERE ch.project_id = ? AND ch.id > ? ORDER BY ch.id""",
+                  (project_id, after_id))
+        return [{"id": m[0], "sender_id": m[1], "message": m[2], "timestamp": m[3], "attachment": _attachment_from_row(m[4:])}
+                for m in c.fetchall()]
+
+def _conversation_pair(user1_id, user2_id):
+    """Pasangan kanonik (user_a, user_b) untuk tabel conversations."""
+    return tuple(sorted((user1_id, user2_id)))
 
-def get_direct_messages(user1_id, user2_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT sender_id, receiver_id, message, timestamp FROM direct_chats WHERE (sender_id = ? AND receiver_id = ?) OR (sender_id = ? AND receiver_id = ?) ORDER BY timestamp ASC",
-              (user1_id, user2_id, user2_id, user1_id))
-    messages = c.fetchall()
-    conn.close()
-    return [{"sender_id": m[0], "receiver_id": m[1], "message": m[2], "timestamp": m[3]} for m in messages]
+def get_direct_messages(user1_id, user2_id, limit=CHAT_PAGE_SIZE, before_id=None):
+    """Maksimal `limit` direct message terbaru sebelum `before_id`, urut lama ke baru.
 
+    Mengembalikan (messages, has_older).
+    """
+    query = f"""SELECT dc.id, dc.sender_id, dc.receiver_id, dc.message, dc.timestamp, {_ATTACHMENT_COLUMNS}
+                FROM conversations cv
+                JOIN direct_chats dc ON dc.conversation_id = cv.id
+                LEFT JOIN chat_attachments a ON a.direct_chat_id = dc.id
+                WHERE cv.user_a = ? AND cv.user_b = ?"""
+    params = list(_conversation_pair(user1_id, user2_id))
+    if before_id is not None:
+        query += " AND dc.id < ?"
+        params.append(before_id)
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute(query + " ORDER BY dc.id DESC LIMIT ?", params + [limit + 1])
+        rows = c.fetchall()
+        messages = [{"id": m[0], "sender_id": m[1], "receiver_id": m[2], "message": m[3], "timestamp": m[4],
+                     "attachment": _attachment_from_row(m[5:])} for m in reversed(rows[:limit])]
+        return messages, len(rows) > limit
+
+def get_direct_messages_after(user1_id, user2_id, after_id):
+    """Direct message antara dua user yang lebih baru dari `after_id`, urut lama ke baru (untuk polling)."""
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute(f"""SELECT dc.id, dc.sender_id, dc.receiver_id, dc.message, dc.timestamp, {_ATTACHMENT_COLUMNS}
+                      FROM conversations cv
+                      JOIN direct_chats dc ON dc.conversation_id = cv.id
+                      LEFT JOIN chat_attachments a ON a.direct_chat_id = dc.id
+                      WHERE cv.user_a = ? AND cv.user_b = ? AND dc.id > ?
+                      ORDER BY dc.id""", _conversation_pair(user1_id, user2_id) + (after_id,))
+        return [{"id": m[0], "sender_id": m[1], "receiver_id": m[2], "message": m[3], "timestamp": m[4],
+                 "attachment": _attachment_from_row(m[5:])} for m in c.fetchall()]
+
+@cached_read("tasks", "users")
 def get_user_notifications(user_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    notifications = []
-    
-    user_role = get_user(user_id)['role']
-    if user_role in ['Manager', 'Supervisor']:
-        c.execute("""SELECT t.title, u.fullname FROM tasks t JOIN users u ON t.pic_id = u.id 
-                    WHERE t.status = 'Pending Approval' AND t.delegator_id = ?""", (user_id,))
-        notifications = c.fetchall()
-    
-    conn.close()
-    return notifications
+    with db_reader() as conn:
+        c = conn.cursor()
+        notifications = []
+        
+        user_role = get_user(user_id)['role']
+        if user_role in ['Manager', 'Supervisor']:
+            c.execute("""SELECT t.title, u.fullname FROM tasks t JOIN users u ON t.pic_id = u.id 
+                        WHERE t.status = 'Pending Approval' AND t.delegator_id = ?""", (user_id,))
+            notifications = c.fetchall()
+        
+        return notifications
+
+@cached_read("tasks", "projects")
+def get_overdue_tasks(user_id, limit=10):
+    """Task yang belum selesai dan sudah lewat batas waktu, di mana user menjadi PIC atau pemberi tugas."""
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("""SELECT t.title, p.name, t.due_date
+                     FROM tasks t JOIN projects p ON p.id = t.project_id
+                     WHERE t.status != 'Done'
+                       AND t.due_epoch < CAST(strftime('%s', 'now', 'localtime', 'start of day') AS INTEGER)
+                       AND (t.pic_id = :user_id OR t.delegator_id = :user_id)
+                     ORDER BY t.due_epoch
+                     LIMIT :limit""", {"user_id": user_id, "limit": limit})
+        return [{"title": t[0], "project_name": t[1], "due_date": t[2]} for t in c.fetchall()]
+
+@cached_read("direct_chats")
+def get_direct_conversations(user_id):
+    """Percakapan milik user, terbaru dulu, dengan lawan bicara dan jumlah pesan belum dibaca."""
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("""SELECT CASE WHEN user_a = :user_id THEN user_b ELSE user_a END,
+                            CASE WHEN user_a = :user_id THEN unread_a ELSE unread_b END,
+                            last_message_at
+                     FROM conversations
+                     WHERE user_a = :user_id OR user_b = :user_id
+                     ORDER BY last_message_id DESC""", {"user_id": user_id})
+        return [{"partner_id": cv[0], "unread_count": cv[1], "last_message_at": cv[2]} for cv in c.fetchall()]
 
+@cached_read("direct_chats")
 def get_unread_direct_messages_count(user_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("""SELECT sender_id, COUNT(*)
-                 FROM direct_chats
-                 WHERE receiver_id = ? AND is_read = 0
-                 GROUP BY sender_id""", (user_id,))
-    messages = c.fetchall()
-    conn.close()
-    return {sender_id: count for sender_id, count in messages}
-
-def get_all_direct_chat_partners(user_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("""SELECT DISTINCT sender_id AS partner_id FROM direct_chats WHERE receiver_id = ?
-                 UNION
-                 SELECT DISTINCT receiver_id AS partner_id FROM direct_chats WHERE sender_id = ?""", (user_id, user_id))
-    partners = c.fetchall()
-    conn.close()
-    return [p[0] for p in partners]
-    
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("""SELECT user_b, unread_a FROM conversations WHERE user_a = :user_id AND unread_a > 0
+                     UNION ALL
+                     SELECT user_a, unread_b FROM conversations WHERE user_b = :user_id AND unread_b > 0""", {"user_id": user_id})
+        return {partner_id: count for partner_id, count in c.fetchall()}
+
 def mark_direct_messages_as_read(sender_id, receiver_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("""UPDATE direct_chats SET is_read = 1 WHERE sender_id = ? AND receiver_id = ?""", (sender_id, receiver_id))
-    conn.commit()
-    conn.close()
+    user_a, user_b = _conversation_pair(sender_id, receiver_id)
+    unread_column = "unread_a" if receiver_id == user_a else "unread_b"
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute(f"SELECT {unread_column} FROM conversations WHERE user_a = ? AND user_b = ?", (user_a, user_b))
+        row = c.fetchone()
+    if not row or row[0] == 0:
+        return  # Tidak ada yang perlu ditandai, hindari transaksi tulis
+    with db_transaction() as conn:
+        conn.execute(f"UPDATE conversations SET {unread_column} = 0 WHERE user_a = ? AND user_b = ?", (user_a, user_b))
+    get_read_cache().invalidate("direct_chats")
+
+# Penanda awal/akhir kata yang cocok di snippet(); diganti <mark> setelah teks di-escape
+SNIPPET_MARKERS = ("\x02", "\x03")
+
+def search_project_chats(user_id, query, limit=SEARCH_RESULT_LIMIT):
+    """Pesan chat proyek yang cocok dengan `query`, paling relevan dulu.
+
+    Hanya proyek yang boleh dilihat user (aturan yang sama dengan get_projects).
+    """
+    match_query = fts_match_query(query)
+    if not match_query:
+        return []
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("""SELECT ch.id, ch.project_id, p.name, ch.sender_id, ch.timestamp,
+                            snippet(chats_fts, 0, :mark_start, :mark_end, '…', 16)
+                     FROM chats_fts
+                     JOIN chats ch ON ch.id = chats_fts.rowid
+                     JOIN projects p ON p.id = ch.project_id
+                     WHERE chats_fts MATCH :match
+                       AND ((SELECT role FROM users WHERE id = :user_id) IN ('Admin', 'Manager')
+                            OR EXISTS (SELECT 1 FROM project_members pm WHERE pm.project_id = ch.project_id AND pm.user_id = :user_id))
+                     ORDER BY chats_fts.rank, ch.id DESC
+                     LIMIT :limit""",
+                  {"match": match_query, "user_id": user_id, "limit": limit,
+                   "mark_start": SNIPPET_MARKERS[0], "mark_end": SNIPPET_MARKERS[1]})
+        return [{"id": m[0], "project_id": m[1], "project_name": m[2], "sender_id": m[3],
+                 "timestamp": m[4], "snippet": m[5]} for m in c.fetchall()]
+
+def search_direct_messages(user_id, query, limit=SEARCH_RESULT_LIMIT):
+    """Direct message yang cocok dengan `query`, hanya dari percakapan tempat user terlibat."""
+    match_query = fts_match_query(query)
+    if not match_query:
+        return []
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("""SELECT dc.id, CASE WHEN dc.sender_id = :user_id THEN dc.receiver_id ELSE dc.sender_id END,
+                            dc.sender_id, dc.timestamp,
+                            snippet(direct_chats_fts, 0, :mark_start, :mark_end, '…', 16)
+                     FROM direct_chats_fts
+                     JOIN direct_chats dc ON dc.id = direct_chats_fts.rowid
+                     WHERE direct_chats_fts MATCH :match
+                       AND (dc.sender_id = :user_id OR dc.receiver_id = :user_id)
+                     ORDER BY direct_chats_fts.rank, dc.id DESC
+                     LIMIT :limit""",
+                  {"match": match_query, "user_id": user_id, "limit": limit,
+                   "mark_start": SNIPPET_MARKERS[0], "mark_end": SNIPPET_MARKERS[1]})
+        return [{"id": m[0], "partner_id": m[1], "sender_id": m[2], "timestamp": m[3], "snippet": m[4]}
+                for m in c.fetchall()]
+
+def search_audit_trail(query, limit=SEARCH_RESULT_LIMIT):
+    """Jejak audit (tabel utama, tanpa arsip) yang detailnya cocok dengan `query`, paling relevan dulu."""
+    match_query = fts_match_query(query)
+    if not match_query:
+        return []
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("""SELECT a.id, a.timestamp, a.user_id, a.action,
+                            snippet(audit_trail_fts, 0, :mark_start, :mark_end, '…', 16)
+                     FROM audit_trail_fts
+                     JOIN audit_trail a ON a.id = audit_trail_fts.rowid
+                     WHERE audit_trail_fts MATCH :match
+                     ORDER BY audit_trail_fts.rank, a.id DESC
+                     LIMIT :limit""",
+                  {"match": match_query, "limit": limit,
+                   "mark_start": SNIPPET_MARKERS[0], "mark_end": SNIPPET_MARKERS[1]})
+        return [{"id": a[0], "timestamp": a[1], "user_id": a[2], "action": a[3], "snippet": a[4]}
+                for a in c.fetchall()]
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 def register_user(user_id, password, fullname, departemen, seksi):
-    conn = get_db_connection()
-    c = conn.cursor()
     try:
-        c.execute("SELECT id FROM users WHERE id = ?", (user_id,))
-        if c.fetchone():
-            st.error("ID Karyawan sudah terdaftar.")
-            return False
-        hashed_password = hash_password(password)
-        c.execute("INSERT INTO users (id, password, fullname, departemen, seksi, role, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                  (user_id, hashed_password, fullname, departemen, seksi, "Staff", "pending"))
-        conn.commit()
+        with db_transaction() as conn:
+            c = conn.cursor()
+            c.execute("SELECT id FROM users WHERE id = ?", (user_id,))
+            if c.fetchone():
+                st.error("ID Karyawan sudah terdaftar.")
+                return False
+            hashed_password = hash_password(password)
+            c.execute("INSERT INTO users (id, password, fullname, departemen, seksi, role, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      (user_id, hashed_password, fullname, departemen, seksi, "Staff", "pending"))
+        get_user_directory().invalidate()
+        get_read_cache().invalidate("users")
         record_audit_trail(user_id, "User Register", f"Pengguna '{user_id}' mendaftar dengan peran 'Staff' dan status 'pending'.")
         st.success("Pendaftaran berhasil! Akun Anda menunggu persetujuan dari Admin atau Manager.")
         return True
     except sqlite3.Error as e:
         st.error(f"Error mendaftar pengguna: {e}")
         return False
-    finally:
-        conn.close()
 
 def login_user(user_id, password):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT password, role, status FROM users WHERE id = ?", (user_id,))
-    result = c.fetchone()
-    conn.close()
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("SELECT password, role, status FROM users WHERE id = ?", (user_id,))
+        result = c.fetchone()
     if result:
         hashed_password = hash_password(password)
         if hashed_password == result[0]:
@@ -766,121 +1764,106 @@ def login_user(user_id, password):
         st.error("ID Karyawan atau kata sandi tidak valid.")
 
 def record_audit_trail(user_id, action, details):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO audit_trail (timestamp, user_id, action, details) VALUES (?, ?, ?, ?)", (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), user_id, action, details))
-    conn.commit()
-    conn.close()
+    get_audit_sink().record(user_id, action, details)
 
 def approve_user(user_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("UPDATE users SET status = 'approved' WHERE id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    with db_transaction() as conn:
+        conn.execute("UPDATE users SET status = 'approved' WHERE id = ?", (user_id,))
+    get_user_directory().invalidate()
+    get_read_cache().invalidate("users")
     record_audit_trail(st.session_state.current_user['id'], "Approve User", f"Pengguna '{user_id}' telah disetujui.")
     st.success(f"Pengguna '{user_id}' telah disetujui.")
     st.rerun()
 
 def change_user_role(user_id, new_role):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("UPDATE users SET role = ? WHERE id = ?", (new_role, user_id))
-    conn.commit()
-    conn.close()
+    with db_transaction() as conn:
+        conn.execute("UPDATE users SET role = ? WHERE id = ?", (new_role, user_id))
+    get_user_directory().invalidate()
+    get_read_cache().invalidate("users")
     record_audit_trail(st.session_state.current_user['id'], "Change User Role", f"Peran pengguna '{user_id}' diubah menjadi '{new_role}'.")
     st.success(f"Peran untuk pengguna '{user_id}' diubah menjadi '{new_role}'.")
     st.rerun()
 
 def reset_user_password(user_id, new_password):
-    conn = get_db_connection()
-    c = conn.cursor()
     hashed_password = hash_password(new_password)
-    c.execute("UPDATE users SET password = ? WHERE id = ?", (hashed_password, user_id))
-    conn.commit()
-    conn.close()
+    with db_transaction() as conn:
+        conn.execute("UPDATE users SET password = ? WHERE id = ?", (hashed_password, user_id))
+    get_user_directory().invalidate()
     record_audit_trail(st.session_state.current_user['id'], "Reset Password", f"Kata sandi untuk pengguna '{user_id}' telah diatur ulang.")
     st.success(f"Kata sandi untuk pengguna '{user_id}' telah diatur ulang.")
 
 def create_project(name, description, part_name, part_number, customer, model, members):
-    conn = get_db_connection()
-    c = conn.cursor()
     creator_id = st.session_state.current_user['id']
     try:
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("INSERT INTO projects (name, description, part_name, part_number, customer, model, creator_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                  (name, description, part_name, part_number, customer, model, creator_id, current_time))
-        project_id = c.lastrowid
-        
-        # Gunakan set untuk menghindari duplikasi member_id
-        unique_members = list(set(members))
-        for member_id in unique_members:
-            c.execute("INSERT INTO project_members (project_id, user_id) VALUES (?, ?)", (project_id, member_id))
+        with db_transaction() as conn:
+            c = conn.cursor()
+            c.execute("INSERT INTO projects (name, description, part_name, part_number, customer, model, creator_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                      (name, description, part_name, part_number, customer, model, creator_id, current_time))
+            project_id = c.lastrowid
+            
+            # Gunakan set untuk menghindari duplikasi member_id
+            unique_members = list(set(members))
+            for member_id in unique_members:
+                c.execute("INSERT INTO project_members (project_id, user_id) VALUES (?, ?)", (project_id, member_id))
+        get_read_cache().invalidate("projects", "members")
         
-        conn.commit()
         record_audit_trail(creator_id, "Create Project", f"Proyek '{name}' (ID: {project_id}) dibuat.")
         return True
     except sqlite3.Error as e:
-        conn.rollback()
         st.error(f"Error membuat proyek: {e}")
         return False
-    finally:
-        conn.close()
 
 def delete_project(project_id):
-    conn = get_db_connection()
-    c = conn.cursor()
     try:
-        c.execute("SELECT creator_id FROM projects WHERE id = ?", (project_id,))
-        result = c.fetchone()
-        if not result:
-            st.error("Proyek tidak ditemukan.")
-            return False
-            
-        creator_id = result[0]
-        if creator_id != st.session_state.current_user['id']:
-            st.error("Anda tidak memiliki otorisasi untuk menghapus proyek ini.")
-            return False
+        with db_transaction() as conn:
+            c = conn.cursor()
+            c.execute("SELECT creator_id FROM projects WHERE id = ?", (project_id,))
+            result = c.fetchone()
+            if not result:
+                st.error("Proyek tidak ditemukan.")
+                return False
+                
+            creator_id = result[0]
+            if creator_id != st.session_state.current_user['id']:
+                st.error("Anda tidak memiliki otorisasi untuk menghapus proyek ini.")
+                return False
 
-        # Hapus proyek - CASCADE akan otomatis menghapus project_members, tasks, chats
-        c.execute("DELETE FROM projects WHERE id = ?", (project_id,))
-        conn.commit()
+            # Hapus proyek - CASCADE akan otomatis menghapus project_members, tasks, chats
+            c.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+        get_read_cache().invalidate("projects", "members", "tasks", "documents", "chats")
         record_audit_trail(st.session_state.current_user['id'], "Delete Project", f"Proyek dengan ID {project_id} telah dihapus.")
-        st.success("Proyek berhasil dihapus.")
-        st.rerun()
     except sqlite3.Error as e:
-        conn.rollback()
         st.error(f"Error menghapus proyek: {e}")
         return False
-    finally:
-        conn.close()
+    st.success("Proyek berhasil dihapus.")
+    st.rerun()
 
 def cleanup_orphan_data():
     """Membersihkan data orphan dari database."""
-    conn = get_db_connection()
-    c = conn.cursor()
     try:
-        # Hapus project_members tanpa project
-        c.execute("""DELETE FROM project_members 
-                     WHERE project_id NOT IN (SELECT id FROM projects)""")
-        orphan_members = c.rowcount
-        
-        # Hapus tasks tanpa project
-        c.execute("""DELETE FROM tasks 
-                     WHERE project_id NOT IN (SELECT id FROM projects)""")
-        orphan_tasks = c.rowcount
-        
-        # Hapus chats tanpa project
-        c.execute("""DELETE FROM chats 
-                     WHERE project_id NOT IN (SELECT id FROM projects)""")
-        orphan_chats = c.rowcount
-        
-        # Hapus documents tanpa task
-        c.execute("""DELETE FROM documents 
-                     WHERE task_id NOT IN (SELECT id FROM tasks)""")
-        orphan_docs = c.rowcount
-        
-        conn.commit()
+        with db_transaction() as conn:
+            c = conn.cursor()
+            # Hapus project_members tanpa project
+            c.execute("""DELETE FROM project_members 
+                         WHERE project_id NOT IN (SELECT id FROM projects)""")
+            orphan_members = c.rowcount
+            
+            # Hapus tasks tanpa project
+            c.execute("""DELETE FROM tasks 
+                         WHERE project_id NOT IN (SELECT id FROM projects)""")
+            orphan_tasks = c.rowcount
+            
+            # Hapus chats tanpa project
+            c.execute("""DELETE FROM chats 
+                         WHERE project_id NOT IN (SELECT id FROM projects)""")
+            orphan_chats = c.rowcount
+            
+            # Hapus documents tanpa task
+            c.execute("""DELETE FROM documents 
+                         WHERE task_id NOT IN (SELECT id FROM tasks)""")
+            orphan_docs = c.rowcount
+        get_read_cache().invalidate("members", "tasks", "documents", "chats")
         
         total_cleaned = orphan_members + orphan_tasks + orphan_chats + orphan_docs
         if total_cleaned > 0:
@@ -891,71 +1874,239 @@ def cleanup_orphan_data():
         
         return True
     except sqlite3.Error as e:
-        conn.rollback()
         st.error(f"Error membersihkan database: {e}")
         return False
-    finally:
-        conn.close()
 
 def edit_project(project_id, name, description, part_name, part_number, customer, model, members):
-    conn = get_db_connection()
-    c = conn.cursor()
+    """Menyimpan perubahan proyek. Baris proyek hanya di-update bila ada kolom yang berubah,
+    dan anggota hanya ditambah/dihapus sesuai selisihnya (dicatat di project_member_history,
+    cursor baca chat anggota yang dikeluarkan ikut dihapus). Cache hanya dibuang bila ada perubahan."""
+    editor_id = st.session_state.current_user['id']
     try:
-        c.execute("UPDATE projects SET name = ?, description = ?, part_name = ?, part_number = ?, customer = ?, model = ? WHERE id = ?",
-                  (name, description, part_name, part_number, customer, model, project_id))
-        
-        c.execute("DELETE FROM project_members WHERE project_id = ?", (project_id,))
-        
-        # Gunakan set untuk menghindari duplikasi member_id
-        unique_members = list(set(members))
-        for member_id in unique_members:
-            c.execute("INSERT INTO project_members (project_id, user_id) VALUES (?, ?)", (project_id, member_id))
+        with db_transaction() as conn:
+            c = conn.cursor()
+            c.execute("""UPDATE projects SET name = :name, description = :description, part_name = :part_name,
+                                part_number = :part_number, customer = :customer, model = :model
+                         WHERE id = :id
+                           AND (name IS NOT :name OR description IS NOT :description OR part_name IS NOT :part_name
+                                OR part_number IS NOT :part_number OR customer IS NOT :customer OR model IS NOT :model)""",
+                      {"id": project_id, "name": name, "description": description, "part_name": part_name,
+                       "part_number": part_number, "customer": customer, "model": model})
+            project_changed = c.rowcount > 0
             
-        conn.commit()
-        record_audit_trail(st.session_state.current_user['id'], "Edit Project", f"Proyek '{name}' (ID: {project_id}) berhasil diedit.")
-        st.success("Proyek berhasil diperbarui!")
-        st.rerun()
+            c.execute("SELECT user_id FROM project_members WHERE project_id = ?", (project_id,))
+            current_members = {row[0] for row in c.fetchall()}
+            added = set(members) - current_members
+            removed = current_members - set(members)
+            if added or removed:
+                removed_rows = [(project_id, user_id) for user_id in removed]
+                c.executemany("DELETE FROM project_members WHERE project_id = ? AND user_id = ?", removed_rows)
+                c.executemany("DELETE FROM chat_read_state WHERE project_id = ? AND user_id = ?", removed_rows)
+                c.executemany("INSERT INTO project_members (project_id, user_id) VALUES (?, ?)",
+                              [(project_id, user_id) for user_id in added])
+                
+                current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                c.executemany("""INSERT INTO project_member_history (project_id, user_id, change, changed_by, changed_at)
+                                 VALUES (?, ?, ?, ?, ?)""",
+                              [(project_id, user_id, "added", editor_id, current_time) for user_id in sorted(added)]
+                              + [(project_id, user_id, "removed", editor_id, current_time) for user_id in sorted(removed)])
+        changed_entities = []
+        if project_changed:
+            changed_entities.append("projects")
+        if added or removed:
+            changed_entities.append("members")
+        if removed:
+            changed_entities.append("chats")  # cursor baca anggota yang dikeluarkan
+        if changed_entities:  # invalidate() tanpa argumen membuang semua entitas
+            get_read_cache().invalidate(*changed_entities)
+        
+        if project_changed or added or removed:
+            record_audit_trail(editor_id, "Edit Project",
+                               f"Proyek '{name}' (ID: {project_id}) berhasil diedit. Anggota ditambah: {len(added)}, dikeluarkan: {len(removed)}.")
     except sqlite3.Error as e:
-        conn.rollback()
         st.error(f"Error mengedit proyek: {e}")
-    finally:
-        conn.close()
+        return
+    st.success("Proyek berhasil diperbarui!")
+    st.rerun()
         
 def create_task(project_id, title, pic_id, delegator_id, due_date, notes):
-    conn = get_db_connection()
-    c = conn.cursor()
     try:
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("INSERT INTO tasks (project_id, title, pic_id, delegator_id, due_date, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                  (project_id, title, pic_id, delegator_id, due_date, "Yet", current_time))
-        task_id = c.lastrowid
-        conn.commit()
+        with db_transaction() as conn:
+            c = conn.cursor()
+            c.execute("INSERT INTO tasks (project_id, title, pic_id, delegator_id, due_date, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      (project_id, title, pic_id, delegator_id, due_date, "Yet", current_time))
+            task_id = c.lastrowid
+        get_read_cache().invalidate("tasks")
         record_audit_trail(delegator_id, "Create Task", f"Tugas '{title}' (ID: {task_id}) didelegasikan ke '{pic_id}'. Catatan: '{notes}'")
         return True
     except sqlite3.Error as e:
         st.error(f"Error membuat tugas: {e}")
         return False
-    finally:
-        conn.close()
+
+# Kolom file impor massal. Satu baris = satu tugas; baris dengan project_name yang sama
+# digabung menjadi satu proyek baru dan kolom proyeknya diambil dari baris pertama.
+IMPORT_COLUMNS = ("project_name", "description", "part_name", "part_number", "customer", "model",
+                  "members", "task_title", "pic_id", "due_date")
+
+def _import_cell_text(value):
+    if value is None:
+        return ""
+    if hasattr(value, "strftime"):  # sel tanggal dari Excel
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+def read_import_rows(file, filename):
+    """Membaca file impor CSV/XLSX baris demi baris tanpa memuat seluruh isinya.
+
+    Menghasilkan (nomor_baris, dict kolom -> teks); baris kosong dilewati.
+    Raise ValueError bila format file atau header tidak dikenali, atau CSV bukan UTF-8/rusak.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".xlsx":
+        if openpyxl is None:
+            raise ValueError("Impor Excel membutuhkan paket openpyxl (pip install openpyxl).")
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+    elif extension == ".csv":
+        rows = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    else:
+        raise ValueError(f"Format file '{extension}' tidak didukung, gunakan CSV atau XLSX.")
+    
+    line_number = 0  # baris terakhir yang berhasil dibaca, untuk pesan galat
+    try:
+        header = [_import_cell_text(value).lower() for value in next(rows, ())]
+        if "project_name" not in header:
+            raise ValueError("Header file harus memuat kolom project_name.")
+        unknown = [column for column in header if column and column not in IMPORT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Kolom tidak dikenal: {', '.join(unknown)}.")
+        line_number = 1
+        
+        for line_number, values in enumerate(rows, start=2):
+            row = {column: _import_cell_text(value) for column, value in zip(header, values) if column}
+            if any(row.values()):
+                yield line_number, row
+    except UnicodeDecodeError:
+        raise ValueError("File CSV harus berencoding UTF-8; simpan ulang file sebagai CSV UTF-8.") from None
+    except csv.Error as e:
+        raise ValueError(f"File CSV tidak valid di baris {line_number + 1}: {e}.") from None
+
+def _resolve_approved_users(c, user_ids):
+    """Subset `user_ids` yang terdaftar dan sudah disetujui, dicek per potongan IMPORT_USER_CHUNK_SIZE."""
+    user_ids = sorted(user_ids)
+    approved = set()
+    for start in range(0, len(user_ids), IMPORT_USER_CHUNK_SIZE):
+        chunk = user_ids[start:start + IMPORT_USER_CHUNK_SIZE]
+        placeholders = ", ".join("?" * len(chunk))
+        c.execute(f"SELECT id FROM users WHERE status = 'approved' AND id IN ({placeholders})", chunk)
+        approved.update(row[0] for row in c.fetchall())
+    return approved
+
+def import_projects(rows, creator_id, source_name, skip_invalid=False):
+    """Impor massal proyek, anggota, dan tugas dari baris read_import_rows dalam satu transaksi.
+
+    Setiap baris divalidasi sekali jalan, id pengguna dicek sekaligus, lalu semuanya
+    disisipkan dengan executemany dan dicatat sebagai satu jejak audit. Tanpa
+    skip_invalid, tidak ada yang disimpan bila ada baris yang salah; dengan skip_invalid
+    hanya baris yang salah yang dilewati. Pembuat dan PIC otomatis menjadi anggota proyek.
+    Mengembalikan dict jumlah 'projects', 'members', 'tasks' dan daftar 'errors'
+    berisi (nomor_baris, pesan), atau None bila terjadi error database.
+    """
+    errors = []
+    parsed_rows = []
+    referenced_users = set()
+    for line_number, row in rows:
+        project_name = row.get("project_name", "")
+        if not project_name:
+            errors.append((line_number, "project_name wajib diisi."))
+            continue
+        members = [member.strip() for member in row.get("members", "").replace(",", ";").split(";") if member.strip()]
+        task = None
+        if row.get("task_title") or row.get("pic_id") or row.get("due_date"):
+            missing = [column for column in ("task_title", "pic_id", "due_date") if not row.get(column)]
+            if missing:
+                errors.append((line_number, f"Kolom tugas belum lengkap: {', '.join(missing)}."))
+                continue
+            try:
+                due_date = datetime.strptime(row["due_date"], "%Y-%m-%d").strftime("%Y-%m-%d")
+            except ValueError:
+                errors.append((line_number, f"due_date '{row['due_date']}' harus berformat YYYY-MM-DD."))
+                continue
+            task = (row["task_title"], row["pic_id"], due_date)
+            members.append(row["pic_id"])
+        referenced_users.update(members)
+        parsed_rows.append((line_number, project_name, row, members, task))
+    
+    result = {"projects": 0, "members": 0, "tasks": 0, "errors": errors}
+    try:
+        with db_transaction() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            c = conn.cursor()
+            approved_users = _resolve_approved_users(c, referenced_users)
+            
+            projects = {}
+            for line_number, project_name, row, members, task in parsed_rows:
+                unknown = sorted(set(members) - approved_users)
+                if unknown:
+                    errors.append((line_number, f"Pengguna tidak ditemukan atau belum disetujui: {', '.join(unknown)}."))
+                    continue
+                project = projects.setdefault(project_name, {"row": row, "members": {creator_id}, "tasks": []})
+                project["members"].update(members)
+                if task:
+                    project["tasks"].append(task)
+            
+            errors.sort()
+            if errors and not skip_invalid:
+                return result
+            
+            # Id proyek ditentukan di sini agar anggota dan tugas bisa disisipkan dengan executemany
+            c.execute("SELECT COALESCE(MAX(id), 0) FROM projects")
+            next_project_id = c.fetchone()[0] + 1
+            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            project_rows, member_rows, task_rows = [], [], []
+            for project_id, (project_name, project) in enumerate(projects.items(), start=next_project_id):
+                row = project["row"]
+                project_rows.append((project_id, project_name, row.get("description", ""), row.get("part_name", ""),
+                                     row.get("part_number", ""), row.get("customer", ""), row.get("model", ""),
+                                     creator_id, current_time))
+                member_rows.extend((project_id, user_id) for user_id in project["members"])
+                task_rows.extend((project_id, title, pic_id, creator_id, due_date, "Yet", current_time)
+                                 for title, pic_id, due_date in project["tasks"])
+            
+            c.executemany("""INSERT INTO projects (id, name, description, part_name, part_number, customer, model, creator_id, created_at)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", project_rows)
+            c.executemany("INSERT INTO project_members (project_id, user_id) VALUES (?, ?)", member_rows)
+            c.executemany("""INSERT INTO tasks (project_id, title, pic_id, delegator_id, due_date, status, created_at)
+                             VALUES (?, ?, ?, ?, ?, ?, ?)""", task_rows)
+            result.update(projects=len(project_rows), members=len(member_rows), tasks=len(task_rows))
+        
+        if project_rows:
+            get_read_cache().invalidate("projects", "members", "tasks")
+            record_audit_trail(creator_id, "Bulk Import",
+                               f"Impor '{source_name}': {len(project_rows)} proyek, {len(member_rows)} anggota, "
+                               f"{len(task_rows)} tugas dibuat; {len(errors)} baris dilewati.")
+        return result
+    except sqlite3.Error as e:
+        st.error(f"Error impor massal: {e}")
+        return None
 
 def edit_task(task_id, title, pic_id, due_date, notes):
-    conn = get_db_connection()
-    c = conn.cursor()
     try:
-        c.execute("UPDATE tasks SET title = ?, pic_id = ?, due_date = ? WHERE id = ?",
-                  (title, pic_id, due_date, task_id))
-        conn.commit()
+        with db_transaction() as conn:
+            conn.execute("UPDATE tasks SET title = ?, pic_id = ?, due_date = ? WHERE id = ?",
+                         (title, pic_id, due_date, task_id))
+        get_read_cache().invalidate("tasks")
         record_audit_trail(st.session_state.current_user['id'], "Edit Task", f"Tugas '{title}' (ID: {task_id}) berhasil diedit.")
-        st.success("Tugas berhasil diperbarui!")
-        st.rerun()
     except sqlite3.Error as e:
         st.error(f"Error mengedit tugas: {e}")
-    finally:
-        conn.close()
+        return False
+    st.success("Tugas berhasil diperbarui!")
+    return True
 
 def upload_document(task_id, file, notes):
-    conn = get_db_connection()
-    c = conn.cursor()
     try:
         # Save file to disk
         filename = file.name
@@ -964,157 +2115,707 @@ def upload_document(task_id, file, notes):
         with open(filepath, "wb") as f:
             f.write(file.getbuffer())
 
-        # Check for existing documents to determine revision
-        c.execute("SELECT id FROM documents WHERE task_id = ? ORDER BY id DESC LIMIT 1", (task_id,))
-        last_doc_id = c.fetchone()
-        revision_of = last_doc_id[0] if last_doc_id else None
+        with db_transaction() as conn:
+            c = conn.cursor()
+            # Check for existing documents to determine revision
+            c.execute("SELECT id FROM documents WHERE task_id = ? ORDER BY id DESC LIMIT 1", (task_id,))
+            last_doc_id = c.fetchone()
+            revision_of = last_doc_id[0] if last_doc_id else None
 
-        c.execute("INSERT INTO documents (task_id, filename, filepath, revision_of, notes) VALUES (?, ?, ?, ?, ?)",
-                  (task_id, filename, filepath, revision_of, notes))
-        
-        # Update task status to "Pending Approval" directly (auto request approval after upload)
-        c.execute("UPDATE tasks SET status = ? WHERE id = ?", ("Pending Approval", task_id))
-        
-        conn.commit()
+            c.execute("INSERT INTO documents (task_id, filename, filepath, revision_of, notes) VALUES (?, ?, ?, ?, ?)",
+                      (task_id, filename, filepath, revision_of, notes))
+            
+            # Update task status to "Pending Approval" directly (auto request approval after upload)
+            c.execute("UPDATE tasks SET status = ? WHERE id = ?", ("Pending Approval", task_id))
+        get_read_cache().invalidate("tasks", "documents")
         
         record_audit_trail(st.session_state.current_user['id'], "Upload Document & Request Approval", f"Dokumen diunggah dan approval diminta untuk tugas '{task_id}'.")
-        st.success("Dokumen berhasil diunggah. Status tugas diperbarui menjadi 'Pending Approval'.")
-        st.rerun()
     except sqlite3.Error as e:
         st.error(f"Error mengunggah dokumen: {e}")
-    finally:
-        conn.close()
+        return False
+    st.success("Dokumen berhasil diunggah. Status tugas diperbarui menjadi 'Pending Approval'.")
+    return True
 
 def request_task_approval(task_id):
-    conn = get_db_connection()
-    c = conn.cursor()
     try:
-        c.execute("UPDATE tasks SET status = ? WHERE id = ?", ("Pending Approval", task_id))
-        conn.commit()
+        with db_transaction() as conn:
+            conn.execute("UPDATE tasks SET status = ? WHERE id = ?", ("Pending Approval", task_id))
+        get_read_cache().invalidate("tasks")
         record_audit_trail(st.session_state.current_user['id'], "Task Approval Request", f"Persetujuan diminta untuk tugas '{task_id}'.")
-        st.success("Permintaan persetujuan telah dikirim ke pendelegasi.")
-        st.rerun()
     except sqlite3.Error as e:
         st.error(f"Error meminta persetujuan: {e}")
-    finally:
-        conn.close()
+        return False
+    st.success("Permintaan persetujuan telah dikirim ke pendelegasi.")
+    return True
 
 def start_actual_work(task_id):
-    conn = get_db_connection()
-    c = conn.cursor()
     try:
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("UPDATE tasks SET actual_start = ?, status = ? WHERE id = ? AND actual_start IS NULL", (current_time, "On Progress", task_id))
-        conn.commit()
+        with db_transaction() as conn:
+            conn.execute("UPDATE tasks SET actual_start = ?, status = ? WHERE id = ? AND actual_start IS NULL", (current_time, "On Progress", task_id))
+        get_read_cache().invalidate("tasks")
         record_audit_trail(st.session_state.current_user['id'], "Start Actual Work", f"Tugas '{task_id}' dimulai secara aktual.")
-        st.success("Waktu mulai pengerjaan telah dicatat!")
-        st.rerun()
     except sqlite3.Error as e:
         st.error(f"Error memulai pengerjaan: {e}")
-    finally:
-        conn.close()
+        return False
+    st.success("Waktu mulai pengerjaan telah dicatat!")
+    return True
 
 def approve_task_completion(task_id):
-    conn = get_db_connection()
-    c = conn.cursor()
     try:
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("UPDATE tasks SET status = ?, completed_at = ? WHERE id = ?", ("Done", current_time, task_id))
-        conn.commit()
+        with db_transaction() as conn:
+            conn.execute("UPDATE tasks SET status = ?, completed_at = ? WHERE id = ?", ("Done", current_time, task_id))
+        get_read_cache().invalidate("tasks")
         record_audit_trail(st.session_state.current_user['id'], "Task Approved", f"Tugas '{task_id}' disetujui sebagai 'Done'.")
-        st.success("Tugas disetujui sebagai 'Done'.")
-        st.rerun()
     except sqlite3.Error as e:
         st.error(f"Error menyetujui tugas: {e}")
-    finally:
-        conn.close()
+        return False
+    st.success("Tugas disetujui sebagai 'Done'.")
+    return True
 
+@cached_read("projects", "tasks")
 def get_project_stats():
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    today = datetime.now()
-    start_of_this_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    start_of_last_month = (start_of_this_month - relativedelta(months=1))
-    
-    # Total Projects
-    c.execute("SELECT COUNT(*) FROM projects")
-    total_projects = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM projects WHERE created_at >= ?", (start_of_this_month,))
-    this_month_projects = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM projects WHERE created_at >= ? AND created_at < ?", (start_of_last_month, start_of_this_month))
-    last_month_projects = c.fetchone()[0]
-    diff_projects = this_month_projects - last_month_projects
-
-    # Total Tasks
-    c.execute("SELECT COUNT(*) FROM tasks")
-    total_tasks = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM tasks WHERE created_at >= ?", (start_of_this_month,))
-    this_month_tasks = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM tasks WHERE created_at >= ? AND created_at < ?", (start_of_last_month, start_of_this_month))
-    last_month_tasks = c.fetchone()[0]
-    diff_tasks = this_month_tasks - last_month_tasks
-
-    # Done Tasks
-    c.execute("SELECT COUNT(*) FROM tasks WHERE status = 'Done'")
-    done_tasks = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM tasks WHERE status = 'Done' AND created_at >= ?", (start_of_this_month,))
-    this_month_done_tasks = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM tasks WHERE status = 'Done' AND created_at >= ? AND created_at < ?", (start_of_last_month, start_of_this_month))
-    last_month_done_tasks = c.fetchone()[0]
-    diff_done_tasks = this_month_done_tasks - last_month_done_tasks
-    
-    conn.close()
-    
-    return {
-        'total_projects': total_projects, 'diff_projects': diff_projects,
-        'total_tasks': total_tasks, 'diff_tasks': diff_tasks,
-        'done_tasks': done_tasks, 'diff_done_tasks': diff_done_tasks
-    }
+    """Statistik dashboard dari rollup monthly_counters dalam satu query."""
+    with db_reader() as conn:
+        c = conn.cursor()
+        
+        start_of_this_month = datetime.now().replace(day=1)
+        this_month = start_of_this_month.strftime("%Y-%m")
+        last_month = (start_of_this_month - relativedelta(months=1)).strftime("%Y-%m")
+        
+        c.execute("""SELECT metric,
+                            SUM(count),
+                            SUM(CASE WHEN month = ? THEN count ELSE 0 END),
+                            SUM(CASE WHEN month = ? THEN count ELSE 0 END)
+                     FROM monthly_counters GROUP BY metric""", (this_month, last_month))
+        counters = {metric: (total, this_month_count, last_month_count) for metric, total, this_month_count, last_month_count in c.fetchall()}
+        
+        def total_and_diff(metric):
+            total, this_month_count, last_month_count = counters.get(metric, (0, 0, 0))
+            return total, this_month_count - last_month_count
+        
+        total_projects, diff_projects = total_and_diff('projects_created')
+        total_tasks, diff_tasks = total_and_diff('tasks_created')
+        done_tasks, diff_done_tasks = total_and_diff('tasks_done')
+        
+        return {
+            'total_projects': total_projects, 'diff_projects': diff_projects,
+            'total_tasks': total_tasks, 'diff_tasks': diff_tasks,
+            'done_tasks': done_tasks, 'diff_done_tasks': diff_done_tasks
+        }
+
+@cached_read("projects", "tasks")
+def get_monthly_trend(months=12):
+    """Deret bulanan (proyek dibuat, task dibuat, task selesai) untuk `months` bulan terakhir."""
+    with db_reader() as conn:
+        c = conn.cursor()
+        first_month = (datetime.now().replace(day=1) - relativedelta(months=months - 1)).strftime("%Y-%m")
+        c.execute("SELECT month, metric, count FROM monthly_counters WHERE month >= ? ORDER BY month", (first_month,))
+        return c.fetchall()
 
 def get_recent_audit_trail(limit=5):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT timestamp, user_id, action, details FROM audit_trail ORDER BY timestamp DESC LIMIT ?", (limit,))
-    recent_activities = c.fetchall()
-    conn.close()
-    return recent_activities
-
-def get_all_audit_trail():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT timestamp, user_id, action, details FROM audit_trail ORDER BY timestamp DESC")
-    all_activities = c.fetchall()
-    conn.close()
-    return all_activities
-
-def send_project_message(project_id, sender_id, message):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO chats (project_id, sender_id, message, timestamp) VALUES (?, ?, ?, ?)",
-              (project_id, sender_id, message, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-    conn.commit()
-    conn.close()
-    
-def send_direct_message(sender_id, receiver_id, message):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO direct_chats (sender_id, receiver_id, message, timestamp, is_read) VALUES (?, ?, ?, ?, ?)",
-              (sender_id, receiver_id, message, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 0))
-    conn.commit()
-    conn.close()
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("SELECT timestamp, user_id, action, details FROM audit_trail ORDER BY timestamp DESC, id DESC LIMIT ?", (limit,))
+        recent_activities = c.fetchall()
+        return recent_activities
+
+def get_audit_trail_page(limit=AUDIT_PAGE_SIZE, before=None, user_id=None, action=None, date_from=None, date_to=None,
+                         keyword=None, include_archive=False):
+    """Satu halaman jejak audit, terbaru dulu, dengan paging keyset pada (timestamp, id).
+
+    `before` adalah cursor (timestamp, id) dari halaman sebelumnya. Filter tanggal
+    bersifat inklusif. `keyword` dicocokkan ke detail lewat audit_trail_fts; arsip (tidak
+    diindeks) memakai fts_match_text dengan aturan awalan yang sama. Dengan include_archive, halaman
+    dilanjutkan ke arsip bulanan setelah tabel utama habis (isi arsip selalu lebih tua
+    dari tabel utama).
+    Mengembalikan (rows, next_cursor); next_cursor None bila tidak ada halaman berikutnya.
+    """
+    timestamp_from = date_from.strftime("%Y-%m-%d") if date_from else None
+    timestamp_to = (date_to + timedelta(days=1)).strftime("%Y-%m-%d") if date_to else None
+    match_query = fts_match_query(keyword) if keyword else None
+    if keyword and not match_query:
+        return [], None
+    
+    conditions = []
+    params = []
+    if match_query:
+        conditions.append("id IN (SELECT rowid FROM audit_trail_fts WHERE audit_trail_fts MATCH ?)")
+        params.append(match_query)
+    if user_id:
+        conditions.append("user_id = ?")
+        params.append(user_id)
+    if action:
+        conditions.append("action = ?")
+        params.append(action)
+    if timestamp_from:
+        conditions.append("timestamp >= ?")
+        params.append(timestamp_from)
+    if timestamp_to:
+        conditions.append("timestamp < ?")
+        params.append(timestamp_to)
+    if before:
+        conditions.append("(timestamp, id) < (?, ?)")
+        params.extend(before)
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute(f"""SELECT id, timestamp, user_id, action, details FROM audit_trail
+                      {where_clause}
+                      ORDER BY timestamp DESC, id DESC
+                      LIMIT ?""", params + [limit + 1])
+        rows = c.fetchall()
+        
+        if include_archive and len(rows) <= limit:
+            def matches(row):
+                row_id, timestamp, row_user_id, row_action, details = row
+                return ((not user_id or row_user_id == user_id)
+                        and (not action or row_action == action)
+                        and (not timestamp_from or timestamp >= timestamp_from)
+                        and (not timestamp_to or timestamp < timestamp_to)
+                        and (not before or (timestamp, row_id) < tuple(before))
+                        and (not match_query or fts_match_text(details, keyword)))
+            
+            for month in get_audit_archive_months():
+                if (before and month > before[0][:7]) or (timestamp_to and month > timestamp_to[:7]):
+                    continue
+                if timestamp_from and month < timestamp_from[:7]:
+                    break
+                rows.extend(row for row in load_audit_archive_month(month) if matches(row))
+                if len(rows) > limit:
+                    break
+        
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_id, last_timestamp = rows[-1][0], rows[-1][1]
+            return rows, (last_timestamp, last_id)
+        return rows, None
+
+def get_audit_filter_options(include_archive=False):
+    """Daftar pengguna dan aksi yang pernah tercatat, untuk pilihan filter jejak audit.
+
+    Dengan include_archive, pengguna dan aksi yang hanya ada di arsip bulanan ikut disertakan.
+    """
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("SELECT DISTINCT user_id FROM audit_trail")
+        user_ids = {row[0] for row in c.fetchall()}
+        c.execute("SELECT DISTINCT action FROM audit_trail")
+        actions = {row[0] for row in c.fetchall()}
+    if include_archive:
+        for month in get_audit_archive_months():
+            path = _audit_archive_path(month)
+            archive_user_ids, archive_actions = _read_audit_archive_options(path, os.path.getmtime(path))
+            user_ids.update(archive_user_ids)
+            actions.update(archive_actions)
+    return sorted(user_ids), sorted(actions)
+
+def _audit_archive_path(month):
+    return os.path.join(AUDIT_ARCHIVE_FOLDER, f"audit_{month}.csv.gz")
+
+def archive_audit_trail(retention_days=AUDIT_RETENTION_DAYS):
+    """Memindahkan jejak audit yang lebih tua dari `retention_days` ke arsip bulanan.
+
+    Setiap bulan disimpan sebagai CSV gzip di AUDIT_ARCHIVE_FOLDER; arsipan berikutnya
+    ditambahkan sebagai member gzip baru. File arsip ditulis dari koneksi baca sehingga
+    writer tidak tertahan selama I/O file; baris baru dihapus dari tabel utama setelah
+    file arsip tersimpan, sehingga duplikat (bila proses terhenti di tengah) disaring
+    berdasarkan id saat dibaca. Mengembalikan jumlah baris yang diarsipkan.
+    """
+    get_audit_sink().flush()
+    cutoff = (datetime.now() - timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+    archived = 0
+    max_id = None
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("""SELECT id, timestamp, user_id, action, details FROM audit_trail
+                     WHERE timestamp < ? ORDER BY timestamp, id""", (cutoff,))
+        for month, month_rows in itertools.groupby(c, key=lambda row: row[1][:7]):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in month_rows:
+                writer.writerow(row)
+                archived += 1
+                max_id = row[0] if max_id is None else max(max_id, row[0])
+            os.makedirs(AUDIT_ARCHIVE_FOLDER, exist_ok=True)
+            with open(_audit_archive_path(month), "ab") as f:
+                f.write(gzip.compress(buffer.getvalue().encode("utf-8")))
+                f.flush()
+                os.fsync(f.fileno())
+    if archived:
+        # Hanya baris yang sudah tertulis ke arsip; baris yang masuk sesudahnya punya id lebih besar
+        with db_transaction() as conn:
+            conn.execute("DELETE FROM audit_trail WHERE timestamp < ? AND id <= ?", (cutoff, max_id))
+    return archived
+
+def get_audit_archive_months():
+    """Bulan (YYYY-MM) yang memiliki file arsip jejak audit, terbaru dulu."""
+    if not os.path.isdir(AUDIT_ARCHIVE_FOLDER):
+        return []
+    months = [name[len("audit_"):-len(".csv.gz")] for name in os.listdir(AUDIT_ARCHIVE_FOLDER)
+              if name.startswith("audit_") and name.endswith(".csv.gz")]
+    return sorted(months, reverse=True)
+
+def load_audit_archive_month(month):
+    """Isi arsip satu bulan, terbaru dulu, dalam format baris get_audit_trail_page."""
+    path = _audit_archive_path(month)
+    return _read_audit_archive(path, os.path.getmtime(path))
+
+@st.cache_data(max_entries=12, show_spinner=False)
+def _read_audit_archive(path, mtime):
+    # mtime ikut menjadi kunci cache sehingga arsip yang ditambah dibaca ulang
+    rows_by_id = {}
+    with gzip.open(path, "rt", newline="", encoding="utf-8") as f:
+        for row_id, timestamp, user_id, action, details in csv.reader(f):
+            rows_by_id[int(row_id)] = (int(row_id), timestamp, user_id, action, details)
+    return sorted(rows_by_id.values(), key=lambda row: (row[1], row[0]), reverse=True)
+
+@st.cache_data(max_entries=240, show_spinner=False)
+def _read_audit_archive_options(path, mtime):
+    # Hanya himpunan pengguna dan aksi, sehingga semua bulan arsip bisa di-cache sekaligus
+    user_ids, actions = set(), set()
+    with gzip.open(path, "rt", newline="", encoding="utf-8") as f:
+        for _, _, user_id, action, _ in csv.reader(f):
+            user_ids.add(user_id)
+            actions.add(action)
+    return user_ids, actions
+
+# Data yang bisa diekspor: kolom, kolom tanggal untuk filter rentang, dan kolom bertipe integer (untuk Parquet)
+EXPORT_ENTITIES = {
+    "projects": {"columns": ("id", "name", "description", "part_name", "part_number", "customer", "model", "creator_id", "created_at"),
+                 "date_column": "created_at", "int_columns": ("id",)},
+    "project_members": {"columns": ("project_id", "user_id"), "date_column": None, "int_columns": ("project_id",)},
+    "tasks": {"columns": ("id", "project_id", "title", "pic_id", "delegator_id", "due_date", "status", "created_at", "actual_start", "completed_at"),
+              "date_column": "created_at", "int_columns": ("id", "project_id")},
+    "chats": {"columns": ("id", "project_id", "sender_id", "message", "timestamp"),
+              "date_column": "timestamp", "int_columns": ("id", "project_id")},
+    "direct_chats": {"columns": ("id", "sender_id", "receiver_id", "message", "timestamp"),
+                     "date_column": "timestamp", "int_columns": ("id",)},
+    "audit_trail": {"columns": ("id", "timestamp", "user_id", "action", "details"),
+                    "date_column": "timestamp", "int_columns": ("id",)},
+}
+EXPORT_FORMATS = ("csv", "parquet")
+
+def iter_export_chunks(entity, date_from=None, date_to=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Isi tabel `entity` per potongan `chunk_size` baris (fetchmany), urut id.
+
+    Filter tanggal bersifat inklusif dan diabaikan untuk entitas tanpa kolom tanggal.
+    Jejak audit yang sudah diarsipkan tidak ikut.
+    """
+    spec = EXPORT_ENTITIES[entity]
+    conditions = []
+    params = []
+    date_column = spec["date_column"]
+    if date_column and date_from:
+        conditions.append(f"{date_column} >= ?")
+        params.append(date_from.strftime("%Y-%m-%d"))
+    if date_column and date_to:
+        conditions.append(f"{date_column} < ?")
+        params.append((date_to + timedelta(days=1)).strftime("%Y-%m-%d"))
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order_columns = "id" if "id" in spec["columns"] else ", ".join(spec["columns"])
+    
+    if entity == "audit_trail":
+        get_audit_sink().flush()
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute(f"SELECT {', '.join(spec['columns'])} FROM {entity} {where_clause} ORDER BY {order_columns}", params)
+        while True:
+            rows = c.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+def export_entity(entity, output, export_format="csv", date_from=None, date_to=None):
+    """Menulis data `entity` ke file biner `output` sebagai CSV atau Parquet, potongan demi potongan.
+
+    Memori tetap kecil berapa pun jumlah barisnya. Mengembalikan jumlah baris yang diekspor.
+    """
+    spec = EXPORT_ENTITIES[entity]
+    exported = 0
+    if export_format == "parquet":
+        if pq is None:
+            raise ValueError("Ekspor Parquet membutuhkan paket pyarrow (pip install pyarrow).")
+        schema = pa.schema([(column, pa.int64() if column in spec["int_columns"] else pa.string())
+                            for column in spec["columns"]])
+        with pq.ParquetWriter(output, schema) as writer:
+            for rows in iter_export_chunks(entity, date_from, date_to):
+                columns = list(zip(*rows))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema))
+                exported += len(rows)
+    elif export_format == "csv":
+        text_output = io.TextIOWrapper(output, encoding="utf-8", newline="")
+        writer = csv.writer(text_output)
+        writer.writerow(spec["columns"])
+        for rows in iter_export_chunks(entity, date_from, date_to):
+            writer.writerows(rows)
+            exported += len(rows)
+        text_output.flush()
+        text_output.detach()  # `output` tetap terbuka untuk pemanggil
+    else:
+        raise ValueError(f"Format ekspor '{export_format}' tidak dikenal, gunakan csv atau parquet.")
+    return exported
+
+def create_export_file(entity, export_format="csv", date_from=None, date_to=None):
+    """Mengekspor `entity` ke file sementara di disk untuk diunduh dari UI.
+
+    Mengembalikan (path, jumlah_baris). File dihapus lagi bila ekspor gagal; file lama yang
+    tertinggal dari sesi sebelumnya ikut dibersihkan di sini.
+    """
+    cutoff = time.time() - EXPORT_FILE_MAX_AGE_SECONDS
+    temp_dir = tempfile.gettempdir()
+    for name in os.listdir(temp_dir):
+        if name.startswith(EXPORT_FILE_PREFIX):
+            path = os.path.join(temp_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+    fd, path = tempfile.mkstemp(prefix=EXPORT_FILE_PREFIX, suffix=f".{export_format}")
+    try:
+        with os.fdopen(fd, "w+b") as output:
+            exported = export_entity(entity, output, export_format, date_from, date_to)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, exported
+
+def read_export_file(path):
+    """Isi file ekspor; dipanggil Streamlit baru saat tombol unduh diklik."""
+    with open(path, "rb") as f:
+        return f.read()
+
+def create_chat_thumbnail(filepath):
+    """Membuat thumbnail WebP (JPEG bila Pillow tanpa WebP) untuk gambar lampiran chat.
+
+    Mengembalikan {"thumb_path", "thumb_width", "thumb_height"}, atau None bila Pillow tidak
+    terpasang, file tidak bisa dibaca sebagai gambar, gambarnya animasi, atau sudah cukup kecil
+    untuk ditampilkan apa adanya. Nama thumbnail diturunkan dari nama file asli, jadi
+    membuat ulang cukup menimpa file yang sama.
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(filepath) as image:
+            if getattr(image, "is_animated", False) or max(image.size) <= CHAT_THUMBNAIL_MAX_SIZE:
+                return None
+            # Foto ponsel menyimpan orientasi di EXIF, yang hilang saat di-resize
+            thumbnail = ImageOps.exif_transpose(image)
+            thumbnail.thumbnail((CHAT_THUMBNAIL_MAX_SIZE, CHAT_THUMBNAIL_MAX_SIZE))
+            thumbnail = thumbnail.convert("RGBA" if thumbnail.has_transparency_data else "RGB")
+    except (OSError, Image.DecompressionBombError):
+        return None
+    
+    os.makedirs(CHAT_THUMBNAIL_FOLDER, exist_ok=True)
+    thumb_base = os.path.join(CHAT_THUMBNAIL_FOLDER, os.path.splitext(os.path.basename(filepath))[0])
+    try:
+        thumb_path = thumb_base + ".webp"
+        thumbnail.save(thumb_path, "WEBP", quality=CHAT_THUMBNAIL_QUALITY)
+    except (KeyError, OSError):
+        thumb_path = thumb_base + ".jpg"
+        thumbnail.convert("RGB").save(thumb_path, "JPEG", quality=CHAT_THUMBNAIL_QUALITY, optimize=True)
+    return {"thumb_path": thumb_path, "thumb_width": thumbnail.width, "thumb_height": thumbnail.height}
+
+def save_chat_attachment(uploaded_file):
+    """Menyimpan file unggahan chat ke CHAT_MEDIA_FOLDER dan mengembalikan metadata lampirannya.
+
+    Untuk gambar sekaligus dibuat thumbnail-nya, yang ditampilkan di bubble chat.
+    """
+    filepath = os.path.join(CHAT_MEDIA_FOLDER, f"chat_{uuid.uuid4().hex}_{uploaded_file.name}")
+    with open(filepath, "wb") as f:
+        f.write(uploaded_file.getbuffer())
+    attachment = _attachment_metadata(filepath, uploaded_file.name, uploaded_file.type)
+    if attachment["kind"] == "image":
+        attachment.update(create_chat_thumbnail(filepath) or {})
+    return attachment
+
+def sync_missing_chat_attachments():
+    """Menyelaraskan penanda `missing` lampiran chat dengan file yang benar-benar ada di disk.
+
+    Hanya dijalankan oleh backfill, bukan saat render. Mengembalikan jumlah lampiran yang file-nya hilang.
+    """
+    with db_reader() as conn:
+        attachments = conn.execute("SELECT id, filepath, missing FROM chat_attachments").fetchall()
+    changed = []
+    missing_count = 0
+    for attachment_id, filepath, missing in attachments:
+        is_missing = 0 if os.path.isfile(filepath) else 1
+        missing_count += is_missing
+        if is_missing != missing:
+            changed.append((is_missing, attachment_id))
+    if changed:
+        with db_transaction() as conn:
+            conn.executemany("UPDATE chat_attachments SET missing = ? WHERE id = ?", changed)
+    return missing_count
+
+def backfill_chat_thumbnails():
+    """Membuat thumbnail untuk lampiran gambar yang belum memilikinya (mis. dari sebelum fitur ini ada).
+
+    Penanda file hilang diselaraskan lebih dulu. Gambar yang thumbnail-nya sudah terhapus dari disk
+    dibuatkan ulang; bila tidak bisa, thumb_path dikosongkan sehingga chat menampilkan gambar asli.
+    Gambar diproses di luar transaksi; hasilnya disimpan sekaligus di akhir. Gambar yang sudah kecil
+    atau tidak terbaca dilewati (dan akan diperiksa lagi pada backfill berikutnya). Mengembalikan
+    (jumlah thumbnail dibuat, jumlah gambar dilewati, jumlah lampiran yang file-nya hilang).
+    """
+    missing_count = sync_missing_chat_attachments()
+    if Image is None:
+        raise ValueError("Thumbnail gambar membutuhkan paket Pillow (pip install Pillow).")
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, filepath, thumb_path FROM chat_attachments WHERE kind = 'image' AND missing = 0")
+        pending = [(attachment_id, filepath, thumb_path) for attachment_id, filepath, thumb_path in c.fetchall()
+                   if not thumb_path or not os.path.isfile(thumb_path)]
+    updates = []
+    created = 0
+    for attachment_id, filepath, thumb_path in pending:
+        thumbnail = create_chat_thumbnail(filepath)
+        if thumbnail:
+            updates.append((thumbnail["thumb_path"], thumbnail["thumb_width"], thumbnail["thumb_height"], attachment_id))
+            created += 1
+        elif thumb_path:
+            updates.append((None, None, None, attachment_id))
+    if updates:
+        with db_transaction() as conn:
+            conn.executemany("UPDATE chat_attachments SET thumb_path = ?, thumb_width = ?, thumb_height = ? WHERE id = ?",
+                             updates)
+    return created, len(pending) - created, missing_count
+
+def _store_message_attachment(c, attachment, chat_id=None, direct_chat_id=None):
+    """Menyimpan lampiran pesan yang baru dikirim, termasuk thumbnail dan penanda file hilang.
+
+    Kolom-kolom ini ditambahkan setelah migrasi 011, jadi tidak ditulis oleh _store_chat_attachment.
+    """
+    attachment_id = _store_chat_attachment(c, attachment, chat_id=chat_id, direct_chat_id=direct_chat_id)
+    c.execute("UPDATE chat_attachments SET thumb_path = ?, thumb_width = ?, thumb_height = ?, missing = ? WHERE id = ?",
+              (attachment.get("thumb_path"), attachment.get("thumb_width"), attachment.get("thumb_height"),
+               int(attachment.get("missing", False)), attachment_id))
+
+def send_project_message(project_id, sender_id, message, attachment=None):
+    with db_transaction() as conn:
+        c = conn.cursor()
+        c.execute("INSERT INTO chats (project_id, sender_id, message, timestamp) VALUES (?, ?, ?, ?)",
+                  (project_id, sender_id, message, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        if attachment:
+            _store_message_attachment(c, attachment, chat_id=c.lastrowid)
+    get_read_cache().invalidate("chats")
+    
+def _store_direct_message(c, sender_id, receiver_id, message, timestamp, count_unread=True):
+    """Menyimpan direct message dan memperbarui baris conversations-nya (dalam transaksi pemanggil)."""
+    user_a, user_b = _conversation_pair(sender_id, receiver_id)
+    c.execute("INSERT OR IGNORE INTO conversations (user_a, user_b) VALUES (?, ?)", (user_a, user_b))
+    c.execute("SELECT id FROM conversations WHERE user_a = ? AND user_b = ?", (user_a, user_b))
+    conversation_id = c.fetchone()[0]
+    c.execute("INSERT INTO direct_chats (conversation_id, sender_id, receiver_id, message, timestamp) VALUES (?, ?, ?, ?, ?)",
+              (conversation_id, sender_id, receiver_id, message, timestamp))
+    message_id = c.lastrowid
+    unread_column = "unread_a" if receiver_id == user_a else "unread_b"
+    unread_increment = 1 if count_unread and sender_id != receiver_id else 0
+    c.execute(f"""UPDATE conversations SET last_message_id = ?, last_message_at = ?, {unread_column} = {unread_column} + ?
+                  WHERE id = ?""", (message_id, timestamp, unread_increment, conversation_id))
+    return message_id
+
+def send_direct_message(sender_id, receiver_id, message, attachment=None):
+    with db_transaction() as conn:
+        c = conn.cursor()
+        message_id = _store_direct_message(c, sender_id, receiver_id, message, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        if attachment:
+            _store_message_attachment(c, attachment, direct_chat_id=message_id)
+    get_read_cache().invalidate("direct_chats")
 
 def mark_project_messages_as_read(project_id, user_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("UPDATE chats SET is_read = 1 WHERE project_id = ? AND sender_id != ?", (project_id, user_id))
-    conn.commit()
-    conn.close()
+    """Menggeser cursor baca user ke pesan terakhir proyek dengan satu upsert."""
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("""SELECT (SELECT MAX(id) FROM chats WHERE project_id = ?),
+                            (SELECT last_read_id FROM chat_read_state WHERE project_id = ? AND user_id = ?)""",
+                  (project_id, project_id, user_id))
+        latest_id, last_read_id = c.fetchone()
+    if latest_id is None or (last_read_id is not None and last_read_id >= latest_id):
+        return  # Tidak ada yang perlu ditandai, hindari transaksi tulis
+    with db_transaction() as conn:
+        conn.execute("""INSERT INTO chat_read_state (project_id, user_id, last_read_id) VALUES (?, ?, ?)
+                        ON CONFLICT(project_id, user_id) DO UPDATE SET last_read_id = MAX(last_read_id, excluded.last_read_id)""",
+                     (project_id, user_id, latest_id))
+    get_read_cache().invalidate("chats")
+
+# --- Perintah CLI ---
+# Dijalankan dengan `python app.py <perintah>` (bukan lewat `streamlit run`), contoh:
+#   python app.py seed-demo
+#   python app.py archive-audit --days 180
+#   python app.py backfill-thumbnails
+def run_cli(argv):
+    parser = argparse.ArgumentParser(prog="app.py", description="Perintah pemeliharaan FLUX Project Manager.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("seed-demo", help="Isi database yang masih kosong dengan data demo.")
+    archive_parser = commands.add_parser("archive-audit", help="Pindahkan jejak audit lama ke arsip bulanan terkompresi.")
+    archive_parser.add_argument("--days", type=int, default=AUDIT_RETENTION_DAYS,
+                                help=f"Umur minimum (hari) jejak audit yang diarsipkan (default: {AUDIT_RETENTION_DAYS}).")
+    export_parser = commands.add_parser("export", help="Ekspor satu tabel ke file CSV atau Parquet.")
+    export_parser.add_argument("entity", choices=list(EXPORT_ENTITIES))
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv", dest="export_format")
+    export_parser.add_argument("--from", type=lambda value: datetime.strptime(value, "%Y-%m-%d"), dest="date_from",
+                               help="Tanggal awal (YYYY-MM-DD), inklusif.")
+    export_parser.add_argument("--to", type=lambda value: datetime.strptime(value, "%Y-%m-%d"), dest="date_to",
+                               help="Tanggal akhir (YYYY-MM-DD), inklusif.")
+    export_parser.add_argument("--output", help="Path file tujuan (default: <entity>_<tanggal>.<format>).")
+    commands.add_parser("backfill-thumbnails", help="Buat thumbnail untuk lampiran gambar chat yang belum memilikinya dan tandai lampiran yang file-nya hilang.")
+    args = parser.parse_args(argv)
 
-# Panggil fungsi create_dummy_data setelah semua fungsi database didefinisikan
-create_dummy_data()
+    if args.command == "seed-demo":
+        create_dummy_data()
+    elif args.command == "archive-audit":
+        archived = archive_audit_trail(args.days)
+        print(f"📦 {archived} jejak audit diarsipkan ke {AUDIT_ARCHIVE_FOLDER}")
+    elif args.command == "export":
+        output_path = args.output or f"{args.entity}_{datetime.now().strftime('%Y%m%d')}.{args.export_format}"
+        with open(output_path, "wb") as output:
+            exported = export_entity(args.entity, output, args.export_format, args.date_from, args.date_to)
+        print(f"📤 {exported} baris {args.entity} diekspor ke {output_path}")
+    elif args.command == "backfill-thumbnails":
+        created, skipped, missing = backfill_chat_thumbnails()
+        print(f"🖼️ {created} thumbnail dibuat, {skipped} gambar dilewati, {missing} lampiran tidak ditemukan")
+    return 0
+
+if __name__ == "__main__" and not st.runtime.exists():
+    sys.exit(run_cli(sys.argv[1:]))
 
 # --- Fungsi Tampilan UI ---
+def chat_media_url(filepath):
+    """URL relatif file di CHAT_MEDIA_FOLDER (termasuk thumbnail); browser mengambil (dan meng-cache) file-nya sendiri."""
+    relative_path = os.path.relpath(filepath, CHAT_MEDIA_FOLDER).replace(os.sep, "/")
+    return f"{CHAT_MEDIA_URL}/{urllib.parse.quote(relative_path)}"
+
+def chat_message_html(msg, highlighted=False):
+    """HTML bubble untuk satu pesan chat (proyek maupun direct).
+
+    `highlighted` menandai pesan yang dibuka dari halaman Pencarian.
+    """
+    sender_user = get_user(msg['sender_id'])
+    sender = sender_user['fullname']
+    sender_role = sender_user['role']
+    is_me = msg['sender_id'] == st.session_state.current_user['id']
+    
+    # Warna berdasarkan role untuk pesan orang lain
+    role_colors = {
+        'Admin': {'bg': '#FFE5E5', 'border': '#FF6B6B', 'name': '#C92A2A'},  # Merah muda
+        'Manager': {'bg': '#E3F2FD', 'border': '#2196F3', 'name': '#0D47A1'},  # Biru
+        'Supervisor': {'bg': '#FFF3E0', 'border': '#FF9800', 'name': '#E65100'},  # Orange
+        'Staff': {'bg': '#F3E5F5', 'border': '#9C27B0', 'name': '#4A148C'}  # Ungu
+    }
+    
+    if is_me:
+        align = 'flex-end'
+        bg_color = '#DCF8C6'  # Hijau muda untuk pesan sendiri
+        border_color = '#4CAF50'
+        name_color = '#2E7D32'
+        shadow = '2px 2px 5px rgba(0,0,0,0.15)'
+    else:
+        align = 'flex-start'
+        role_style = role_colors.get(sender_role, role_colors['Staff'])
+        bg_color = role_style['bg']
+        border_color = role_style['border']
+        name_color = role_style['name']
+        shadow = '2px 2px 5px rgba(0,0,0,0.1)'
+    
+    text_color = 'black'
+    outline = '2px solid #FFC107' if highlighted else 'none'
+    
+    # Render content
+    the_msg = msg['message']
+    attachment = msg.get('attachment')
+    msg_html = f"<strong style='color: {name_color};'>{sender}</strong> <span style='font-size: 0.75em; color: #666;'>({sender_role})</span><br>"
+    content_html = ""
+    
+    if attachment is None:
+        content_html += the_msg
+    else:
+        if the_msg.strip():
+            content_html += f"<span>{the_msg.strip()}</span><br>"
+        file_name = html.escape(attachment['original_name'])
+        # File tidak ikut dikirim lewat websocket; hanya URL-nya yang dirender. Keberadaan file
+        # dibaca dari penanda `missing` di database, bukan diperiksa per pesan.
+        if attachment['missing']:
+            missing_label = "Gambar" if attachment['kind'] == 'image' else "File"
+            content_html += f"<span style='color:#999;'>⚠ {missing_label} tidak ditemukan</span>"
+        else:
+            file_url = chat_media_url(attachment['filepath'])
+            if attachment['kind'] == 'image':
+                # Bubble memuat thumbnail; gambar asli baru diambil saat diklik atau diunduh
+                thumb_path = attachment.get('thumb_path')
+                preview_url = chat_media_url(thumb_path) if thumb_path else file_url
+                content_html += f'''<div style="margin: 8px 0;"><a href="{file_url}" target="_blank"><img src="{preview_url}" loading="lazy" style="max-width: 300px; max-height: 300px; border-radius: 12px; box-shadow: 0 4px 12px rgba(0,0,0,0.15); cursor: pointer; transition: transform 0.2s ease;" onmouseover="this.style.transform='scale(1.02)'" onmouseout="this.style.transform='scale(1)'" title="Klik untuk memperbesar" /></a><br><a href="{file_url}" download="{file_name}" style="display: inline-block; margin-top: 8px; padding: 6px 12px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; text-decoration: none; border-radius: 8px; font-size: 0.85em; font-weight: 500; box-shadow: 0 2px 8px rgba(102, 126, 234, 0.3); transition: all 0.2s ease;">📥 Download</a></div>'''
+            else:
+                content_html += f'''<a href="{file_url}" download="{file_name}" 
+                    style="display:inline-block; color:#007bff; padding:4px 0; 
+                    text-decoration:underline; font-weight:500; margin:5px 0; cursor:pointer; 
+                    transition: all 0.2s ease;">
+                    📎 {file_name}
+                </a>'''
+    
+    # Tanpa indentasi dan baris kosong, supaya banyak bubble bisa digabung dalam satu blok HTML markdown
+    return (f'<div style="display: flex; justify-content: {align}; margin-bottom: 10px;">'
+            f'<div style="background-color: {bg_color}; padding: 12px 15px; border-radius: 15px; '
+            f'max-width: 80%; color: {text_color}; box-shadow: {shadow}; '
+            f'border-left: 4px solid {border_color}; outline: {outline};">'
+            f"{msg_html}"
+            f"<div style='margin:2px 0 0 0; word-break: break-word;'>{content_html}</div>"
+            f'<small style="display: block; text-align: right; color: #888; font-size: 0.7em; margin-top: 5px;">{msg["timestamp"]}</small>'
+            '</div></div>')
+
+def join_chat_bubbles(messages, focus_id=None):
+    return "\n".join(chat_message_html(msg, highlighted=msg['id'] == focus_id) for msg in messages)
+
+def render_chat_history(chat_key, load_page, load_after):
+    """Riwayat chat dalam container 400px, disimpan di session_state per `chat_key`.
+
+    Pemuatan pertama mengambil CHAT_PAGE_SIZE pesan terbaru (`load_page()`). Rerun
+    berikutnya hanya mengambil pesan setelah id terakhir (`load_after(last_id)`) lalu
+    menambahkannya. "Muat pesan lebih lama" menambahkan satu halaman di depan
+    (`load_page(before_id=...)`) lewat callback, sebelum riwayat dirender.
+    
+    Bila halaman Pencarian menyimpan id pesan di `chat_focus[chat_key]`, riwayat dimuat
+    ulang mulai dari pesan tersebut (dengan sedikit konteks sebelumnya) dan pesan itu ditandai.
+
+    HTML bubble ikut disimpan di riwayat: pesan baru dan halaman lama cukup ditambahkan,
+    sehingga refresh berkala tanpa pesan baru tidak membangun ulang HTML seluruh riwayat.
+    """
+    chat_history = st.session_state.setdefault('chat_history', {})
+    history = chat_history.get(chat_key)
+    focus_id = st.session_state.get('chat_focus', {}).pop(chat_key, None)
+    if focus_id is not None:
+        messages, has_older = load_page(before_id=focus_id + 1)
+        context = [m for m in messages if m['id'] < focus_id][-2:]
+        has_older = has_older or len(messages) > len(context) + 1
+        messages = context + [m for m in messages if m['id'] == focus_id] + load_after(focus_id)
+        history = chat_history[chat_key] = {'messages': messages, 'has_older': has_older, 'focus_id': focus_id,
+                                            'html': join_chat_bubbles(messages, focus_id)}
+    elif history is None:
+        messages, has_older = load_page()
+        history = chat_history[chat_key] = {'messages': messages, 'has_older': has_older,
+                                            'html': join_chat_bubbles(messages)}
+    else:
+        last_id = history['messages'][-1]['id'] if history['messages'] else 0
+        new_messages = load_after(last_id)
+        if new_messages:
+            history['messages'].extend(new_messages)
+            history['html'] = "\n".join(filter(None, [history['html'], join_chat_bubbles(new_messages)]))
+    
+    def load_older_messages():
+        older_messages, history['has_older'] = load_page(before_id=history['messages'][0]['id'])
+        history['messages'] = older_messages + history['messages']
+        history['html'] = "\n".join(filter(None, [join_chat_bubbles(older_messages), history['html']]))
+    
+    chat_container = st.container(height=400)
+    with chat_container:
+        if history['has_older']:
+            st.button("⬆️ Muat pesan lebih lama", key=f"older_{chat_key}", on_click=load_older_messages, use_container_width=True)
+        if history['html']:
+            st.markdown(history['html'], unsafe_allow_html=True)
+
 def show_login_page():
     col1, col2, col3 = st.columns([1, 2, 1])
     with col1:
@@ -1216,6 +2917,17 @@ def show_dashboard():
                 <p style="margin: 0; font-size: 0.9em; color: white;">{f'+{stats["diff_done_tasks"]}' if stats['diff_done_tasks'] >= 0 else str(stats['diff_done_tasks'])} from last month</p>
             </div>
         """, unsafe_allow_html=True)
+    
+    # Tren bulanan dari rollup yang sama
+    trend = get_monthly_trend()
+    if trend:
+        metric_labels = {'projects_created': 'Proyek Baru', 'tasks_created': 'Task Baru', 'tasks_done': 'Task Selesai'}
+        df_trend = pd.DataFrame(trend, columns=['Bulan', 'Metrik', 'Jumlah'])
+        df_trend['Metrik'] = df_trend['Metrik'].map(metric_labels)
+        fig_trend = px.line(df_trend, x='Bulan', y='Jumlah', color='Metrik', markers=True,
+                            title='Tren 12 Bulan Terakhir', height=300)
+        fig_trend.update_layout(xaxis_title="", yaxis_title="", legend_title_text="")
+        st.plotly_chart(fig_trend, use_container_width=True)
         
     st.markdown("---")
     
@@ -1234,23 +2946,27 @@ def show_dashboard():
     with col_notif:
         st.subheader("Notifikasi")
         notifications = get_user_notifications(st.session_state.current_user['id'])
-        if notifications:
-            for title, pic_fullname in notifications:
-                st.warning(f"Tugas '{title}' dari {pic_fullname} siap untuk persetujuan Anda!")
-        else:
+        overdue_tasks = get_overdue_tasks(st.session_state.current_user['id'])
+        for title, pic_fullname in notifications:
+            st.warning(f"Tugas '{title}' dari {pic_fullname} siap untuk persetujuan Anda!")
+        for task in overdue_tasks:
+            st.error(f"⏰ Tugas '{task['title']}' ({task['project_name']}) melewati batas waktu {task['due_date']}.")
+        if not notifications and not overdue_tasks:
             st.info("Tidak ada notifikasi baru.")
 
 def show_projects_page():
     st.title("Proyek")
     
-    project_tabs = st.tabs(["Daftar Proyek", "Buat Proyek Baru"])
+    can_bulk_import = st.session_state.current_user['role'] in ['Admin', 'Manager']
+    project_tabs = st.tabs(["Daftar Proyek", "Buat Proyek Baru"] + (["📥 Impor Massal"] if can_bulk_import else []))
     
     with project_tabs[0]:
         st.subheader("Daftar Proyek")
         
         col_search, col_filter = st.columns([3, 1])
         with col_search:
-            search_query = st.text_input("Cari Proyek (Nama, Nama Part, Nomor Part)")
+            search_query = st.text_input("Cari Proyek (Nama, Part, Pelanggan, Model, Deskripsi)",
+                                         help="Setiap kata dicocokkan sebagai awalan, hasil diurutkan berdasarkan relevansi.")
         with col_filter:
             all_users = get_all_users()
             creator_names = ["-- Semua --"] + [u['fullname'] for u in all_users]
@@ -1259,7 +2975,25 @@ def show_projects_page():
             if selected_creator_name != "-- Semua --":
                 selected_creator_id = [u['id'] for u in all_users if u['fullname'] == selected_creator_name][0]
                 
-        projects = get_projects(st.session_state.current_user['id'], search_query, selected_creator_id)
+        # Simpan cursor setiap halaman yang sudah dilewati: id proyek terakhir (keyset) saat
+        # menelusuri, atau offset saat hasil pencarian diurutkan berdasarkan relevansi.
+        # Reset ke halaman pertama jika kata kunci atau filter berubah.
+        list_filter = (search_query, selected_creator_id)
+        if st.session_state.get('projects_list_filter') != list_filter:
+            st.session_state.projects_list_filter = list_filter
+            st.session_state.projects_page_cursors = [None]
+        page_cursors = st.session_state.projects_page_cursors
+        
+        if search_query:
+            projects = get_projects(st.session_state.current_user['id'], search_query, selected_creator_id,
+                                    limit=PROJECTS_PAGE_SIZE + 1, offset=page_cursors[-1])
+            next_page_cursor = (page_cursors[-1] or 0) + PROJECTS_PAGE_SIZE
+        else:
+            projects = get_projects(st.session_state.current_user['id'], search_query, selected_creator_id,
+                                    limit=PROJECTS_PAGE_SIZE + 1, before_id=page_cursors[-1])
+            next_page_cursor = projects[PROJECTS_PAGE_SIZE - 1]['id'] if len(projects) > PROJECTS_PAGE_SIZE else None
+        has_next_page = len(projects) > PROJECTS_PAGE_SIZE
+        projects = projects[:PROJECTS_PAGE_SIZE]
         
         if projects:
             for p in projects:
@@ -1288,6 +3022,18 @@ def show_projects_page():
                         if st.session_state.current_user['id'] == p['creator_id']:
                             if st.button("Hapus Proyek", key=f"delete_{p['id']}"):
                                 delete_project(p['id'])
+            
+            col_prev, col_page, col_next = st.columns([1, 2, 1])
+            with col_prev:
+                if len(page_cursors) > 1 and st.button("⬅️ Sebelumnya", key="projects_prev_page", use_container_width=True):
+                    page_cursors.pop()
+                    st.rerun()
+            with col_page:
+                st.caption(f"Halaman {len(page_cursors)}")
+            with col_next:
+                if has_next_page and st.button("Berikutnya ➡️", key="projects_next_page", use_container_width=True):
+                    page_cursors.append(next_page_cursor)
+                    st.rerun()
         else:
             st.info("Tidak ada proyek yang ditemukan.")
             
@@ -1318,9 +3064,55 @@ def show_projects_page():
                         st.rerun()
                 else:
                     st.error("Nama Proyek dan Anggota Proyek harus diisi.")
+    
+    if can_bulk_import:
+        with project_tabs[2]:
+            show_bulk_import_tab()
+
+def show_bulk_import_tab():
+    st.subheader("Impor Massal Proyek dan Tugas")
+    st.write("Unggah file CSV atau Excel (.xlsx). Satu baris berisi satu tugas; baris dengan "
+             "`project_name` yang sama menjadi satu proyek baru. Kolom proyek diambil dari baris pertama.")
+    st.markdown("""
+    - **project_name** wajib diisi; **description, part_name, part_number, customer, model** opsional
+    - **members**: ID pengguna dipisah titik koma, misalnya `E001;E002` (Anda dan PIC otomatis menjadi anggota)
+    - **task_title, pic_id, due_date** (YYYY-MM-DD) diisi lengkap untuk membuat tugas, atau dikosongkan semua
+    """)
+    template = io.StringIO()
+    writer = csv.writer(template)
+    writer.writerow(IMPORT_COLUMNS)
+    writer.writerow(["Crankcase CB150", "Development part baru", "Crankcase", "11100-K45", "AHM", "CB150R",
+                     "E001;E002", "Design Review", "E001", datetime.now().strftime("%Y-%m-%d")])
+    st.download_button("📄 Unduh Template CSV", template.getvalue(), file_name="template_impor.csv", mime="text/csv")
+    
+    with st.form("bulk_import_form", clear_on_submit=True):
+        uploaded_file = st.file_uploader("File impor", type=["csv", "xlsx"])
+        skip_invalid = st.checkbox("Impor baris yang valid saja", help="Tanpa opsi ini, file dengan baris salah tidak diimpor sama sekali.")
+        submitted = st.form_submit_button("📥 Impor")
+    
+    if submitted and uploaded_file:
+        try:
+            with st.spinner("Mengimpor..."):
+                result = import_projects(read_import_rows(uploaded_file, uploaded_file.name),
+                                         st.session_state.current_user['id'], uploaded_file.name, skip_invalid)
+        except ValueError as e:
+            st.error(str(e))
+            return
+        if result is None:
+            return
+        if result['projects']:
+            st.success(f"✅ {result['projects']} proyek, {result['members']} anggota, dan {result['tasks']} tugas berhasil diimpor.")
+        elif not result['errors']:
+            st.info("File tidak berisi baris untuk diimpor.")
+        if result['errors']:
+            if result['projects']:
+                st.warning(f"⚠️ {len(result['errors'])} baris dilewati:")
+            else:
+                st.error(f"❌ Tidak ada yang diimpor, {len(result['errors'])} baris bermasalah:")
+            st.dataframe(pd.DataFrame(result['errors'], columns=['Baris', 'Kesalahan']), use_container_width=True, hide_index=True)
 
 def show_edit_project_page(project_id):
-    project_details = get_project_details(project_id, st.session_state.current_user['id'])
+    project_details = get_project(project_id)
     
     if project_details:
         st.title(f"Edit Proyek: {project_details['name']}")
@@ -1352,812 +3144,757 @@ def show_edit_project_page(project_id):
                 else:
                     st.error("Nama Proyek dan Anggota Proyek harus diisi.")
 
+        member_history = get_project_member_history(project_id)
+        if member_history:
+            with st.expander("🕘 Riwayat Anggota"):
+                all_users = {u['id']: u['fullname'] for u in get_all_users()}
+                df_history = pd.DataFrame([(changed_at, all_users.get(user_id, user_id), "Ditambahkan" if change == "added" else "Dikeluarkan",
+                                            all_users.get(changed_by, changed_by))
+                                           for changed_at, user_id, change, changed_by in member_history],
+                                          columns=['Waktu', 'Anggota', 'Perubahan', 'Oleh'])
+                st.dataframe(df_history, use_container_width=True, hide_index=True)
+
         if st.button("Batal"):
             st.session_state.page = "projects"
             st.session_state.edit_project_id = None
             st.rerun()
 
-def show_project_details(project_id):
-    project_details = get_project_details(project_id, st.session_state.current_user['id'])
+@st.fragment(run_every=CHAT_REFRESH_SECONDS)
+def show_project_chat(project_id):
+    """Panel chat proyek. Di-refresh sendiri secara berkala tanpa merender ulang tab lain."""
+    # Riwayat dirender setelah form diproses, agar pesan yang baru dikirim langsung ikut tampil
+    history_area = st.container()
     
-    if project_details:
-        st.title(f"📂 {project_details['name']}")
+    # Blok form yang sudah benar dengan clear_on_submit=True
+    with st.form("project_chat_form", clear_on_submit=True):
+        c1, c2 = st.columns([5,2])
+        with c1:
+            message = st.text_input("Ketik pesan dan tekan Enter...", key="project_chat_input")
+        with c2:
+            uploaded_file = st.file_uploader("", key="project_chat_file", label_visibility="collapsed")
         
-        # Tabs untuk navigasi - TAMBAH TAB APPROVAL
-        info_tab, tasks_tab, approval_tab, docs_tab, chat_tab = st.tabs(["📋 Info Proyek", "✅ Tasks", "✔️ Approval", "📄 Documents", "💬 Chat"])
+        # Tombol submit
+        send_chat = st.form_submit_button("Kirim", use_container_width=True)
         
-        project_members = get_project_members(project_id)
-        tasks = project_details['tasks']
+        # Logika pengiriman pesan hanya dijalankan setelah tombol form ditekan
+        if send_chat:
+            if message.strip() or uploaded_file:
+                # Simpan file yang diunggah jika ada
+                attachment = save_chat_attachment(uploaded_file) if uploaded_file else None
+                send_project_message(project_id, st.session_state.current_user['id'], message, attachment)
+    
+    mark_project_messages_as_read(project_id, st.session_state.current_user['id'])
+    with history_area:
+        render_chat_history(f"project_{project_id}",
+                            lambda before_id=None: get_project_chat_messages(project_id, before_id=before_id),
+                            lambda after_id: get_project_chat_messages_after(project_id, after_id))
+
+def rerun_fragment():
+    """Rerun hanya fragment yang sedang berjalan.
+    
+    Bila fragment sedang ikut full-app rerun (scope fragment tidak diizinkan), seluruh app di-rerun.
+    """
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+# Setiap tab detail proyek adalah fragment dengan loader datanya sendiri, sehingga aksi
+# di satu tab (atau satu kartu task) hanya merender ulang bagian itu.
+@st.fragment
+def show_project_info_tab(project_id):
+    project_details = get_project(project_id)
+    project_members = get_project_members(project_id)
+    tasks = get_project_tasks(project_id)
+    
+    st.markdown("""
+    <div style="text-align: center; margin-bottom: 30px;">
+        <h2 style="color: #2c3e50; font-weight: 600; margin: 0; font-size: 1.8em;">
+            🎯 Identitas Proyek
+        </h2>
+        <div style="width: 80px; height: 4px; background: linear-gradient(90deg, #f093fb, #4facfe); margin: 15px auto; border-radius: 2px;"></div>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    col1, col2 = st.columns(2, gap="large")
+    with col1:
+        id_val = project_details['id']
+        creator_name = get_user(project_details['creator_id'])['fullname']
+        part_name = project_details['part_name']
+        part_num = project_details['part_number']
         
-        # ==================== TAB 1: INFO PROYEK ====================
-        with info_tab:
-            st.markdown("""
-            <div style="text-align: center; margin-bottom: 30px;">
-                <h2 style="color: #2c3e50; font-weight: 600; margin: 0; font-size: 1.8em;">
-                    🎯 Identitas Proyek
-                </h2>
-                <div style="width: 80px; height: 4px; background: linear-gradient(90deg, #f093fb, #4facfe); margin: 15px auto; border-radius: 2px;"></div>
+        st.markdown(f"""
+        <div style="background: linear-gradient(135deg, #ff6b9d 0%, #c44569 100%); padding: 30px; border-radius: 18px; margin-bottom: 15px; box-shadow: 0 8px 25px rgba(255, 107, 157, 0.25); color: white; border: 1px solid rgba(255, 255, 255, 0.1);">
+            <div style="display: flex; align-items: center; margin-bottom: 25px; padding-bottom: 15px; border-bottom: 1px solid rgba(255, 255, 255, 0.2);">
+                <span style="font-size: 1.5em; margin-right: 12px;">🆔</span>
+                <div style="flex: 1;">
+                    <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">ID PROYEK</p>
+                    <p style="margin: 5px 0 0 0; font-size: 1.3em; font-weight: 700;">{id_val}</p>
+                </div>
+            </div>
+            <div style="display: flex; align-items: center; margin-bottom: 25px; padding-bottom: 15px; border-bottom: 1px solid rgba(255, 255, 255, 0.2);">
+                <span style="font-size: 1.5em; margin-right: 12px;">👤</span>
+                <div style="flex: 1;">
+                    <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">PEMBUAT</p>
+                    <p style="margin: 5px 0 0 0; font-size: 1.15em; font-weight: 600;">{creator_name}</p>
+                </div>
+            </div>
+            <div style="display: flex; align-items: center; margin-bottom: 25px; padding-bottom: 15px; border-bottom: 1px solid rgba(255, 255, 255, 0.2);">
+                <span style="font-size: 1.5em; margin-right: 12px;">🔧</span>
+                <div style="flex: 1;">
+                    <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">NAMA PART</p>
+                    <p style="margin: 5px 0 0 0; font-size: 1.15em; font-weight: 600;">{part_name}</p>
+                </div>
+            </div>
+            <div style="display: flex; align-items: center;">
+                <span style="font-size: 1.5em; margin-right: 12px;">📦</span>
+                <div style="flex: 1;">
+                    <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">NOMOR PART</p>
+                    <p style="margin: 5px 0 0 0; font-size: 1.15em; font-weight: 600;">{part_num}</p>
+                </div>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col2:
+        customer = project_details['customer']
+        model = project_details['model']
+        desc = project_details['description']
+        
+        st.markdown(f"""
+        <div style="background: linear-gradient(135deg, #4facfe 0%, #00c6fb 100%); padding: 30px; border-radius: 18px; margin-bottom: 15px; box-shadow: 0 8px 25px rgba(79, 172, 254, 0.25); color: white; border: 1px solid rgba(255, 255, 255, 0.1);">
+            <div style="display: flex; align-items: center; margin-bottom: 25px; padding-bottom: 15px; border-bottom: 1px solid rgba(255, 255, 255, 0.2);">
+                <span style="font-size: 1.5em; margin-right: 12px;">🏢</span>
+                <div style="flex: 1;">
+                    <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">PELANGGAN</p>
+                    <p style="margin: 5px 0 0 0; font-size: 1.15em; font-weight: 600;">{customer}</p>
+                </div>
+            </div>
+            <div style="display: flex; align-items: center; margin-bottom: 25px; padding-bottom: 15px; border-bottom: 1px solid rgba(255, 255, 255, 0.2);">
+                <span style="font-size: 1.5em; margin-right: 12px;">🚗</span>
+                <div style="flex: 1;">
+                    <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">MODEL</p>
+                    <p style="margin: 5px 0 0 0; font-size: 1.15em; font-weight: 600;">{model}</p>
+                </div>
+            </div>
+            <div style="display: flex; align-items: flex-start;">
+                <span style="font-size: 1.5em; margin-right: 12px;">📝</span>
+                <div style="flex: 1;">
+                    <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">DESKRIPSI</p>
+                    <p style="margin: 5px 0 0 0; font-size: 0.98em; line-height: 1.6; font-weight: 400;">{desc}</p>
+                </div>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    st.markdown("---")
+    
+    # Layout 2 kolom untuk Anggota Proyek dan Overview Progress
+    col_members, col_progress = st.columns([1, 1])
+    
+    # KOLOM 1: Anggota Proyek
+    with col_members:
+        st.subheader("👥 Anggota Proyek")
+        
+        # Warna untuk setiap role
+        role_colors = {
+            'Admin': 'linear-gradient(135deg, #ff6b6b 0%, #ee5a6f 100%)',
+            'Manager': 'linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)',
+            'Supervisor': 'linear-gradient(135deg, #ffa726 0%, #fb8c00 100%)',
+            'Staff': 'linear-gradient(135deg, #ab47bc 0%, #8e24aa 100%)'
+        }
+        
+        # Display members vertically in single column
+        for member in project_members:
+            gradient = role_colors.get(member['role'], role_colors['Staff'])
+            member_name = member['fullname']
+            member_role = member['role']
+            st.markdown(f"""
+            <div style="background: {gradient}; padding: 15px; border-radius: 10px; text-align: center; margin-bottom: 10px; box-shadow: 0 3px 10px rgba(0,0,0,0.2);">
+                <p style="margin: 0; font-weight: bold; color: white; font-size: 1em;">{member_name}</p>
+                <p style="margin: 5px 0 0 0; font-size: 0.85em; color: rgba(255,255,255,0.9); background: rgba(255,255,255,0.2); padding: 3px 8px; border-radius: 12px; display: inline-block;">{member_role}</p>
             </div>
             """, unsafe_allow_html=True)
+    
+    # KOLOM 2: Overview Progress
+    with col_progress:
+        st.subheader("📊 Overview Progress")
+        
+        total_tasks = len(tasks)
+        done_tasks = len([t for t in tasks if t['status'] == 'Done'])
+        on_progress = len([t for t in tasks if t['status'] == 'On Progress'])
+        pending = len([t for t in tasks if t['status'] == 'Pending Approval'])
+        yet_tasks = len([t for t in tasks if t['status'] == 'Yet'])
+        percentage = int(done_tasks/total_tasks*100) if total_tasks > 0 else 0
+        
+        # Horizontal Layout - 4 kolom dalam 1 baris
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.markdown(f"""
+            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 25px 15px; border-radius: 15px; text-align: center; box-shadow: 0 6px 15px rgba(102, 126, 234, 0.3); margin-bottom: 10px; height: 140px; display: flex; flex-direction: column; align-items: center; justify-content: center;">
+                <p style="color: rgba(255,255,255,0.95); margin: 0 0 8px 0; font-size: 0.9em; font-weight: 500; letter-spacing: 0.5px;">Total Tasks</p>
+                <h1 style="color: white; margin: 0; font-weight: 700; font-size: 3em; line-height: 1;">{total_tasks}</h1>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with col2:
+            st.markdown(f"""
+            <div style="background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); padding: 25px 15px; border-radius: 15px; text-align: center; box-shadow: 0 6px 15px rgba(56, 239, 125, 0.3); margin-bottom: 10px; height: 140px; display: flex; flex-direction: column; align-items: center; justify-content: center;">
+                <p style="color: rgba(255,255,255,0.95); margin: 0 0 8px 0; font-size: 0.9em; font-weight: 500; letter-spacing: 0.5px;">Done</p>
+                <h1 style="color: white; margin: 0; font-weight: 700; font-size: 3em; line-height: 1;">{done_tasks}</h1>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with col3:
+            st.markdown(f"""
+            <div style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); padding: 25px 15px; border-radius: 15px; text-align: center; box-shadow: 0 6px 15px rgba(245, 87, 108, 0.3); margin-bottom: 10px; height: 140px; display: flex; flex-direction: column; align-items: center; justify-content: center;">
+                <p style="color: rgba(255,255,255,0.95); margin: 0 0 8px 0; font-size: 0.9em; font-weight: 500; letter-spacing: 0.5px;">On Progress</p>
+                <h1 style="color: white; margin: 0; font-weight: 700; font-size: 3em; line-height: 1;">{on_progress}</h1>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with col4:
+            st.markdown(f"""
+            <div style="background: linear-gradient(135deg, #ffa726 0%, #fb8c00 100%); padding: 25px 15px; border-radius: 15px; text-align: center; box-shadow: 0 6px 15px rgba(255, 167, 38, 0.3); margin-bottom: 10px; height: 140px; display: flex; flex-direction: column; align-items: center; justify-content: center;">
+                <p style="color: rgba(255,255,255,0.95); margin: 0 0 8px 0; font-size: 0.9em; font-weight: 500; letter-spacing: 0.5px;">Yet to Start</p>
+                <h1 style="color: white; margin: 0; font-weight: 700; font-size: 3em; line-height: 1;">{yet_tasks}</h1>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        # Progress Bar
+        if total_tasks > 0:
+            progress_percentage = done_tasks / total_tasks
+            st.progress(progress_percentage)
+            st.caption(f"Progress: {int(progress_percentage * 100)}% Complete")
+    
+    st.markdown("---")
+    
+    # Gantt Chart Gabungan Plan dan Aktual
+    st.subheader("📅 Timeline Project")
+    st.caption("🔵 Biru = Rencana (Plan) | � Merah = Aktual (Realisasi)")
+    
+    if tasks:
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+        
+        # Prepare data untuk setiap task
+        fig = go.Figure()
+        
+        task_names = []
+        y_positions = []
+        has_data = False
+        legend_plan_added = False
+        legend_actual_added = False
+        
+        for idx, task in enumerate(reversed(tasks)):  # Reversed agar task pertama di atas
+            created = task.get('created_epoch')
+            due = task.get('due_epoch')
+            actual_start = task.get('actual_start_epoch')
+            completed = task.get('completed_epoch')
+            status = task.get('status', '-')
+            task_title = task.get('title', '-')
             
-            col1, col2 = st.columns(2, gap="large")
-            with col1:
-                id_val = project_details['id']
-                creator_name = get_user(project_details['creator_id'])['fullname']
-                part_name = project_details['part_name']
-                part_num = project_details['part_number']
-                
-                st.markdown(f"""
-                <div style="background: linear-gradient(135deg, #ff6b9d 0%, #c44569 100%); padding: 30px; border-radius: 18px; margin-bottom: 15px; box-shadow: 0 8px 25px rgba(255, 107, 157, 0.25); color: white; border: 1px solid rgba(255, 255, 255, 0.1);">
-                    <div style="display: flex; align-items: center; margin-bottom: 25px; padding-bottom: 15px; border-bottom: 1px solid rgba(255, 255, 255, 0.2);">
-                        <span style="font-size: 1.5em; margin-right: 12px;">🆔</span>
-                        <div style="flex: 1;">
-                            <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">ID PROYEK</p>
-                            <p style="margin: 5px 0 0 0; font-size: 1.3em; font-weight: 700;">{id_val}</p>
-                        </div>
-                    </div>
-                    <div style="display: flex; align-items: center; margin-bottom: 25px; padding-bottom: 15px; border-bottom: 1px solid rgba(255, 255, 255, 0.2);">
-                        <span style="font-size: 1.5em; margin-right: 12px;">👤</span>
-                        <div style="flex: 1;">
-                            <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">PEMBUAT</p>
-                            <p style="margin: 5px 0 0 0; font-size: 1.15em; font-weight: 600;">{creator_name}</p>
-                        </div>
-                    </div>
-                    <div style="display: flex; align-items: center; margin-bottom: 25px; padding-bottom: 15px; border-bottom: 1px solid rgba(255, 255, 255, 0.2);">
-                        <span style="font-size: 1.5em; margin-right: 12px;">🔧</span>
-                        <div style="flex: 1;">
-                            <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">NAMA PART</p>
-                            <p style="margin: 5px 0 0 0; font-size: 1.15em; font-weight: 600;">{part_name}</p>
-                        </div>
-                    </div>
-                    <div style="display: flex; align-items: center;">
-                        <span style="font-size: 1.5em; margin-right: 12px;">📦</span>
-                        <div style="flex: 1;">
-                            <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">NOMOR PART</p>
-                            <p style="margin: 5px 0 0 0; font-size: 1.15em; font-weight: 600;">{part_num}</p>
-                        </div>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+            try:
+                pic = get_user(task['pic_id'])['fullname'] if task.get('pic_id') else '-'
+            except:
+                pic = '-'
             
-            with col2:
-                customer = project_details['customer']
-                model = project_details['model']
-                desc = project_details['description']
-                
-                st.markdown(f"""
-                <div style="background: linear-gradient(135deg, #4facfe 0%, #00c6fb 100%); padding: 30px; border-radius: 18px; margin-bottom: 15px; box-shadow: 0 8px 25px rgba(79, 172, 254, 0.25); color: white; border: 1px solid rgba(255, 255, 255, 0.1);">
-                    <div style="display: flex; align-items: center; margin-bottom: 25px; padding-bottom: 15px; border-bottom: 1px solid rgba(255, 255, 255, 0.2);">
-                        <span style="font-size: 1.5em; margin-right: 12px;">🏢</span>
-                        <div style="flex: 1;">
-                            <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">PELANGGAN</p>
-                            <p style="margin: 5px 0 0 0; font-size: 1.15em; font-weight: 600;">{customer}</p>
-                        </div>
-                    </div>
-                    <div style="display: flex; align-items: center; margin-bottom: 25px; padding-bottom: 15px; border-bottom: 1px solid rgba(255, 255, 255, 0.2);">
-                        <span style="font-size: 1.5em; margin-right: 12px;">🚗</span>
-                        <div style="flex: 1;">
-                            <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">MODEL</p>
-                            <p style="margin: 5px 0 0 0; font-size: 1.15em; font-weight: 600;">{model}</p>
-                        </div>
-                    </div>
-                    <div style="display: flex; align-items: flex-start;">
-                        <span style="font-size: 1.5em; margin-right: 12px;">📝</span>
-                        <div style="flex: 1;">
-                            <p style="margin: 0; font-size: 0.85em; opacity: 0.85; font-weight: 500; letter-spacing: 0.5px;">DESKRIPSI</p>
-                            <p style="margin: 5px 0 0 0; font-size: 0.98em; line-height: 1.6; font-weight: 400;">{desc}</p>
-                        </div>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+            # Convert tanggal ke datetime untuk Plan
+            if created is not None and due is not None:
+                try:
+                    start_plan = pd.to_datetime(created, unit='s')
+                    end_plan = pd.to_datetime(due, unit='s')
+                    
+                    if pd.notna(start_plan) and pd.notna(end_plan):
+                        # Tambahkan bar untuk Plan (Biru) menggunakan filled rectangle
+                        fig.add_trace(go.Scatter(
+                            x=[start_plan, end_plan, end_plan, start_plan, start_plan],
+                            y=[idx, idx, idx+0.4, idx+0.4, idx],
+                            fill='toself',
+                            fillcolor='rgba(0, 123, 255, 0.7)',
+                            line=dict(color='rgba(0, 123, 255, 1)', width=1),
+                            mode='lines',
+                            name='Plan',
+                            legendgroup='plan',
+                            showlegend=not legend_plan_added,
+                            hovertemplate=f'<b>{task_title}</b><br>Type: Plan<br>PIC: {pic}<br>Start: {start_plan.strftime("%Y-%m-%d")}<br>End: {end_plan.strftime("%Y-%m-%d")}<br>Status: {status}<extra></extra>'
+                        ))
+                        legend_plan_added = True
+                        has_data = True
+                except Exception as e:
+                    pass
             
-            st.markdown("---")
+            # Convert tanggal ke datetime untuk Actual
+            if actual_start is not None:
+                try:
+                    start_actual = pd.to_datetime(actual_start, unit='s')
+                    
+                    if completed is not None:
+                        end_actual = pd.to_datetime(completed, unit='s')
+                    else:
+                        end_actual = pd.Timestamp(datetime.now()).floor('s')
+                    
+                    if pd.notna(start_actual) and pd.notna(end_actual):
+                        # Tambahkan bar untuk Actual (Merah) menggunakan filled rectangle
+                        fig.add_trace(go.Scatter(
+                            x=[start_actual, end_actual, end_actual, start_actual, start_actual],
+                            y=[idx+0.5, idx+0.5, idx+0.9, idx+0.9, idx+0.5],
+                            fill='toself',
+                            fillcolor='rgba(220, 53, 69, 0.7)',
+                            line=dict(color='rgba(220, 53, 69, 1)', width=1),
+                            mode='lines',
+                            name='Actual',
+                            legendgroup='actual',
+                            showlegend=not legend_actual_added,
+                            hovertemplate=f'<b>{task_title}</b><br>Type: Actual<br>PIC: {pic}<br>Start: {start_actual.strftime("%Y-%m-%d %H:%M:%S")}<br>End: {end_actual.strftime("%Y-%m-%d %H:%M:%S")}<br>Status: {status}<extra></extra>'
+                        ))
+                        legend_actual_added = True
+                        has_data = True
+                except Exception as e:
+                    pass
+        
+        if has_data:
+            # Buat y-axis labels
+            y_labels = [task.get('title', '-') for task in reversed(tasks)]
+            y_vals = list(range(len(y_labels)))
             
-            # Layout 2 kolom untuk Anggota Proyek dan Overview Progress
-            col_members, col_progress = st.columns([1, 1])
+            # Update layout
+            fig.update_layout(
+                height=max(400, len(tasks) * 60),
+                xaxis=dict(
+                    title='Timeline',
+                    showgrid=True,
+                    gridwidth=1,
+                    gridcolor='LightGray'
+                ),
+                yaxis=dict(
+                    title='',
+                    tickmode='array',
+                    tickvals=[i+0.45 for i in y_vals],
+                    ticktext=y_labels,
+                    tickfont=dict(size=10),
+                    range=[-0.5, len(tasks)]
+                ),
+                legend=dict(
+                    orientation="h",
+                    yanchor="bottom",
+                    y=1.02,
+                    xanchor="right",
+                    x=1,
+                    bgcolor='rgba(255, 255, 255, 0.8)'
+                ),
+                margin=dict(l=150, r=50, t=60, b=50),
+                hovermode='closest',
+                plot_bgcolor='white',
+                paper_bgcolor='white'
+            )
             
-            # KOLOM 1: Anggota Proyek
-            with col_members:
-                st.subheader("👥 Anggota Proyek")
-                
-                # Warna untuk setiap role
-                role_colors = {
-                    'Admin': 'linear-gradient(135deg, #ff6b6b 0%, #ee5a6f 100%)',
-                    'Manager': 'linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)',
-                    'Supervisor': 'linear-gradient(135deg, #ffa726 0%, #fb8c00 100%)',
-                    'Staff': 'linear-gradient(135deg, #ab47bc 0%, #8e24aa 100%)'
-                }
-                
-                # Display members vertically in single column
-                for member in project_members:
-                    gradient = role_colors.get(member['role'], role_colors['Staff'])
-                    member_name = member['fullname']
-                    member_role = member['role']
-                    st.markdown(f"""
-                    <div style="background: {gradient}; padding: 15px; border-radius: 10px; text-align: center; margin-bottom: 10px; box-shadow: 0 3px 10px rgba(0,0,0,0.2);">
-                        <p style="margin: 0; font-weight: bold; color: white; font-size: 1em;">{member_name}</p>
-                        <p style="margin: 5px 0 0 0; font-size: 0.85em; color: rgba(255,255,255,0.9); background: rgba(255,255,255,0.2); padding: 3px 8px; border-radius: 12px; display: inline-block;">{member_role}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("Tidak ada data timeline yang valid")
+        
+        # Keterangan
+        st.markdown("---")
+        col_info1, col_info2, col_info3 = st.columns(3)
+        with col_info1:
+            st.info("🔵 **Plan**: Jadwal rencana (dibuat → target selesai)")
+        with col_info2:
+            st.error("� **Actual**: Waktu pengerjaan nyata (mulai aktual → selesai)")
+        with col_info3:
+            total_tasks_display = len(tasks)
+            tasks_with_actual = len([t for t in tasks if t.get('actual_start')])
+            st.metric("Progress", f"{tasks_with_actual}/{total_tasks_display}", 
+                     f"{int(tasks_with_actual/total_tasks_display*100) if total_tasks_display > 0 else 0}%")
+    
+    else:
+        st.info("Belum ada tugas untuk proyek ini.")
+
+@st.fragment
+def show_project_tasks_tab(project_id):
+    project_members = get_project_members(project_id)
+    tasks = get_project_tasks(project_id)
+    
+    st.subheader("📋 Daftar Tugas")
+    
+    # Grafik Timeline di kolom atas
+    col_chart1, col_chart2 = st.columns(2)
+    
+    with col_chart1:
+        st.markdown("**📊 Timeline Plan**")
+        if tasks:
+            plan_data = []
+            for task in tasks:
+                start = task.get('created_epoch')
+                end = task.get('due_epoch')
+                if start is not None and end is not None:
+                    plan_data.append({
+                        'Task': task.get('title', '-')[:30],
+                        'Start': start,
+                        'End': end,
+                        'Type': 'Plan'
+                    })
             
-            # KOLOM 2: Overview Progress
-            with col_progress:
-                st.subheader("📊 Overview Progress")
-                
-                total_tasks = len(tasks)
-                done_tasks = len([t for t in tasks if t['status'] == 'Done'])
-                on_progress = len([t for t in tasks if t['status'] == 'On Progress'])
-                pending = len([t for t in tasks if t['status'] == 'Pending Approval'])
-                yet_tasks = len([t for t in tasks if t['status'] == 'Yet'])
-                percentage = int(done_tasks/total_tasks*100) if total_tasks > 0 else 0
+            if plan_data:
+                df_plan = pd.DataFrame(plan_data)
+                df_plan['Start'] = pd.to_datetime(df_plan['Start'], unit='s')
+                df_plan['End'] = pd.to_datetime(df_plan['End'], unit='s')
                 
-                # Horizontal Layout - 4 kolom dalam 1 baris
-                col1, col2, col3, col4 = st.columns(4)
+                if not df_plan.empty:
+                    fig_plan = px.timeline(df_plan, x_start='Start', x_end='End', y='Task', 
+                                          title='Jadwal Rencana', height=300)
+                    fig_plan.update_yaxes(autorange="reversed")
+                    fig_plan.update_layout(showlegend=False, xaxis_title="", yaxis_title="")
+                    st.plotly_chart(fig_plan, use_container_width=True)
+                else:
+                    st.info("Tidak ada data plan yang valid")
+            else:
+                st.info("Tidak ada data plan")
+        else:
+            st.info("Belum ada tugas")
+    
+    with col_chart2:
+        st.markdown("**📈 Timeline Aktual**")
+        if tasks:
+            actual_data = []
+            for task in tasks:
+                start = task.get('actual_start_epoch') if task.get('actual_start_epoch') is not None else task.get('created_epoch')
+                end = task.get('completed_epoch')
+                if start is not None and task['status'] in ['On Progress', 'Done']:
+                    actual_data.append({
+                        'Task': task.get('title', '-')[:30],
+                        'Start': start,
+                        'End': end,
+                        'Status': task['status']
+                    })
+            
+            if actual_data:
+                df_actual = pd.DataFrame(actual_data)
+                df_actual['Start'] = pd.to_datetime(df_actual['Start'], unit='s')
+                # Task yang belum selesai digambar sampai sekarang
+                df_actual['End'] = pd.to_datetime(df_actual['End'], unit='s').fillna(pd.Timestamp(datetime.now()).floor('s'))
                 
-                with col1:
-                    st.markdown(f"""
-                    <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 25px 15px; border-radius: 15px; text-align: center; box-shadow: 0 6px 15px rgba(102, 126, 234, 0.3); margin-bottom: 10px; height: 140px; display: flex; flex-direction: column; align-items: center; justify-content: center;">
-                        <p style="color: rgba(255,255,255,0.95); margin: 0 0 8px 0; font-size: 0.9em; font-weight: 500; letter-spacing: 0.5px;">Total Tasks</p>
-                        <h1 style="color: white; margin: 0; font-weight: 700; font-size: 3em; line-height: 1;">{total_tasks}</h1>
-                    </div>
-                    """, unsafe_allow_html=True)
+                if not df_actual.empty:
+                    fig_actual = px.timeline(df_actual, x_start='Start', x_end='End', y='Task',
+                                            color='Status', title='Progress Aktual', height=300,
+                                            color_discrete_map={'On Progress': '#ffc107', 'Done': '#28a745'})
+                    fig_actual.update_yaxes(autorange="reversed")
+                    fig_actual.update_layout(xaxis_title="", yaxis_title="")
+                    st.plotly_chart(fig_actual, use_container_width=True)
+                else:
+                    st.info("Tidak ada data aktual yang valid")
+            else:
+                st.info("Belum ada progress aktual")
+        else:
+            st.info("Belum ada tugas")
+    
+    st.markdown("---")
+    
+    # Form Buat Tugas Baru
+    user_role = st.session_state.current_user['role']
+    if user_role in ['Admin', 'Manager', 'Supervisor']:
+        with st.expander("➕ Buat Tugas Baru"):
+            with st.form("new_task_form"):
+                task_title = st.text_input("Judul Tugas")
                 
-                with col2:
-                    st.markdown(f"""
-                    <div style="background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); padding: 25px 15px; border-radius: 15px; text-align: center; box-shadow: 0 6px 15px rgba(56, 239, 125, 0.3); margin-bottom: 10px; height: 140px; display: flex; flex-direction: column; align-items: center; justify-content: center;">
-                        <p style="color: rgba(255,255,255,0.95); margin: 0 0 8px 0; font-size: 0.9em; font-weight: 500; letter-spacing: 0.5px;">Done</p>
-                        <h1 style="color: white; margin: 0; font-weight: 700; font-size: 3em; line-height: 1;">{done_tasks}</h1>
-                    </div>
-                    """, unsafe_allow_html=True)
+                member_options = {m['fullname']: m['id'] for m in project_members}
+                pic_name = st.selectbox("Tugaskan ke:", list(member_options.keys()))
+                pic_id = member_options.get(pic_name)
                 
-                with col3:
-                    st.markdown(f"""
-                    <div style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); padding: 25px 15px; border-radius: 15px; text-align: center; box-shadow: 0 6px 15px rgba(245, 87, 108, 0.3); margin-bottom: 10px; height: 140px; display: flex; flex-direction: column; align-items: center; justify-content: center;">
-                        <p style="color: rgba(255,255,255,0.95); margin: 0 0 8px 0; font-size: 0.9em; font-weight: 500; letter-spacing: 0.5px;">On Progress</p>
-                        <h1 style="color: white; margin: 0; font-weight: 700; font-size: 3em; line-height: 1;">{on_progress}</h1>
-                    </div>
-                    """, unsafe_allow_html=True)
+                due_date = st.date_input("Batas Waktu")
+                notes = st.text_area("Keterangan (Opsional)")
                 
-                with col4:
-                    st.markdown(f"""
-                    <div style="background: linear-gradient(135deg, #ffa726 0%, #fb8c00 100%); padding: 25px 15px; border-radius: 15px; text-align: center; box-shadow: 0 6px 15px rgba(255, 167, 38, 0.3); margin-bottom: 10px; height: 140px; display: flex; flex-direction: column; align-items: center; justify-content: center;">
-                        <p style="color: rgba(255,255,255,0.95); margin: 0 0 8px 0; font-size: 0.9em; font-weight: 500; letter-spacing: 0.5px;">Yet to Start</p>
-                        <h1 style="color: white; margin: 0; font-weight: 700; font-size: 3em; line-height: 1;">{yet_tasks}</h1>
-                    </div>
-                    """, unsafe_allow_html=True)
+                delegator_id = st.session_state.current_user['id']
+                submitted = st.form_submit_button("Tugaskan")
                 
-                # Progress Bar
-                if total_tasks > 0:
-                    progress_percentage = done_tasks / total_tasks
-                    st.progress(progress_percentage)
-                    st.caption(f"Progress: {int(progress_percentage * 100)}% Complete")
-            
+                if submitted:
+                    if task_title and pic_id and due_date:
+                        if create_task(project_id, task_title, pic_id, delegator_id, str(due_date), notes):
+                            rerun_fragment()
+                    else:
+                        st.error("Judul Tugas, Penerima Tugas, dan Batas Waktu harus diisi.")
+    
+    # Daftar Tugas dalam Cards (setiap kartu fragment tersendiri)
+    if tasks:
+        for task in tasks:
+            show_task_card(project_id, task['id'])
+    else:
+        st.info("Tidak ada tugas untuk proyek ini.")
+
+@st.fragment
+def show_task_card(project_id, task_id):
+    task = get_project_task(project_id, task_id)
+    if not task:
+        return
+    task_pic = get_user(task['pic_id'])
+    task_delegator = get_user(task['delegator_id'])
+    
+    # Status color
+    status_colors = {
+        'Yet': '#6c757d',
+        'On Progress': '#ffc107',
+        'Pending Approval': '#17a2b8',
+        'Done': '#28a745'
+    }
+    status_color = status_colors.get(task['status'], '#6c757d')
+    
+    with st.expander(f"**{task['title']}** - 🏷️ {task['status']}", expanded=False):
+        col_task1, col_task2 = st.columns([2, 1])
+        
+        with col_task1:
+            st.markdown(f"**👤 PIC:** {task_pic['fullname']} ({task_pic['role']})")
+            st.markdown(f"**📤 Delegator:** {task_delegator['fullname']}")
+            st.markdown(f"**📅 Deadline:** {task['due_date']}")
+        
+        with col_task2:
+            st.markdown(f"""
+            <div style="background-color: {status_color}; color: white; padding: 10px; 
+                        border-radius: 5px; text-align: center;">
+                <h4 style="margin: 0;">{task['status']}</h4>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        # Aksi untuk PIC
+        if st.session_state.current_user['id'] == task['pic_id'] and task['status'] != 'Done':
             st.markdown("---")
             
-            # Gantt Chart Gabungan Plan dan Aktual
-            st.subheader("📅 Timeline Project")
-            st.caption("🔵 Biru = Rencana (Plan) | � Merah = Aktual (Realisasi)")
+            # Tombol Start Actual (hanya muncul jika belum dimulai)
+            if not task.get('actual_start') and task['status'] == 'Yet':
+                if st.button("🚀 Mulai Pengerjaan", key=f"start_actual_{task['id']}", type="primary"):
+                    if start_actual_work(task['id']):
+                        rerun_fragment()
+            
+            # Tampilkan info jika sudah dimulai
+            if task.get('actual_start'):
+                st.info(f"⏱️ Dimulai: {task['actual_start']}")
             
-            if tasks:
-                import plotly.graph_objects as go
-                from plotly.subplots import make_subplots
+            st.markdown("**📤 Upload Dokumen**")
+            with st.form(f"upload_form_{task['id']}"):
+                uploaded_file = st.file_uploader("Pilih file", key=f"uploader_{task['id']}")
+                notes_upload = st.text_area("Keterangan (Opsional)", key=f"notes_{task['id']}")
+                submit_upload = st.form_submit_button("Kirim & Minta Approval")
                 
-                # Prepare data untuk setiap task
-                fig = go.Figure()
+                if submit_upload:
+                    if uploaded_file:
+                        if upload_document(task['id'], uploaded_file, notes_upload):
+                            rerun_fragment()
+                    else:
+                        st.error("Silakan pilih file untuk diunggah.")
+        
+        # Aksi untuk Delegator
+        if st.session_state.current_user['id'] == task['delegator_id'] and task['status'] == 'Pending Approval':
+            st.markdown("---")
+            if st.button("✅ Setujui Penyelesaian Tugas", key=f"approve_task_{task['id']}"):
+                if approve_task_completion(task['id']):
+                    rerun_fragment()
+        
+        # Aksi untuk Edit
+        if st.session_state.current_user['id'] == task['delegator_id'] and task['status'] != 'Done':
+            if st.button("✏️ Edit Tugas", key=f"edit_task_{task['id']}"):
+                st.session_state.edit_task_id = task['id']
+                st.session_state.page = "edit_task"
+                st.rerun()
+
+@st.fragment
+def show_project_approval_tab(project_id):
+    tasks = get_project_tasks(project_id)
+    
+    st.subheader("✔️ Persetujuan Tugas")
+    st.caption("Kelola approval untuk tugas yang sudah selesai dikerjakan")
+    
+    # Filter tugas yang pending approval
+    pending_tasks = [t for t in tasks if t['status'] == 'Pending Approval']
+    
+    if pending_tasks:
+        st.info(f"📋 Ada **{len(pending_tasks)}** tugas menunggu persetujuan")
+        
+        for task in pending_tasks:
+            show_approval_card(project_id, task['id'])
+    else:
+        st.success("✅ Tidak ada tugas yang menunggu persetujuan")
+
+@st.fragment
+def show_approval_card(project_id, task_id):
+    task = get_project_task(project_id, task_id)
+    if not task:
+        return
+    if task['status'] != 'Pending Approval':
+        st.success(f"✅ Tugas '{task['title']}' sudah disetujui.")
+        return
+    
+    user_id = st.session_state.current_user['id']
+    is_creator = get_project(project_id)['creator_id'] == user_id
+    user_role = st.session_state.current_user['role']
+    
+    task_pic = get_user(task['pic_id'])
+    task_delegator = get_user(task['delegator_id'])
+    
+    # Cek apakah user berhak approve (delegator atau creator project atau admin/manager)
+    can_approve = (
+        user_id == task['delegator_id'] or 
+        is_creator or 
+        user_role in ['Admin', 'Manager']
+    )
+    
+    with st.expander(f"📝 **{task['title']}** - Pending Approval", expanded=True):
+        col_info1, col_info2 = st.columns([2, 1])
+        
+        with col_info1:
+            st.markdown(f"**👤 PIC:** {task_pic['fullname']}")
+            st.markdown(f"**📤 Delegator:** {task_delegator['fullname']}")
+            st.markdown(f"**📅 Deadline:** {task['due_date']}")
+            if task.get('actual_start'):
+                st.markdown(f"**⏱️ Dimulai:** {task['actual_start']}")
+        
+        with col_info2:
+            st.markdown("""
+            <div style="background-color: #17a2b8; color: white; padding: 15px; 
+                        border-radius: 5px; text-align: center;">
+                <h4 style="margin: 0;">⏳ Pending</h4>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        st.markdown("---")
+        st.markdown("**📄 Dokumen yang Diupload:**")
+        
+        # Tampilkan dokumen
+        if task['documents']:
+            for doc in task['documents']:
+                col_doc1, col_doc2 = st.columns([3, 1])
+                with col_doc1:
+                    st.markdown(f"📎 {doc['filename']}")
+                    if doc['notes']:
+                        st.caption(f"Catatan: {doc['notes']}")
+                with col_doc2:
+                    if os.path.exists(doc['filepath']):
+                        with open(doc['filepath'], "rb") as file:
+                            st.download_button(
+                                label="📥 Download",
+                                data=file,
+                                file_name=doc['filename'],
+                                key=f"download_approval_{doc['id']}"
+                            )
+        else:
+            st.info("Belum ada dokumen diupload")
+        
+        # Tombol Approve (hanya untuk yang berhak)
+        if can_approve:
+            st.markdown("---")
+            col_approve, col_reject = st.columns(2)
+            with col_approve:
+                if st.button("✅ Setujui & Tandai Selesai", key=f"approve_final_{task['id']}", type="primary", use_container_width=True):
+                    if approve_task_completion(task['id']):
+                        rerun_fragment()
+            with col_reject:
+                st.caption("Fitur reject akan segera hadir")
+        else:
+            st.warning("⚠️ Anda tidak memiliki akses untuk approve tugas ini")
+
+@st.fragment
+def show_project_documents_tab(project_id):
+    tasks = get_project_tasks(project_id)
+    
+    st.subheader("📄 Dokumen Proyek")
+    
+    # Upload Manual
+    with st.expander("📤 Upload Dokumen Manual"):
+        st.info("Upload dokumen yang tidak terkait dengan tugas spesifik")
+        st.caption("Fitur ini untuk dokumen umum proyek. Untuk dokumen tugas, silakan upload di tab Tasks.")
+    
+    st.markdown("---")
+    
+    # Tampilkan semua dokumen dari tasks
+    st.subheader("📚 Dokumen dari Tasks")
+    
+    all_documents = []
+    for task in tasks:
+        for doc in task['documents']:
+            all_documents.append({
+                'task_title': task['title'],
+                'task_id': task['id'],
+                'doc': doc,
+                'pic': get_user(task['pic_id'])['fullname']
+            })
+    
+    if all_documents:
+        # Tampilkan dalam grid cards
+        doc_cols = st.columns(3)
+        for idx, doc_info in enumerate(all_documents):
+            with doc_cols[idx % 3]:
+                doc = doc_info['doc']
                 
-                task_names = []
-                y_positions = []
-                has_data = False
-                legend_plan_added = False
-                legend_actual_added = False
+                # Tentukan icon berdasarkan ekstensi
+                ext = os.path.splitext(doc['filename'])[-1].lower()
+                icon_map = {
+                    '.pdf': '📕', '.doc': '📘', '.docx': '📘',
+                    '.xls': '📗', '.xlsx': '📗', '.txt': '📄',
+                    '.zip': '📦', '.html': '🌐'
+                }
+                file_icon = icon_map.get(ext, '📎')
                 
-                for idx, task in enumerate(reversed(tasks)):  # Reversed agar task pertama di atas
-                    created = task.get('created_at')
-                    due = task.get('due_date')
-                    actual_start = task.get('actual_start')
-                    completed = task.get('completed_at')
-                    status = task.get('status', '-')
-                    task_title = task.get('title', '-')
-                    
-                    try:
-                        pic = get_user(task['pic_id'])['fullname'] if task.get('pic_id') else '-'
-                    except:
-                        pic = '-'
-                    
-                    # Convert tanggal ke datetime untuk Plan
-                    if created and due:
-                        try:
-                            start_plan = pd.to_datetime(created, format='mixed', errors='coerce')
-                            end_plan = pd.to_datetime(due, format='mixed', errors='coerce')
-                            
-                            if pd.notna(start_plan) and pd.notna(end_plan):
-                                # Tambahkan bar untuk Plan (Biru) menggunakan filled rectangle
-                                fig.add_trace(go.Scatter(
-                                    x=[start_plan, end_plan, end_plan, start_plan, start_plan],
-                                    y=[idx, idx, idx+0.4, idx+0.4, idx],
-                                    fill='toself',
-                                    fillcolor='rgba(0, 123, 255, 0.7)',
-                                    line=dict(color='rgba(0, 123, 255, 1)', width=1),
-                                    mode='lines',
-                                    name='Plan',
-                                    legendgroup='plan',
-                                    showlegend=not legend_plan_added,
-                                    hovertemplate=f'<b>{task_title}</b><br>Type: Plan<br>PIC: {pic}<br>Start: {start_plan.strftime("%Y-%m-%d")}<br>End: {end_plan.strftime("%Y-%m-%d")}<br>Status: {status}<extra></extra>'
-                                ))
-                                legend_plan_added = True
-                                has_data = True
-                        except Exception as e:
-                            pass
-                    
-                    # Convert tanggal ke datetime untuk Actual
-                    if actual_start:
-                        try:
-                            start_actual = pd.to_datetime(actual_start, format='mixed', errors='coerce')
-                            
-                            if completed:
-                                end_actual = pd.to_datetime(completed, format='mixed', errors='coerce')
-                            else:
-                                end_actual = pd.to_datetime(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), format='mixed', errors='coerce')
-                            
-                            if pd.notna(start_actual) and pd.notna(end_actual):
-                                # Tambahkan bar untuk Actual (Merah) menggunakan filled rectangle
-                                fig.add_trace(go.Scatter(
-                                    x=[start_actual, end_actual, end_actual, start_actual, start_actual],
-                                    y=[idx+0.5, idx+0.5, idx+0.9, idx+0.9, idx+0.5],
-                                    fill='toself',
-                                    fillcolor='rgba(220, 53, 69, 0.7)',
-                                    line=dict(color='rgba(220, 53, 69, 1)', width=1),
-                                    mode='lines',
-                                    name='Actual',
-                                    legendgroup='actual',
-                                    showlegend=not legend_actual_added,
-                                    hovertemplate=f'<b>{task_title}</b><br>Type: Actual<br>PIC: {pic}<br>Start: {start_actual.strftime("%Y-%m-%d %H:%M:%S")}<br>End: {end_actual.strftime("%Y-%m-%d %H:%M:%S")}<br>Status: {status}<extra></extra>'
-                                ))
-                                legend_actual_added = True
-                                has_data = True
-                        except Exception as e:
-                            pass
+                st.markdown(f"""
+                <div style="background-color: #f8f9fa; padding: 15px; border-radius: 8px; 
+                            margin-bottom: 10px; border: 1px solid #dee2e6;">
+                    <h4 style="margin: 0 0 10px 0;">{file_icon} {doc['filename'][:25]}...</h4>
+                    <p style="margin: 5px 0; font-size: 0.85em;"><strong>Task:</strong> {doc_info['task_title'][:30]}</p>
+                    <p style="margin: 5px 0; font-size: 0.85em;"><strong>Upload by:</strong> {doc_info['pic']}</p>
+                    {f'<p style="margin: 5px 0; font-size: 0.85em;"><em>{doc["notes"]}</em></p>' if doc['notes'] else ''}
+                </div>
+                """, unsafe_allow_html=True)
                 
-                if has_data:
-                    # Buat y-axis labels
-                    y_labels = [task.get('title', '-') for task in reversed(tasks)]
-                    y_vals = list(range(len(y_labels)))
-                    
-                    # Update layout
-                    fig.update_layout(
-                        height=max(400, len(tasks) * 60),
-                        xaxis=dict(
-                            title='Timeline',
-                            showgrid=True,
-                            gridwidth=1,
-                            gridcolor='LightGray'
-                        ),
-                        yaxis=dict(
-                            title='',
-                            tickmode='array',
-                            tickvals=[i+0.45 for i in y_vals],
-                            ticktext=y_labels,
-                            tickfont=dict(size=10),
-                            range=[-0.5, len(tasks)]
-                        ),
-                        legend=dict(
-                            orientation="h",
-                            yanchor="bottom",
-                            y=1.02,
-                            xanchor="right",
-                            x=1,
-                            bgcolor='rgba(255, 255, 255, 0.8)'
-                        ),
-                        margin=dict(l=150, r=50, t=60, b=50),
-                        hovermode='closest',
-                        plot_bgcolor='white',
-                        paper_bgcolor='white'
-                    )
-                    
-                    st.plotly_chart(fig, use_container_width=True)
+                if os.path.exists(doc['filepath']):
+                    try:
+                        with open(doc['filepath'], "rb") as f:
+                            st.download_button(
+                                label=f"⬇️ Download",
+                                data=f.read(),
+                                file_name=doc['filename'],
+                                mime="application/octet-stream",
+                                key=f"doc_download_{doc['id']}",
+                                use_container_width=True
+                            )
+                    except Exception as e:
+                        st.error(f"Error: {str(e)}")
                 else:
-                    st.info("Tidak ada data timeline yang valid")
-                
-                # Keterangan
-                st.markdown("---")
-                col_info1, col_info2, col_info3 = st.columns(3)
-                with col_info1:
-                    st.info("🔵 **Plan**: Jadwal rencana (dibuat → target selesai)")
-                with col_info2:
-                    st.error("� **Actual**: Waktu pengerjaan nyata (mulai aktual → selesai)")
-                with col_info3:
-                    total_tasks_display = len(tasks)
-                    tasks_with_actual = len([t for t in tasks if t.get('actual_start')])
-                    st.metric("Progress", f"{tasks_with_actual}/{total_tasks_display}", 
-                             f"{int(tasks_with_actual/total_tasks_display*100) if total_tasks_display > 0 else 0}%")
+                    st.error("File tidak ditemukan")
+    else:
+        st.info("Belum ada dokumen yang diupload dalam proyek ini.")
 
-            else:
-                st.info("Belum ada tugas untuk proyek ini.")
+def show_project_details(project_id):
+    project_details = get_project(project_id)
+    
+    if project_details:
+        st.title(f"📂 {project_details['name']}")
+        if f"project_{project_id}" in st.session_state.get('chat_focus', {}):
+            st.info("🔎 Pesan dari hasil pencarian ditandai di tab 💬 Chat.")
         
+        # Tabs untuk navigasi - TAMBAH TAB APPROVAL
+        # Tab aktif dilacak (on_change="rerun") agar chat yang tersembunyi tidak ikut polling
+        # (butuh Streamlit >= 1.55). Kunci per proyek, supaya tab terbuka tidak terbawa ke proyek lain.
+        tabs_key = f"project_detail_tab_{project_id}"
+        if f"project_{project_id}" in st.session_state.get('chat_focus', {}):
+            st.session_state[tabs_key] = "💬 Chat"
+        info_tab, tasks_tab, approval_tab, docs_tab, chat_tab = st.tabs(["📋 Info Proyek", "✅ Tasks", "✔️ Approval", "📄 Documents", "💬 Chat"],
+                                                                         key=tabs_key, on_change="rerun")
+        
+        with info_tab:
+            show_project_info_tab(project_id)
         
-        # ==================== TAB 2: TASKS ====================
         with tasks_tab:
-            st.subheader("📋 Daftar Tugas")
-            
-            # Grafik Timeline di kolom atas
-            col_chart1, col_chart2 = st.columns(2)
-            
-            with col_chart1:
-                st.markdown("**📊 Timeline Plan**")
-                if tasks:
-                    plan_data = []
-                    for task in tasks:
-                        start = task.get('created_at')
-                        end = task.get('due_date')
-                        if start and end:
-                            plan_data.append({
-                                'Task': task.get('title', '-')[:30],
-                                'Start': start,
-                                'End': end,
-                                'Type': 'Plan'
-                            })
-                    
-                    if plan_data:
-                        df_plan = pd.DataFrame(plan_data)
-                        # Gunakan format='mixed' untuk menangani berbagai format tanggal
-                        df_plan['Start'] = pd.to_datetime(df_plan['Start'], format='mixed', errors='coerce')
-                        df_plan['End'] = pd.to_datetime(df_plan['End'], format='mixed', errors='coerce')
-                        df_plan = df_plan.dropna(subset=['Start', 'End'])
-                        
-                        if not df_plan.empty:
-                            fig_plan = px.timeline(df_plan, x_start='Start', x_end='End', y='Task', 
-                                                  title='Jadwal Rencana', height=300)
-                            fig_plan.update_yaxes(autorange="reversed")
-                            fig_plan.update_layout(showlegend=False, xaxis_title="", yaxis_title="")
-                            st.plotly_chart(fig_plan, use_container_width=True)
-                        else:
-                            st.info("Tidak ada data plan yang valid")
-                    else:
-                        st.info("Tidak ada data plan")
-                else:
-                    st.info("Belum ada tugas")
-            
-            with col_chart2:
-                st.markdown("**📈 Timeline Aktual**")
-                if tasks:
-                    actual_data = []
-                    for task in tasks:
-                        start = task.get('actual_start') if task.get('actual_start') else task.get('created_at')
-                        end = task.get('completed_at') if task.get('completed_at') else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        if start and end and task['status'] in ['On Progress', 'Done']:
-                            actual_data.append({
-                                'Task': task.get('title', '-')[:30],
-                                'Start': start,
-                                'End': end,
-                                'Status': task['status']
-                            })
-                    
-                    if actual_data:
-                        df_actual = pd.DataFrame(actual_data)
-                        # Gunakan format='mixed' untuk menangani berbagai format tanggal
-                        df_actual['Start'] = pd.to_datetime(df_actual['Start'], format='mixed', errors='coerce')
-                        df_actual['End'] = pd.to_datetime(df_actual['End'], format='mixed', errors='coerce')
-                        df_actual = df_actual.dropna(subset=['Start', 'End'])
-                        
-                        if not df_actual.empty:
-                            fig_actual = px.timeline(df_actual, x_start='Start', x_end='End', y='Task',
-                                                    color='Status', title='Progress Aktual', height=300,
-                                                    color_discrete_map={'On Progress': '#ffc107', 'Done': '#28a745'})
-                            fig_actual.update_yaxes(autorange="reversed")
-                            fig_actual.update_layout(xaxis_title="", yaxis_title="")
-                            st.plotly_chart(fig_actual, use_container_width=True)
-                        else:
-                            st.info("Tidak ada data aktual yang valid")
-                    else:
-                        st.info("Belum ada progress aktual")
-                else:
-                    st.info("Belum ada tugas")
-            
-            st.markdown("---")
-            
-            # Form Buat Tugas Baru
-            user_role = st.session_state.current_user['role']
-            if user_role in ['Admin', 'Manager', 'Supervisor']:
-                with st.expander("➕ Buat Tugas Baru"):
-                    with st.form("new_task_form"):
-                        task_title = st.text_input("Judul Tugas")
-                        
-                        member_options = {m['fullname']: m['id'] for m in project_members}
-                        pic_name = st.selectbox("Tugaskan ke:", list(member_options.keys()))
-                        pic_id = member_options.get(pic_name)
-                        
-                        due_date = st.date_input("Batas Waktu")
-                        notes = st.text_area("Keterangan (Opsional)")
-                        
-                        delegator_id = st.session_state.current_user['id']
-                        submitted = st.form_submit_button("Tugaskan")
-                        
-                        if submitted:
-                            if task_title and pic_id and due_date:
-                                create_task(project_id, task_title, pic_id, delegator_id, str(due_date), notes)
-                                st.rerun()
-                            else:
-                                st.error("Judul Tugas, Penerima Tugas, dan Batas Waktu harus diisi.")
-            
-            # Daftar Tugas dalam Cards
-            if tasks:
-                for task in tasks:
-                    task_pic = get_user(task['pic_id'])
-                    task_delegator = get_user(task['delegator_id'])
-                    
-                    # Status color
-                    status_colors = {
-                        'Yet': '#6c757d',
-                        'On Progress': '#ffc107',
-                        'Pending Approval': '#17a2b8',
-                        'Done': '#28a745'
-                    }
-                    status_color = status_colors.get(task['status'], '#6c757d')
-
-                    with st.expander(f"**{task['title']}** - 🏷️ {task['status']}", expanded=False):
-                        col_task1, col_task2 = st.columns([2, 1])
-                        
-                        with col_task1:
-                            st.markdown(f"**👤 PIC:** {task_pic['fullname']} ({task_pic['role']})")
-                            st.markdown(f"**📤 Delegator:** {task_delegator['fullname']}")
-                            st.markdown(f"**📅 Deadline:** {task['due_date']}")
-                        
-                        with col_task2:
-                            st.markdown(f"""
-                            <div style="background-color: {status_color}; color: white; padding: 10px; 
-                                        border-radius: 5px; text-align: center;">
-                                <h4 style="margin: 0;">{task['status']}</h4>
-                            </div>
-                            """, unsafe_allow_html=True)
-
-                        # Aksi untuk PIC
-                        if st.session_state.current_user['id'] == task['pic_id'] and task['status'] != 'Done':
-                            st.markdown("---")
-                            
-                            # Tombol Start Actual (hanya muncul jika belum dimulai)
-                            if not task.get('actual_start') and task['status'] == 'Yet':
-                                if st.button("🚀 Mulai Pengerjaan", key=f"start_actual_{task['id']}", type="primary"):
-                                    start_actual_work(task['id'])
-                            
-                            # Tampilkan info jika sudah dimulai
-                            if task.get('actual_start'):
-                                st.info(f"⏱️ Dimulai: {task['actual_start']}")
-                            
-                            st.markdown("**📤 Upload Dokumen**")
-                            with st.form(f"upload_form_{task['id']}"):
-                                uploaded_file = st.file_uploader("Pilih file", key=f"uploader_{task['id']}")
-                                notes_upload = st.text_area("Keterangan (Opsional)", key=f"notes_{task['id']}")
-                                submit_upload = st.form_submit_button("Kirim & Minta Approval")
-                                
-                                if submit_upload:
-                                    if uploaded_file:
-                                        upload_document(task['id'], uploaded_file, notes_upload)
-                                    else:
-                                        st.error("Silakan pilih file untuk diunggah.")
-                        
-                        # Aksi untuk Delegator
-                        if st.session_state.current_user['id'] == task['delegator_id'] and task['status'] == 'Pending Approval':
-                            st.markdown("---")
-                            if st.button("✅ Setujui Penyelesaian Tugas", key=f"approve_task_{task['id']}"):
-                                approve_task_completion(task['id'])
-
-                        # Aksi untuk Edit
-                        if st.session_state.current_user['id'] == task['delegator_id'] and task['status'] != 'Done':
-                            if st.button("✏️ Edit Tugas", key=f"edit_task_{task['id']}"):
-                                st.session_state.edit_task_id = task['id']
-                                st.session_state.page = "edit_task"
-                                st.rerun()
-            else:
-                st.info("Tidak ada tugas untuk proyek ini.")
+            show_project_tasks_tab(project_id)
         
-        # ==================== TAB 3: APPROVAL ====================
         with approval_tab:
-            st.subheader("✔️ Persetujuan Tugas")
-            st.caption("Kelola approval untuk tugas yang sudah selesai dikerjakan")
-            
-            # Filter tugas yang pending approval
-            pending_tasks = [t for t in tasks if t['status'] == 'Pending Approval']
-            
-            # Cek apakah user adalah delegator dari project ini
-            user_id = st.session_state.current_user['id']
-            is_creator = project_details['creator_id'] == user_id
-            user_role = st.session_state.current_user['role']
-            
-            if pending_tasks:
-                st.info(f"📋 Ada **{len(pending_tasks)}** tugas menunggu persetujuan")
-                
-                for task in pending_tasks:
-                    task_pic = get_user(task['pic_id'])
-                    task_delegator = get_user(task['delegator_id'])
-                    
-                    # Cek apakah user berhak approve (delegator atau creator project atau admin/manager)
-                    can_approve = (
-                        user_id == task['delegator_id'] or 
-                        is_creator or 
-                        user_role in ['Admin', 'Manager']
-                    )
-                    
-                    with st.expander(f"📝 **{task['title']}** - Pending Approval", expanded=True):
-                        col_info1, col_info2 = st.columns([2, 1])
-                        
-                        with col_info1:
-                            st.markdown(f"**👤 PIC:** {task_pic['fullname']}")
-                            st.markdown(f"**📤 Delegator:** {task_delegator['fullname']}")
-                            st.markdown(f"**📅 Deadline:** {task['due_date']}")
-                            if task.get('actual_start'):
-                                st.markdown(f"**⏱️ Dimulai:** {task['actual_start']}")
-                        
-                        with col_info2:
-                            st.markdown("""
-                            <div style="background-color: #17a2b8; color: white; padding: 15px; 
-                                        border-radius: 5px; text-align: center;">
-                                <h4 style="margin: 0;">⏳ Pending</h4>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        
-                        st.markdown("---")
-                        st.markdown("**📄 Dokumen yang Diupload:**")
-                        
-                        # Tampilkan dokumen
-                        if task['documents']:
-                            for doc in task['documents']:
-                                col_doc1, col_doc2 = st.columns([3, 1])
-                                with col_doc1:
-                                    st.markdown(f"📎 {doc['filename']}")
-                                    if doc['notes']:
-                                        st.caption(f"Catatan: {doc['notes']}")
-                                with col_doc2:
-                                    if os.path.exists(doc['filepath']):
-                                        with open(doc['filepath'], "rb") as file:
-                                            st.download_button(
-                                                label="📥 Download",
-                                                data=file,
-                                                file_name=doc['filename'],
-                                                key=f"download_approval_{doc['id']}"
-                                            )
-                        else:
-                            st.info("Belum ada dokumen diupload")
-                        
-                        # Tombol Approve (hanya untuk yang berhak)
-                        if can_approve:
-                            st.markdown("---")
-                            col_approve, col_reject = st.columns(2)
-                            with col_approve:
-                                if st.button("✅ Setujui & Tandai Selesai", key=f"approve_final_{task['id']}", type="primary", use_container_width=True):
-                                    approve_task_completion(task['id'])
-                            with col_reject:
-                                st.caption("Fitur reject akan segera hadir")
-                        else:
-                            st.warning("⚠️ Anda tidak memiliki akses untuk approve tugas ini")
-            else:
-                st.success("✅ Tidak ada tugas yang menunggu persetujuan")
+            show_project_approval_tab(project_id)
         
-        # ==================== TAB 4: DOCUMENTS ====================
         with docs_tab:
-            st.subheader("📄 Dokumen Proyek")
-            
-            # Upload Manual
-            user_role = st.session_state.current_user['role']
-            with st.expander("📤 Upload Dokumen Manual"):
-                st.info("Upload dokumen yang tidak terkait dengan tugas spesifik")
-                st.caption("Fitur ini untuk dokumen umum proyek. Untuk dokumen tugas, silakan upload di tab Tasks.")
-            
-            st.markdown("---")
-            
-            # Tampilkan semua dokumen dari tasks
-            st.subheader("📚 Dokumen dari Tasks")
-            
-            all_documents = []
-            for task in tasks:
-                for doc in task['documents']:
-                    all_documents.append({
-                        'task_title': task['title'],
-                        'task_id': task['id'],
-                        'doc': doc,
-                        'pic': get_user(task['pic_id'])['fullname']
-                    })
-            
-            if all_documents:
-                # Tampilkan dalam grid cards
-                doc_cols = st.columns(3)
-                for idx, doc_info in enumerate(all_documents):
-                    with doc_cols[idx % 3]:
-                        doc = doc_info['doc']
-                        
-                        # Tentukan icon berdasarkan ekstensi
-                        ext = os.path.splitext(doc['filename'])[-1].lower()
-                        icon_map = {
-                            '.pdf': '📕', '.doc': '📘', '.docx': '📘',
-                            '.xls': '📗', '.xlsx': '📗', '.txt': '📄',
-                            '.zip': '📦', '.html': '🌐'
-                        }
-                        file_icon = icon_map.get(ext, '📎')
-                        
-                        st.markdown(f"""
-                        <div style="background-color: #f8f9fa; padding: 15px; border-radius: 8px; 
-                                    margin-bottom: 10px; border: 1px solid #dee2e6;">
-                            <h4 style="margin: 0 0 10px 0;">{file_icon} {doc['filename'][:25]}...</h4>
-                            <p style="margin: 5px 0; font-size: 0.85em;"><strong>Task:</strong> {doc_info['task_title'][:30]}</p>
-                            <p style="margin: 5px 0; font-size: 0.85em;"><strong>Upload by:</strong> {doc_info['pic']}</p>
-                            {f'<p style="margin: 5px 0; font-size: 0.85em;"><em>{doc["notes"]}</em></p>' if doc['notes'] else ''}
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        if os.path.exists(doc['filepath']):
-                            try:
-                                with open(doc['filepath'], "rb") as f:
-                                    st.download_button(
-                                        label=f"⬇️ Download",
-                                        data=f.read(),
-                                        file_name=doc['filename'],
-                                        mime="application/octet-stream",
-                                        key=f"doc_download_{doc['id']}",
-                                        use_container_width=True
-                                    )
-                            except Exception as e:
-                                st.error(f"Error: {str(e)}")
-                        else:
-                            st.error("File tidak ditemukan")
-            else:
-                st.info("Belum ada dokumen yang diupload dalam proyek ini.")
+            show_project_documents_tab(project_id)
         
-        # ==================== TAB 5: CHAT ====================
         with chat_tab:
             st.subheader("💬 Obrolan Proyek")
             st.caption("Diskusikan proyek dengan tim Anda di sini")
             
-            mark_project_messages_as_read(project_id, st.session_state.current_user['id'])
-            
-            chat_container = st.container(height=400)
-            with chat_container:
-                for msg in project_details['chatMessages']:
-                    sender_user = get_user(msg['sender_id'])
-                    sender = sender_user['fullname']
-                    sender_role = sender_user['role']
-                    is_me = msg['sender_id'] == st.session_state.current_user['id']
-                    
-                    # Warna berdasarkan role untuk pesan orang lain
-                    role_colors = {
-                        'Admin': {'bg': '#FFE5E5', 'border': '#FF6B6B', 'name': '#C92A2A'},  # Merah muda
-                        'Manager': {'bg': '#E3F2FD', 'border': '#2196F3', 'name': '#0D47A1'},  # Biru
-                        'Supervisor': {'bg': '#FFF3E0', 'border': '#FF9800', 'name': '#E65100'},  # Orange
-                        'Staff': {'bg': '#F3E5F5', 'border': '#9C27B0', 'name': '#4A148C'}  # Ungu
-                    }
-                    
-                    if is_me:
-                        align = 'flex-end'
-                        bg_color = '#DCF8C6'  # Hijau muda untuk pesan sendiri
-                        border_color = '#4CAF50'
-                        name_color = '#2E7D32'
-                        shadow = '2px 2px 5px rgba(0,0,0,0.15)'
-                    else:
-                        align = 'flex-start'
-                        role_style = role_colors.get(sender_role, role_colors['Staff'])
-                        bg_color = role_style['bg']
-                        border_color = role_style['border']
-                        name_color = role_style['name']
-                        shadow = '2px 2px 5px rgba(0,0,0,0.1)'
-                    
-                    text_color = 'black'
-                    
-                    # Parse & render content
-                    the_msg = msg['message']
-                    msg_html = f"<strong style='color: {name_color};'>{sender}</strong> <span style='font-size: 0.75em; color: #666;'>({sender_role})</span><br>"
-                    content_html = ""
-                    
-                    if '[IMAGE]' in the_msg:
-                        before, image_path = the_msg.split('[IMAGE]', 1)
-                        if before.strip():
-                            content_html += f"<span>{before.strip()}</span><br>"
-                        image_path = image_path.strip()
-                        if os.path.exists(image_path):
-                            try:
-                                with open(image_path, "rb") as img_f:
-                                    import base64
-                                    img_b64 = base64.b64encode(img_f.read()).decode('utf-8')
-                                ext = os.path.splitext(image_path)[-1][1:] or 'png'
-                                filename = os.path.basename(image_path)
-                                content_html += f'''<div style="margin: 8px 0;"><img src="data:image/{ext};base64,{img_b64}" style="max-width: 300px; max-height: 300px; border-radius: 12px; box-shadow: 0 4px 12px rgba(0,0,0,0.15); cursor: pointer; transition: transform 0.2s ease;" onclick="window.open(this.src, '_blank')" onmouseover="this.style.transform='scale(1.02)'" onmouseout="this.style.transform='scale(1)'" title="Klik untuk memperbesar" /><br><a href="data:image/{ext};base64,{img_b64}" download="{filename}" style="display: inline-block; margin-top: 8px; padding: 6px 12px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; text-decoration: none; border-radius: 8px; font-size: 0.85em; font-weight: 500; box-shadow: 0 2px 8px rgba(102, 126, 234, 0.3); transition: all 0.2s ease;">📥 Download</a></div>'''
-                            except Exception as e:
-                                content_html += f"<span style='color:#999;'>⚠ Error loading image</span>"
-                        else:
-                            content_html += f"<span style='color:#999;'>⚠ Gambar tidak ditemukan</span>"
-                    elif '[FILE]' in the_msg:
-                        before, file_field = the_msg.split('[FILE]', 1)
-                        if before.strip():
-                            content_html += f"<span>{before.strip()}</span><br>"
-                        if '|' in file_field:
-                            file_path, file_name = file_field.strip().split('|', 1)
-                            file_path = file_path.strip()
-                            file_name = file_name.strip()
-                            if os.path.exists(file_path):
-                                try:
-                                    with open(file_path, "rb") as f:
-                                        import base64
-                                        file_b64 = base64.b64encode(f.read()).decode('utf-8')
-                                    # Deteksi MIME type berdasarkan ekstensi
-                                    ext = os.path.splitext(file_name)[-1].lower()
-                                    mime_types = {
-                                        '.pdf': 'application/pdf',
-                                        '.doc': 'application/msword',
-                                        '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                                        '.xls': 'application/vnd.ms-excel',
-                                        '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                                        '.txt': 'text/plain',
-                                        '.zip': 'application/zip',
-                                        '.html': 'text/html',
-                                    }
-                                    mime_type = mime_types.get(ext, 'application/octet-stream')
-                                    content_html += f'''<a href="data:{mime_type};base64,{file_b64}" download="{file_name}" 
-                                        style="display:inline-block; color:#007bff; padding:4px 0; 
-                                        text-decoration:underline; font-weight:500; margin:5px 0; cursor:pointer; 
-                                        transition: all 0.2s ease;">
-                                        📎 {file_name}
-                                    </a>'''
-                                except Exception as e:
-                                    content_html += f"<span style='color:#999;'>⚠ Error loading file</span>"
-                            else:
-                                content_html += f"<span style='color:#999;'>⚠ File tidak ditemukan</span>"
-                        else:
-                            content_html += the_msg
-                    else:
-                        content_html += the_msg
-                    
-                    st.markdown(
-                        f"""
-                        <div style="display: flex; justify-content: {align}; margin-bottom: 10px;">
-                            <div style="background-color: {bg_color}; padding: 12px 15px; border-radius: 15px; 
-                                max-width: 80%; color: {text_color}; box-shadow: {shadow}; 
-                                border-left: 4px solid {border_color};">
-                                {msg_html}
-                                <div style='margin:2px 0 0 0; word-break: break-word;'>{content_html}</div>
-                                <small style="display: block; text-align: right; color: #888; font-size: 0.7em; margin-top: 5px;">{msg['timestamp']}</small>
-                            </div>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-            
-            # Blok form yang sudah benar dengan clear_on_submit=True
-            with st.form("project_chat_form", clear_on_submit=True):
-                c1, c2 = st.columns([5,2])
-                with c1:
-                    message = st.text_input("Ketik pesan dan tekan Enter...", key="project_chat_input")
-                with c2:
-                    uploaded_file = st.file_uploader("", key="project_chat_file", label_visibility="collapsed")
-                
-                # Tombol submit
-                send_chat = st.form_submit_button("Kirim", use_container_width=True)
-                
-                # Logika pengiriman pesan hanya dijalankan setelah tombol form ditekan
-                if send_chat:
-                    if message.strip() or uploaded_file:
-                        # Simpan file yang diunggah jika ada
-                        file_link = None
-                        img_file = None
-                        if uploaded_file:
-                            import uuid
-                            filename = f"chat_{uuid.uuid4().hex}_{uploaded_file.name}"
-                            filepath = os.path.join(UPLOAD_FOLDER, filename)
-                            with open(filepath, "wb") as f:
-                                f.write(uploaded_file.getbuffer())
-                            if uploaded_file.type.startswith("image/"):
-                                img_file = filepath
-                            else:
-                                file_link = filepath
-                        
-                        # Buat pesan gabungan
-                        mix_msg = message if message else ""
-                        if img_file:
-                            mix_msg += f" [IMAGE]{img_file}"
-                        elif file_link:
-                            mix_msg += f" [FILE]{file_link}|{uploaded_file.name}"
-                        
-                        # Panggil fungsi pengirim pesan
-                        send_project_message(project_id, st.session_state.current_user['id'], mix_msg)
-                        
-                        # Rerun setelah pesan terkirim untuk memperbarui tampilan
-                        st.rerun()
+            if chat_tab.open:
+                show_project_chat(project_id)
         
         # Tombol Kembali
         st.markdown("---")
@@ -2169,11 +3906,10 @@ def show_project_details(project_id):
                 st.rerun()
 
 def show_edit_task_page(task_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT project_id, title, pic_id, due_date FROM tasks WHERE id = ?", (task_id,))
-    task_details = c.fetchone()
-    conn.close()
+    with db_reader() as conn:
+        c = conn.cursor()
+        c.execute("SELECT project_id, title, pic_id, due_date FROM tasks WHERE id = ?", (task_id,))
+        task_details = c.fetchone()
     
     if task_details:
         project_id, title, pic_id, due_date = task_details
@@ -2195,12 +3931,11 @@ def show_edit_task_page(task_id):
             
             if submitted:
                 if new_title and new_pic_id and new_due_date:
-                    edit_task(task_id, new_title, new_pic_id, str(new_due_date), "")
-                    st.success("Tugas berhasil diperbarui!")
-                    st.session_state.page = "project_details"
-                    st.session_state.selected_project_id = project_id
-                    st.session_state.edit_task_id = None
-                    st.rerun()
+                    if edit_task(task_id, new_title, new_pic_id, str(new_due_date), ""):
+                        st.session_state.page = "project_details"
+                        st.session_state.selected_project_id = project_id
+                        st.session_state.edit_task_id = None
+                        st.rerun()
                 else:
                     st.error("Semua kolom harus diisi.")
         
@@ -2214,7 +3949,7 @@ def show_edit_task_page(task_id):
 def show_user_management_page():
     st.title("Manajemen Pengguna")
     
-    admin_tabs = st.tabs(["Persetujuan Pengguna", "Ubah Peran", "Atur Ulang Kata Sandi", "🔧 Database"])
+    admin_tabs = st.tabs(["Persetujuan Pengguna", "Ubah Peran", "Atur Ulang Kata Sandi", "🔧 Database", "📤 Ekspor Data"])
     
     with admin_tabs[0]:
         st.subheader("Persetujuan Pengguna Baru")
@@ -2261,18 +3996,167 @@ def show_user_management_page():
         
         with col2:
             st.info("💡 Pembersihan aman dan tidak akan menghapus data yang valid")
+        
+        st.markdown("---")
+        st.write("Arsipkan jejak audit lama ke file bulanan terkompresi agar tabel audit tetap kecil.")
+        col1, col2 = st.columns(2)
+        with col1:
+            retention_days = st.number_input("Arsipkan jejak audit yang lebih tua dari (hari)", min_value=1, value=AUDIT_RETENTION_DAYS)
+            if st.button("📦 Arsipkan Jejak Audit", use_container_width=True):
+                try:
+                    archived = archive_audit_trail(int(retention_days))
+                    if archived:
+                        st.success(f"✅ {archived} jejak audit dipindahkan ke arsip.")
+                    else:
+                        st.info("✨ Tidak ada jejak audit yang perlu diarsipkan.")
+                except (sqlite3.Error, OSError) as e:
+                    st.error(f"Error mengarsipkan jejak audit: {e}")
+        
+        with col2:
+            archive_months = get_audit_archive_months()
+            st.info(f"💡 Arsip tersedia: {len(archive_months)} bulan" + (f" ({archive_months[-1]} s/d {archive_months[0]})" if archive_months else ""))
+        
+        st.markdown("---")
+        st.write("Buat thumbnail untuk gambar chat lama agar riwayat chat tidak memuat foto ukuran penuh.")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("🖼️ Buat Thumbnail Gambar Chat", use_container_width=True):
+                try:
+                    with st.spinner("Membuat thumbnail..."):
+                        created, skipped, missing = backfill_chat_thumbnails()
+                    st.success(f"✅ {created} thumbnail dibuat, {skipped} gambar dilewati (sudah kecil atau tidak terbaca), "
+                               f"{missing} lampiran tidak ditemukan.")
+                except (sqlite3.Error, ValueError) as e:
+                    st.error(f"Error membuat thumbnail: {e}")
+        
+        with col2:
+            st.info(f"💡 Thumbnail maksimal {CHAT_THUMBNAIL_MAX_SIZE}px, disimpan di {CHAT_THUMBNAIL_FOLDER}")
+    
+    with admin_tabs[4]:
+        st.subheader("📤 Ekspor Data")
+        st.write("Ekspor satu tabel ke CSV atau Parquet untuk laporan dan BI. Untuk ekstrak terjadwal gunakan "
+                 "`python app.py export <tabel> --format csv --from YYYY-MM-DD --to YYYY-MM-DD`.")
+        with st.form("export_form"):
+            col1, col2 = st.columns(2)
+            with col1:
+                entity = st.selectbox("Data", list(EXPORT_ENTITIES))
+                date_from = st.date_input("Dari Tanggal", value=None, key="export_date_from")
+            with col2:
+                export_format = st.selectbox("Format", EXPORT_FORMATS if pq is not None else EXPORT_FORMATS[:1],
+                                             help=None if pq is not None else "Format Parquet membutuhkan paket pyarrow.")
+                date_to = st.date_input("Sampai Tanggal", value=None, key="export_date_to")
+            prepare_export = st.form_submit_button("Siapkan File", use_container_width=True)
+        
+        if prepare_export:
+            previous = st.session_state.pop("export_file", None)
+            if previous and os.path.exists(previous["path"]):
+                os.remove(previous["path"])
+            try:
+                with st.spinner("Menyiapkan file ekspor..."):
+                    path, exported = create_export_file(entity, export_format, date_from, date_to)
+            except (sqlite3.Error, ValueError, OSError) as e:
+                st.error(f"Error ekspor data: {e}")
+            else:
+                record_audit_trail(st.session_state.current_user['id'], "Export Data",
+                                   f"Ekspor {entity} ({export_format}): {exported} baris.")
+                st.session_state.export_file = {
+                    "path": path, "rows": exported,
+                    "file_name": f"{entity}_{datetime.now().strftime('%Y%m%d')}.{export_format}",
+                    "mime": "text/csv" if export_format == "csv" else "application/octet-stream"}
+        
+        export_file = st.session_state.get("export_file")
+        if export_file and os.path.exists(export_file["path"]):
+            # File tetap di disk dan baru dibaca saat tombol diklik, bukan pada setiap rerun halaman
+            st.success(f"✅ {export_file['rows']} baris siap diunduh.")
+            st.download_button("⬇️ Unduh File", functools.partial(read_export_file, export_file["path"]),
+                               use_container_width=True, file_name=export_file["file_name"],
+                               mime=export_file["mime"], on_click="ignore")
 
 def show_audit_trail_page():
     st.title("Jejak Audit Sistem")
     st.write("Semua aktivitas utama dalam aplikasi dicatat di sini.")
     
-    all_activities = get_all_audit_trail()
-    if all_activities:
-        df_audit = pd.DataFrame(all_activities, columns=['Waktu', 'ID Pengguna', 'Aksi', 'Detail'])
-        st.dataframe(df_audit, use_container_width=True)
+    # Di luar form supaya pilihan pengguna/aksi dari arsip langsung tersedia saat dicentang
+    include_archive = st.checkbox("Sertakan arsip", help="Lanjutkan ke jejak audit yang sudah diarsipkan.")
+    user_ids, actions = get_audit_filter_options(include_archive)
+    with st.form("audit_filter_form"):
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            selected_user = st.selectbox("Pengguna", ["Semua"] + user_ids)
+        with col2:
+            selected_action = st.selectbox("Aksi", ["Semua"] + actions)
+        with col3:
+            date_from = st.date_input("Dari Tanggal", value=None)
+        with col4:
+            date_to = st.date_input("Sampai Tanggal", value=None)
+        keyword = st.text_input("Kata kunci detail", help="Setiap kata dicocokkan sebagai awalan pada kolom detail.")
+        st.form_submit_button("🔍 Terapkan Filter")
+    
+    # Filter berubah: mulai lagi dari halaman pertama
+    audit_filters = {
+        'user_id': None if selected_user == "Semua" else selected_user,
+        'action': None if selected_action == "Semua" else selected_action,
+        'date_from': date_from,
+        'date_to': date_to,
+        'keyword': keyword.strip() or None,
+        'include_archive': include_archive,
+    }
+    if st.session_state.get('audit_filters') != audit_filters:
+        st.session_state.audit_filters = audit_filters
+        st.session_state.audit_rows, st.session_state.audit_cursor = get_audit_trail_page(**audit_filters)
+    
+    audit_rows = st.session_state.audit_rows
+    if audit_rows:
+        df_audit = pd.DataFrame([row[1:] for row in audit_rows], columns=['Waktu', 'ID Pengguna', 'Aksi', 'Detail'])
+        st.dataframe(df_audit, use_container_width=True, hide_index=True)
+        st.caption(f"Menampilkan {len(audit_rows)} entri")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.session_state.audit_cursor and st.button("⬇️ Muat lebih banyak", use_container_width=True):
+                more_rows, st.session_state.audit_cursor = get_audit_trail_page(before=st.session_state.audit_cursor, **audit_filters)
+                st.session_state.audit_rows = audit_rows + more_rows
+                st.rerun()
+        with col2:
+            if st.button("🔄 Muat Ulang", use_container_width=True):
+                try:
+                    get_audit_sink().flush()  # tampilkan juga event yang masih antri
+                except sqlite3.Error:
+                    pass  # dicoba lagi oleh thread audit
+                st.session_state.pop('audit_filters', None)
+                st.rerun()
     else:
         st.info("Tidak ada jejak audit yang ditemukan.")
 
+@st.fragment(run_every=CHAT_REFRESH_SECONDS)
+def show_direct_chat_pane(receiver_id):
+    """Panel direct chat dengan satu pengguna. Di-refresh sendiri secara berkala."""
+    current_user_id = st.session_state.current_user['id']
+    chat_key = f"direct_{receiver_id}"
+    # Riwayat dirender setelah form diproses, agar pesan yang baru dikirim langsung ikut tampil
+    history_area = st.container()
+
+    with st.form("direct_chat_form", clear_on_submit=True):
+        c1, c2 = st.columns([5,2])
+        with c1:
+            message = st.text_input("Ketik pesan dan tekan Enter...", key="direct_chat_input")
+        with c2:
+            uploaded_file = st.file_uploader("", key="direct_chat_file", label_visibility="collapsed")
+        submit_button = st.form_submit_button("Kirim", use_container_width=True)
+        if submit_button and (message or uploaded_file):
+            attachment = save_chat_attachment(uploaded_file) if uploaded_file else None
+            is_new_conversation = not st.session_state.get('chat_history', {}).get(chat_key, {}).get('messages')
+            send_direct_message(current_user_id, receiver_id, message, attachment)
+            # Percakapan baru perlu muncul di daftar kontak
+            if is_new_conversation:
+                st.rerun()
+
+    mark_direct_messages_as_read(receiver_id, current_user_id)
+    with history_area:
+        render_chat_history(chat_key,
+                            lambda before_id=None: get_direct_messages(current_user_id, receiver_id, before_id=before_id),
+                            lambda after_id: get_direct_messages_after(current_user_id, receiver_id, after_id))
+
 def show_direct_chat_page():
     st.title("Obrolan Langsung")
     
@@ -2281,18 +4165,16 @@ def show_direct_chat_page():
     with col1:
         st.subheader("Kontak")
         
-        unread_counts = get_unread_direct_messages_count(st.session_state.current_user['id'])
-        chat_partners = get_all_direct_chat_partners(st.session_state.current_user['id'])
+        conversations = get_direct_conversations(st.session_state.current_user['id'])
         all_users = {u['id']: u['fullname'] for u in get_all_users()}
         
-        # Sort partners with unread messages first
-        partners_with_notif = [p for p in chat_partners if p in unread_counts]
-        partners_without_notif = [p for p in chat_partners if p not in unread_counts]
-        sorted_partners = partners_with_notif + partners_without_notif
+        # Percakapan dengan pesan belum dibaca di atas, sisanya urut pesan terbaru
+        sorted_conversations = [cv for cv in conversations if cv['unread_count'] > 0] + [cv for cv in conversations if cv['unread_count'] == 0]
 
-        for partner_id in sorted_partners:
+        for conversation in sorted_conversations:
+            partner_id = conversation['partner_id']
             partner_name = all_users.get(partner_id, "Pengguna Tidak Dikenal")
-            unread_count = unread_counts.get(partner_id, 0)
+            unread_count = conversation['unread_count']
             
             button_label = f"💬 {partner_name} ({unread_count})" if unread_count > 0 else f"👤 {partner_name}"
             
@@ -2309,7 +4191,7 @@ def show_direct_chat_page():
             st.subheader("Cari Pengguna")
             search_term = st.text_input("Cari nama atau ID...", key="user_search")
             if search_term:
-                search_results = [u for u in get_all_users() if search_term.lower() in u['fullname'].lower() or search_term.lower() in u['id'].lower()]
+                search_results = search_users(search_term)
                 for user in search_results:
                     if user['id'] != st.session_state.current_user['id'] and user['status'] == 'approved':
                         if st.button(f"👤 {user['fullname']} ({user['role']})", key=f"select_user_{user['id']}", use_container_width=True):
@@ -2323,149 +4205,80 @@ def show_direct_chat_page():
             receiver_name = get_user(receiver_id)['fullname']
             st.subheader(f"Obrolan dengan: {receiver_name}")
             
-            mark_direct_messages_as_read(receiver_id, st.session_state.current_user['id'])
-
-            chat_container = st.container(height=400)
-            
-            with chat_container:
-                messages = get_direct_messages(st.session_state.current_user['id'], receiver_id)
-                for msg in messages:
-                    sender_user = get_user(msg['sender_id'])
-                    sender = sender_user['fullname']
-                    sender_role = sender_user['role']
-                    is_me = msg['sender_id'] == st.session_state.current_user['id']
-
-                    # Warna berdasarkan role untuk pesan orang lain
-                    role_colors = {
-                        'Admin': {'bg': '#FFE5E5', 'border': '#FF6B6B', 'name': '#C92A2A'},
-                        'Manager': {'bg': '#E3F2FD', 'border': '#2196F3', 'name': '#0D47A1'},
-                        'Supervisor': {'bg': '#FFF3E0', 'border': '#FF9800', 'name': '#E65100'},
-                        'Staff': {'bg': '#F3E5F5', 'border': '#9C27B0', 'name': '#4A148C'}
-                    }
-                    
-                    if is_me:
-                        align = 'flex-end'
-                        bg_color = '#DCF8C6'
-                        border_color = '#4CAF50'
-                        name_color = '#2E7D32'
-                        shadow = '2px 2px 5px rgba(0,0,0,0.15)'
-                    else:
-                        align = 'flex-start'
-                        role_style = role_colors.get(sender_role, role_colors['Staff'])
-                        bg_color = role_style['bg']
-                        border_color = role_style['border']
-                        name_color = role_style['name']
-                        shadow = '2px 2px 5px rgba(0,0,0,0.1)'
-                    
-                    text_color = 'black'
-
-                    # Parse & render content
-                    the_msg = msg['message']
-                    msg_html = f"<strong style='color: {name_color};'>{sender}</strong> <span style='font-size: 0.75em; color: #666;'>({sender_role})</span><br>"
-                    content_html = ""
-                    
-                    if '[IMAGE]' in the_msg:
-                        before, image_path = the_msg.split('[IMAGE]', 1)
-                        if before.strip():
-                            content_html += f"<span>{before.strip()}</span><br>"
-                        image_path = image_path.strip()
-                        if os.path.exists(image_path):
-                            try:
-                                with open(image_path, "rb") as img_f:
-                                    import base64
-                                    img_b64 = base64.b64encode(img_f.read()).decode('utf-8')
-                                ext = os.path.splitext(image_path)[-1][1:] or 'png'
-                                filename = os.path.basename(image_path)
-                                content_html += f'''<div style="margin: 8px 0;"><img src="data:image/{ext};base64,{img_b64}" style="max-width: 300px; max-height: 300px; border-radius: 12px; box-shadow: 0 4px 12px rgba(0,0,0,0.15); cursor: pointer; transition: transform 0.2s ease;" onclick="window.open(this.src, '_blank')" onmouseover="this.style.transform='scale(1.02)'" onmouseout="this.style.transform='scale(1)'" title="Klik untuk memperbesar" /><br><a href="data:image/{ext};base64,{img_b64}" download="{filename}" style="display: inline-block; margin-top: 8px; padding: 6px 12px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; text-decoration: none; border-radius: 8px; font-size: 0.85em; font-weight: 500; box-shadow: 0 2px 8px rgba(102, 126, 234, 0.3); transition: all 0.2s ease;">📥 Download</a></div>'''
-                            except Exception as e:
-                                content_html += f"<span style='color:#999;'>⚠ Error loading image</span>"
-                        else:
-                            content_html += f"<span style='color:#999;'>⚠ Gambar tidak ditemukan</span>"
-                    elif '[FILE]' in the_msg:
-                        before, file_field = the_msg.split('[FILE]', 1)
-                        if before.strip():
-                            content_html += f"<span>{before.strip()}</span><br>"
-                        if '|' in file_field:
-                            file_path, file_name = file_field.strip().split('|', 1)
-                            file_path = file_path.strip()
-                            file_name = file_name.strip()
-                            if os.path.exists(file_path):
-                                try:
-                                    with open(file_path, "rb") as f:
-                                        import base64
-                                        file_b64 = base64.b64encode(f.read()).decode('utf-8')
-                                    ext = os.path.splitext(file_name)[-1].lower()
-                                    mime_types = {
-                                        '.pdf': 'application/pdf',
-                                        '.doc': 'application/msword',
-                                        '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                                        '.xls': 'application/vnd.ms-excel',
-                                        '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                                        '.txt': 'text/plain',
-                                        '.zip': 'application/zip',
-                                        '.html': 'text/html',
-                                    }
-                                    mime_type = mime_types.get(ext, 'application/octet-stream')
-                                    content_html += f'''<a href="data:{mime_type};base64,{file_b64}" download="{file_name}" 
-                                        style="display:inline-block; color:#007bff; padding:4px 0; 
-                                        text-decoration:underline; font-weight:500; margin:5px 0; cursor:pointer; 
-                                        transition: all 0.2s ease;">
-                                        📎 {file_name}
-                                    </a>'''
-                                except Exception as e:
-                                    content_html += f"<span style='color:#999;'>⚠ Error loading file</span>"
-                            else:
-                                content_html += f"<span style='color:#999;'>⚠ File tidak ditemukan</span>"
-                        else:
-                            content_html += the_msg
-                    else:
-                        content_html += the_msg
-                        
-                    st.markdown(
-                        f"""
-                        <div style="display: flex; justify-content: {align}; margin-bottom: 10px;">
-                            <div style="background-color: {bg_color}; padding: 12px 15px; border-radius: 15px; 
-                                max-width: 80%; color: {text_color}; box-shadow: {shadow}; 
-                                border-left: 4px solid {border_color};">
-                                {msg_html}
-                                <div style='margin:2px 0 0 0; word-break: break-word;'>{content_html}</div>
-                                <small style='display: block; text-align: right; color: #888; font-size: 0.7em; margin-top: 5px;'>{msg['timestamp']}</small>
-                            </div>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-
-            with st.form("direct_chat_form", clear_on_submit=True):
-                c1, c2 = st.columns([5,2])
-                with c1:
-                    message = st.text_input("Ketik pesan dan tekan Enter...", key="direct_chat_input")
-                with c2:
-                    uploaded_file = st.file_uploader("", key="direct_chat_file", label_visibility="collapsed")
-                submit_button = st.form_submit_button("Kirim", use_container_width=True)
-                if submit_button and (message or uploaded_file):
-                    file_link = None
-                    img_file = None
-                    if uploaded_file:
-                        import uuid
-                        filename = f"chat_{uuid.uuid4().hex}_{uploaded_file.name}"
-                        filepath = os.path.join(UPLOAD_FOLDER, filename)
-                        with open(filepath, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-                        if uploaded_file.type.startswith("image/"):
-                            img_file = filepath
-                        else:
-                            file_link = filepath
-                    mix_msg = message if message else ""
-                    if img_file:
-                        mix_msg += f" [IMAGE]{img_file}"
-                    elif file_link:
-                        mix_msg += f" [FILE]{file_link}|{uploaded_file.name}"
-                    send_direct_message(st.session_state.current_user['id'], receiver_id, mix_msg)
-                    st.rerun()
+            show_direct_chat_pane(receiver_id)
         else:
             st.info("Pilih pengguna dari daftar kontak di samping untuk memulai obrolan.")
 
+def format_search_snippet(snippet):
+    """Snippet FTS5 sebagai HTML aman, dengan kata yang cocok diberi <mark>."""
+    mark_start, mark_end = SNIPPET_MARKERS
+    return html.escape(snippet).replace(mark_start, "<mark>").replace(mark_end, "</mark>")
+
+def open_chat_message(chat_key, message_id, project_id=None, partner_id=None):
+    """Buka chat proyek atau direct chat dan tandai pesan hasil pencarian."""
+    st.session_state.setdefault('chat_focus', {})[chat_key] = message_id
+    if project_id is not None:
+        st.session_state.page = "projects"
+        st.session_state.selected_project_id = project_id
+    else:
+        st.session_state.page = "direct_chat"
+        st.session_state.selected_project_id = None
+        st.session_state.selected_chat_partner = partner_id
+
+def show_search_page():
+    st.title("Pencarian")
+    st.write("Cari di pesan chat proyek, direct message, dan detail jejak audit. Hasil diurutkan berdasarkan relevansi.")
+    
+    query = st.text_input("Kata kunci", key="global_search_query",
+                          help="Setiap kata dicocokkan sebagai awalan, misalnya 'draw rev' menemukan 'drawing revisi'.")
+    if not query.strip():
+        st.info("Masukkan kata kunci untuk mulai mencari.")
+        return
+    
+    current_user_id = st.session_state.current_user['id']
+    project_hits = search_project_chats(current_user_id, query)
+    direct_hits = search_direct_messages(current_user_id, query)
+    audit_hits = search_audit_trail(query)
+    
+    project_tab, direct_tab, audit_tab = st.tabs([f"💬 Chat Proyek ({len(project_hits)})",
+                                                  f"✉️ Direct Message ({len(direct_hits)})",
+                                                  f"📜 Jejak Audit ({len(audit_hits)})"])
+    
+    with project_tab:
+        if not project_hits:
+            st.info("Tidak ada pesan chat proyek yang cocok.")
+        for hit in project_hits:
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                st.markdown(f"**{hit['project_name']}** · {get_user(hit['sender_id'])['fullname']} · "
+                            f"<small>{hit['timestamp']}</small><br>{format_search_snippet(hit['snippet'])}",
+                            unsafe_allow_html=True)
+            with col2:
+                st.button("Buka", key=f"open_project_chat_{hit['id']}", use_container_width=True,
+                          on_click=open_chat_message, args=(f"project_{hit['project_id']}", hit['id']),
+                          kwargs={'project_id': hit['project_id']})
+    
+    with direct_tab:
+        if not direct_hits:
+            st.info("Tidak ada direct message yang cocok.")
+        for hit in direct_hits:
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                st.markdown(f"**{get_user(hit['partner_id'])['fullname']}** · dari {get_user(hit['sender_id'])['fullname']} · "
+                            f"<small>{hit['timestamp']}</small><br>{format_search_snippet(hit['snippet'])}",
+                            unsafe_allow_html=True)
+            with col2:
+                st.button("Buka", key=f"open_direct_chat_{hit['id']}", use_container_width=True,
+                          on_click=open_chat_message, args=(f"direct_{hit['partner_id']}", hit['id']),
+                          kwargs={'partner_id': hit['partner_id']})
+    
+    with audit_tab:
+        if not audit_hits:
+            st.info("Tidak ada jejak audit yang cocok.")
+        for hit in audit_hits:
+            st.markdown(f"**{hit['action']}** · {hit['user_id']} · <small>{hit['timestamp']}</small><br>"
+                        f"{format_search_snippet(hit['snippet'])}", unsafe_allow_html=True)
+
 # --- Navigasi Sidebar ---
 def nav_sidebar():
     st.sidebar.image("gambarlogo.png", width = 200)
@@ -2499,10 +4312,17 @@ def nav_sidebar():
         st.session_state.selected_project_id = None
         st.rerun()
         
+    if st.sidebar.button("Pencarian", use_container_width=True):
+        st.session_state.page = "search"
+        st.session_state.selected_project_id = None
+        st.session_state.selected_chat_partner = None
+        st.rerun()
+        
     if st.sidebar.button("Jejak Audit", use_container_width=True):
         st.session_state.page = "audit_trail"
         st.session_state.selected_project_id = None
         st.session_state.selected_chat_partner = None
+        st.session_state.pop('audit_filters', None)  # muat halaman terbaru
         st.rerun()
         
     st.sidebar.markdown("---")
@@ -2513,6 +4333,8 @@ def nav_sidebar():
         st.session_state.page = "login"
         st.session_state.selected_project_id = None
         st.session_state.selected_chat_partner = None
+        st.session_state.pop('chat_history', None)
+        st.session_state.pop('chat_focus', None)
         st.rerun()
 
 # --- Main App ---
@@ -2555,6 +4377,8 @@ else:
             show_audit_trail_page()
         elif st.session_state.page == "direct_chat":
             show_direct_chat_page()
+        elif st.session_state.page == "search":
+            show_search_page()
         else:
             show_dashboard()
 
@@ -0,0 +1,140 @@
+import importlib
+import os
+import shutil
+import sys
+import threading
+
+import pytest
+import streamlit as st
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+
+# Skema database dari versi sebelum migrasi bernomor (PRAGMA user_version = 0)
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    fullname TEXT NOT NULL,
+    departemen TEXT,
+    seksi TEXT,
+    role TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE TABLE projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    part_name TEXT,
+    part_number TEXT,
+    customer TEXT,
+    model TEXT,
+    creator_id TEXT,
+    created_at TEXT,
+    FOREIGN KEY (creator_id) REFERENCES users(id)
+);
+CREATE TABLE tasks (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER,
+    title TEXT NOT NULL,
+    pic_id TEXT,
+    delegator_id TEXT,
+    due_date TEXT,
+    status TEXT NOT NULL,
+    created_at TEXT,
+    completed_at TEXT,
+    actual_start TEXT,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+    FOREIGN KEY (pic_id) REFERENCES users(id),
+    FOREIGN KEY (delegator_id) REFERENCES users(id)
+);
+CREATE TABLE project_members (
+    project_id INTEGER,
+    user_id TEXT,
+    PRIMARY KEY (project_id, user_id),
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+CREATE TABLE documents (
+    id INTEGER PRIMARY KEY,
+    task_id INTEGER,
+    filename TEXT NOT NULL,
+    filepath TEXT NOT NULL,
+    revision_of INTEGER,
+    notes TEXT,
+    FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE,
+    FOREIGN KEY (revision_of) REFERENCES documents(id)
+);
+CREATE TABLE audit_trail (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    user_id TEXT,
+    action TEXT NOT NULL,
+    details TEXT NOT NULL
+);
+CREATE TABLE chats (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER,
+    sender_id TEXT,
+    message TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    is_read INTEGER DEFAULT 0,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+    FOREIGN KEY (sender_id) REFERENCES users(id)
+);
+CREATE TABLE direct_chats (
+    id INTEGER PRIMARY KEY,
+    sender_id TEXT,
+    receiver_id TEXT,
+    message TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    is_read INTEGER DEFAULT 0,
+    FOREIGN KEY (sender_id) REFERENCES users(id),
+    FOREIGN KEY (receiver_id) REFERENCES users(id)
+);
+"""
+
+
+def _stop_audit_sinks():
+    # Thread audit (juga milik app yang dijalankan AppTest) tidak boleh hidup melewati folder
+    # kerja test-nya: path flux.db relatif terhadap cwd
+    for thread in threading.enumerate():
+        sink = getattr(getattr(thread, "_target", None), "__self__", None)
+        if thread.name == "audit-sink" and sink is not None:
+            sink.close()
+
+
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    """Folder kerja sementara, supaya flux.db dan folder media tidak dibuat di repo."""
+    monkeypatch.chdir(tmp_path)
+    shutil.copy(os.path.join(REPO_ROOT, "gambarlogo.png"), tmp_path)
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    yield tmp_path
+    _stop_audit_sinks()
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+
+@pytest.fixture
+def load_app(app_dir, monkeypatch):
+    """Mengimpor app.py (bare mode) di app_dir; database di-bootstrap saat impor.
+
+    Berupa fungsi, sehingga test bisa menyiapkan flux.db lama lebih dulu.
+    """
+    monkeypatch.syspath_prepend(REPO_ROOT)
+
+    def load():
+        sys.modules.pop("app", None)
+        return importlib.import_module("app")
+
+    yield load
+    sys.modules.pop("app", None)
+
+
+@pytest.fixture
+def app(load_app):
+    module = load_app()
+    st.session_state.current_user = {"id": module.ADMIN_ID, "role": "Admin", "fullname": "Main Admin"}
+    return module
@@ -0,0 +1,34 @@
+import sqlite3
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from conftest import APP_PATH
+
+
+@pytest.fixture
+def connect_calls(app_dir, monkeypatch):
+    calls = []
+    real_connect = sqlite3.connect
+
+    def counting_connect(*args, **kwargs):
+        calls.append(args)
+        return real_connect(*args, **kwargs)
+
+    monkeypatch.setattr(sqlite3, "connect", counting_connect)
+    yield calls
+
+
+def test_reruns_reuse_reader_connections(connect_calls):
+    at = AppTest.from_file(APP_PATH, default_timeout=30)
+    at.session_state.logged_in = True
+    at.session_state.current_user = {"id": "admin123", "role": "Admin", "fullname": "Admin"}
+    at.run()
+    assert not at.exception
+    opened = len(connect_calls)
+    assert opened > 0
+
+    # Setiap rerun berjalan di thread baru; koneksi baca harus diambil dari pool
+    at.run()
+    assert not at.exception
+    assert len(connect_calls) == opened
@@ -0,0 +1,101 @@
+import csv
+import io
+import os
+
+import pytest
+
+
+def _add_users(app, *user_ids):
+    with app.db_transaction() as conn:
+        conn.executemany("INSERT INTO users (id, password, fullname, role, status) VALUES (?, 'x', ?, 'Staff', 'approved')",
+                         [(user_id, f"User {user_id}") for user_id in user_ids])
+
+
+def _import_csv(app, rows, skip_invalid=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(app.IMPORT_COLUMNS)
+    writer.writerows(rows)
+    data = io.BytesIO(buffer.getvalue().encode("utf-8-sig"))
+    return app.import_projects(app.read_import_rows(data, "impor.csv"), app.ADMIN_ID, "impor.csv", skip_invalid)
+
+
+def _export_csv(app, entity):
+    path, exported = app.create_export_file(entity, "csv")
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        assert app.read_export_file(path).decode("utf-8").startswith(",".join(app.EXPORT_ENTITIES[entity]["columns"]))
+    finally:
+        os.remove(path)
+    assert exported == len(rows)
+    return rows
+
+
+def test_imported_projects_come_back_out_of_export(app):
+    _add_users(app, "E001", "E002")
+    result = _import_csv(app, [
+        ("Crankcase CB150", "Part baru, \"rev A\"", "Crankcase", "11100-K45", "AHM", "CB150R", "E001;E002",
+         "Design Review", "E001", "2025-03-01"),
+        ("Crankcase CB150", "", "", "", "", "", "", "Trial Produksi", "E002", "2025-03-15"),
+        ("Cover Kopling", "Baris kedua\nmultiline", "Cover", "22100-K45", "AHM", "CB150R", "", "", "", ""),
+    ])
+    assert result == {"projects": 2, "members": 4, "tasks": 2, "errors": []}
+
+    projects = {row["name"]: row for row in _export_csv(app, "projects")}
+    assert set(projects) == {"Crankcase CB150", "Cover Kopling"}
+    assert projects["Crankcase CB150"]["description"] == "Part baru, \"rev A\""
+    assert projects["Cover Kopling"]["description"] == "Baris kedua\nmultiline"
+    assert projects["Crankcase CB150"]["creator_id"] == app.ADMIN_ID
+
+    crankcase_id = projects["Crankcase CB150"]["id"]
+    members = {(row["project_id"], row["user_id"]) for row in _export_csv(app, "project_members")}
+    assert members == {(crankcase_id, app.ADMIN_ID), (crankcase_id, "E001"), (crankcase_id, "E002"),
+                       (projects["Cover Kopling"]["id"], app.ADMIN_ID)}
+    tasks = sorted((row["project_id"], row["title"], row["pic_id"], row["due_date"], row["status"])
+                   for row in _export_csv(app, "tasks"))
+    assert tasks == [(crankcase_id, "Design Review", "E001", "2025-03-01", "Yet"),
+                     (crankcase_id, "Trial Produksi", "E002", "2025-03-15", "Yet")]
+
+    # Diekspor lalu diimpor lagi sebagai template: hasilnya proyek baru dengan isi yang sama
+    reimport = [(row["name"] + " (salinan)", row["description"], row["part_name"], row["part_number"],
+                 row["customer"], row["model"], "", "", "", "") for row in projects.values()]
+    assert _import_csv(app, reimport)["projects"] == 2
+    copies = {row["name"]: row for row in _export_csv(app, "projects") if row["name"].endswith("(salinan)")}
+    assert copies["Cover Kopling (salinan)"]["description"] == "Baris kedua\nmultiline"
+
+
+def test_invalid_import_keeps_database_unchanged(app):
+    _add_users(app, "E001")
+    result = _import_csv(app, [
+        ("Proyek A", "", "", "", "", "", "E001", "", "", ""),
+        ("Proyek B", "", "", "", "", "", "X999", "", "", ""),
+        ("Proyek C", "", "", "", "", "", "", "Tugas", "E001", "01-03-2025"),
+    ])
+    assert result["projects"] == 0
+    assert [line for line, _ in result["errors"]] == [3, 4]
+    assert _export_csv(app, "projects") == []
+
+    assert _import_csv(app, [("Proyek A", "", "", "", "", "", "E001", "", "", "")], skip_invalid=True)["projects"] == 1
+
+
+def test_unreadable_import_file_raises_value_error(app):
+    with pytest.raises(ValueError, match="UTF-8"):
+        list(app.read_import_rows(io.BytesIO("project_name\nKöln\n".encode("latin-1")), "impor.csv"))
+    with pytest.raises(ValueError, match="project_name"):
+        list(app.read_import_rows(io.BytesIO(b"nama\nA\n"), "impor.csv"))
+
+
+def test_parquet_export_matches_csv(app):
+    pq = pytest.importorskip("pyarrow.parquet")
+    _add_users(app, "E001")
+    _import_csv(app, [("Proyek A", "Deskripsi", "", "", "", "", "", "Tugas", "E001", "2025-03-01")])
+
+    path, exported = app.create_export_file("tasks", "parquet")
+    try:
+        table = pq.read_table(path)
+    finally:
+        os.remove(path)
+    assert exported == table.num_rows == 1
+    assert table.column_names == list(app.EXPORT_ENTITIES["tasks"]["columns"])
+    assert table.to_pylist()[0]["title"] == "Tugas"
@@ -0,0 +1,59 @@
+import os
+import sqlite3
+
+from conftest import BASELINE_SCHEMA
+
+
+def _create_baseline_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute("INSERT INTO users VALUES ('admin123', 'x', 'Main Admin', NULL, NULL, 'Admin', 'approved')")
+    conn.execute("INSERT INTO users VALUES ('E001', 'x', 'Budi', NULL, NULL, 'Staff', 'approved')")
+    conn.execute("INSERT INTO projects (id, name, creator_id, created_at) VALUES (1, 'Proyek Lama', 'admin123', '2024-01-10 08:00:00')")
+    conn.execute("INSERT INTO project_members VALUES (1, 'E001')")
+    conn.execute("""INSERT INTO tasks (project_id, title, pic_id, delegator_id, due_date, status, created_at, completed_at)
+                    VALUES (1, 'Tugas Lama', 'E001', 'admin123', '2024-02-01', 'Done', '2024-01-11 09:00:00', '2024-01-20 10:00:00')""")
+    conn.executemany("INSERT INTO chats (project_id, sender_id, message, timestamp) VALUES (1, ?, ?, ?)", [
+        ("E001", "halo tim", "2024-01-12 08:00:00"),
+        # File lama yang sudah dihapus dari disk
+        ("E001", "foto cacat [IMAGE]uploads/chat_0a1b_cacat.png", "2024-01-12 08:05:00"),
+        ("admin123", "dokumen [FILE]uploads/chat_abc_spec.pdf|spec.pdf", "2024-01-12 08:10:00"),
+    ])
+    conn.execute("INSERT INTO direct_chats (sender_id, receiver_id, message, timestamp) VALUES ('E001', 'admin123', 'pak, cek ya', '2024-01-13 07:00:00')")
+    conn.execute("INSERT INTO audit_trail (timestamp, user_id, action, details) VALUES ('2024-01-10 08:00:00', 'admin123', 'Create Project', 'Proyek Lama dibuat')")
+    conn.commit()
+    conn.close()
+
+
+def test_baseline_db_with_missing_attachment_upgrades_to_latest(app_dir, load_app):
+    _create_baseline_db(app_dir / "flux.db")
+    os.makedirs(app_dir / "uploads")
+    (app_dir / "uploads" / "chat_abc_spec.pdf").write_bytes(b"%PDF-1.4 spesifikasi")
+
+    app = load_app()
+
+    conn = sqlite3.connect(app_dir / "flux.db")
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == app.MIGRATIONS[-1][0]
+    attachments = conn.execute("""SELECT ch.message, a.kind, a.filepath, a.original_name, a.missing
+                                  FROM chat_attachments a JOIN chats ch ON ch.id = a.chat_id ORDER BY a.id""").fetchall()
+    assert attachments == [
+        ("foto cacat", "image", "uploads/chat_0a1b_cacat.png", "cacat.png", 1),
+        ("dokumen", "file", os.path.join(app.CHAT_MEDIA_FOLDER, "chat_abc_spec.pdf"), "spec.pdf", 0),
+    ]
+    assert (app_dir / app.CHAT_MEDIA_FOLDER / "chat_abc_spec.pdf").is_file()
+
+    # Data lama tetap terbaca lewat loader versi terbaru
+    messages, has_older = app.get_project_chat_messages(1)
+    assert not has_older
+    assert [m["message"] for m in messages] == ["halo tim", "foto cacat", "dokumen"]
+    assert messages[1]["attachment"]["missing"] and not messages[2]["attachment"]["missing"]
+    assert app.get_unread_direct_messages_count("admin123") == {"E001": 1}
+    stats = app.get_project_stats()
+    assert (stats["total_projects"], stats["total_tasks"], stats["done_tasks"]) == (1, 1, 1)
+
+
+def test_bootstrap_on_latest_db_is_noop(app_dir, load_app):
+    _create_baseline_db(app_dir / "flux.db")
+    load_app()
+    app = load_app()
+    assert app.run_migrations() == []
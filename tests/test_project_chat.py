@@ -0,0 +1,34 @@
+from streamlit.testing.v1 import AppTest
+
+from conftest import APP_PATH
+
+
+def _chat_rendered(at):
+    return any(text_input.key == "project_chat_input" for text_input in at.text_input)
+
+
+def test_project_chat_runs_only_in_its_open_tab(app):
+    for name in ("Proyek A", "Proyek B"):
+        assert app.create_project(name, "", "", "", "", "", [app.ADMIN_ID])
+    project_b, project_a = [project["id"] for project in app.get_projects(app.ADMIN_ID)]
+
+    at = AppTest.from_file(APP_PATH, default_timeout=30)
+    at.session_state.logged_in = True
+    at.session_state.current_user = {"id": app.ADMIN_ID, "role": "Admin", "fullname": "Main Admin"}
+    at.session_state.page = "project_details"
+    at.session_state.selected_project_id = project_a
+    at.run()
+    assert not at.exception
+    # Tab Chat yang tersembunyi tidak dijalankan (dan tidak ikut polling)
+    assert not _chat_rendered(at)
+
+    at.session_state[f"project_detail_tab_{project_a}"] = "💬 Chat"
+    at.run()
+    assert not at.exception
+    assert _chat_rendered(at)
+
+    # Tab yang terbuka tidak terbawa ke proyek lain
+    at.session_state.selected_project_id = project_b
+    at.run()
+    assert not at.exception
+    assert not _chat_rendered(at)
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+
+def _add_users(app, *users):
+    with app.db_transaction() as conn:
+        conn.executemany("INSERT INTO users (id, password, fullname, role, status) VALUES (?, 'x', ?, ?, 'approved')", users)
+
+
+def _add_projects(app, count):
+    with app.db_transaction() as conn:
+        conn.executemany("""INSERT INTO projects (id, name, description, part_name, part_number, customer, model, creator_id, created_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, '2025-01-01 08:00:00')""",
+                         [(i, f"Crankcase {i}" if i % 2 else f"Cylinder Head {i}", "Development part", "Part", f"PN-{i}",
+                           "AHM", "CB150R", app.ADMIN_ID) for i in range(1, count + 1)])
+    app.get_read_cache().invalidate("projects")
+
+
+def test_project_list_keyset_and_search_pages_cover_all_rows(app):
+    _add_projects(app, 23)
+
+    all_ids = [p["id"] for p in app.get_projects(app.ADMIN_ID)]
+    assert all_ids == list(range(23, 0, -1))
+
+    paged_ids, before_id = [], None
+    while True:
+        page = app.get_projects(app.ADMIN_ID, limit=5, before_id=before_id)
+        if not page:
+            break
+        paged_ids.extend(p["id"] for p in page)
+        before_id = page[-1]["id"]
+    assert paged_ids == all_ids
+
+    # Kata kunci dicocokkan sebagai awalan, halaman berikutnya lewat offset
+    matches = [p["id"] for p in app.get_projects(app.ADMIN_ID, search_query="crank")]
+    assert sorted(matches) == list(range(1, 24, 2))
+    paged_matches = []
+    for offset in range(0, len(matches) + 5, 5):
+        paged_matches.extend(p["id"] for p in app.get_projects(app.ADMIN_ID, search_query="crank", limit=5, offset=offset))
+    assert paged_matches == matches
+    assert app.get_projects(app.ADMIN_ID, search_query="--") == []
+
+
+def test_chat_search_only_returns_visible_projects(app):
+    _add_users(app, ("E001", "Budi", "Staff"))
+    _add_projects(app, 2)
+    with app.db_transaction() as conn:
+        conn.execute("INSERT INTO project_members (project_id, user_id) VALUES (1, 'E001')")
+    app.send_project_message(1, "E001", "Hasil pengukuran crankcase sudah masuk")
+    app.send_project_message(2, app.ADMIN_ID, "Pengukuran cylinder head dijadwalkan ulang")
+
+    assert {m["project_id"] for m in app.search_project_chats(app.ADMIN_ID, "pengukur")} == {1, 2}
+    results = app.search_project_chats("E001", "pengukur")
+    assert [m["project_id"] for m in results] == [1]
+    assert app.SNIPPET_MARKERS[0] + "pengukuran" in results[0]["snippet"]
+
+
+def test_audit_trail_pages_continue_into_archive(app):
+    recent = datetime.now() - timedelta(days=1)
+    old = datetime.now() - timedelta(days=app.AUDIT_RETENTION_DAYS + 40)
+    rows = [((old if i < 12 else recent) + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S") for i in range(20)]
+    app.get_audit_sink().flush()
+    with app.db_transaction() as conn:
+        conn.execute("DELETE FROM audit_trail")
+        conn.executemany("INSERT INTO audit_trail (timestamp, user_id, action, details) VALUES (?, 'S123', 'Edit Task', ?)",
+                         [(timestamp, f"Status Café-{i} diperbarui") for i, timestamp in enumerate(rows)])
+    assert app.archive_audit_trail() == 12
+
+    hot_rows, cursor = app.get_audit_trail_page(limit=50)
+    assert len(hot_rows) == 8 and cursor is None
+
+    paged, cursor = [], None
+    while True:
+        page, cursor = app.get_audit_trail_page(limit=3, before=cursor, include_archive=True)
+        paged.extend(page)
+        if cursor is None:
+            break
+    assert [row[1] for row in paged] == sorted(rows, reverse=True)
+    assert len({row[0] for row in paged}) == 20
+
+    # Arsip memakai aturan awalan yang sama dengan audit_trail_fts
+    for keyword, expected in (("cafe-1", 11), ("café diper", 20), ("afe", 0)):
+        found, _ = app.get_audit_trail_page(limit=50, keyword=keyword, include_archive=True)
+        assert len(found) == expected, keyword